@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark parsing BGG collections into ratings with ItemLoader and DirectLoader.
+
+The items of the collection fixture are repeated until the collection holds the
+requested number of items, e.g.:
+
+    python benchmarks/bench_collections.py --number 20000
+"""
+
+import argparse
+import logging
+import re
+import sys
+
+from pathlib import Path
+from time import perf_counter
+
+from scrapy import Request
+from scrapy.http import XmlResponse
+from scrapy.utils.test import get_crawler
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(BASE_DIR))
+
+# pylint: disable=wrong-import-position
+from board_game_scraper.items import RatingItem
+from board_game_scraper.spiders.bgg import BggSpider
+
+LOGGER = logging.getLogger(__name__)
+
+FIXTURE = BASE_DIR / "tests" / "fixtures" / "bgg_collection.xml"
+URL = (
+    "https://www.boardgamegeek.com/xmlapi2/collection?"
+    + "username=Markus+Shepherd&subtype=boardgame&stats=1&version=0"
+)
+ITEM_REGEX = re.compile(rb"<item .*?</item>", re.DOTALL)
+COLLID_REGEX = re.compile(rb'collid="\d+"')
+
+
+def _collection(number):
+    body = FIXTURE.read_bytes()
+    items = ITEM_REGEX.findall(body)
+    start = body.index(items[0])
+    end = body.rindex(items[-1]) + len(items[-1])
+    repeated = (
+        COLLID_REGEX.sub(f'collid="{i}"'.encode("utf-8"), items[i % len(items)])
+        for i in range(number)
+    )
+    return body[:start] + b"\n".join(repeated) + body[end:]
+
+
+def _run(body, direct_ratings, stream_collections):
+    crawler = get_crawler(
+        BggSpider,
+        {
+            "BGG_DIRECT_RATINGS": direct_ratings,
+            "BGG_COLLECTION_STREAMING": stream_collections,
+            "SCRAPE_BGG_RATINGS": True,
+            "SCRAPE_BGG_COLLECTIONS": True,
+        },
+    )
+    spider = BggSpider.from_crawler(crawler)
+    response = XmlResponse(URL, body=body, request=Request(URL))
+
+    start = perf_counter()
+    count = sum(
+        isinstance(result, RatingItem) for result in spider.parse_collection(response)
+    )
+    return count, perf_counter() - start
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark parsing collections.")
+    parser.add_argument(
+        "--number",
+        "-n",
+        type=int,
+        default=20_000,
+        help="number of items in the collection",
+    )
+    parser.add_argument(
+        "--repeat", "-r", type=int, default=3, help="take the best of that many runs"
+    )
+    return parser.parse_args()
+
+
+def main():
+    """Command line entry point."""
+
+    args = _parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+
+    body = _collection(args.number)
+
+    for stream_collections in (False, True):
+        for direct_ratings in (False, True):
+            count, duration = min(
+                (
+                    _run(body, direct_ratings, stream_collections)
+                    for _ in range(args.repeat)
+                ),
+                key=lambda result: result[1],
+            )
+            print(
+                f"{'DirectLoader' if direct_ratings else 'ItemLoader':>12s} | "
+                + f"streaming {'on ' if stream_collections else 'off'} | "
+                + f"{count:,d} items in {duration:.2f}s | "
+                + f"{count / duration:8,.0f} items/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
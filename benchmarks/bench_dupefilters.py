@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark memory, throughput, and false positives of the duplicate filters.
+
+Each filter runs in its own process so peak memory can be compared. Requests
+are represented by their fingerprints right away as computing those costs the
+same for every filter and would dominate the timings, e.g.:
+
+    python benchmarks/bench_dupefilters.py --number 5000000
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from pathlib import Path
+from time import perf_counter
+
+from scrapy.dupefilters import RFPDupeFilter
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(BASE_DIR))
+
+# pylint: disable=wrong-import-position
+from board_game_scraper.dupefilters import BloomDupeFilter, SqliteDupeFilter
+
+LOGGER = logging.getLogger(__name__)
+
+FILTERS = {
+    "rfp": RFPDupeFilter,
+    "bloom": BloomDupeFilter,
+    "sqlite": SqliteDupeFilter,
+}
+URL = "https://boardgamegeek.com/xmlapi2/thing?id={}&stats=1"
+
+
+def _fingerprint(id_):
+    return hashlib.sha1(URL.format(id_).encode("utf-8")).hexdigest()
+
+
+def _identity(fingerprint):
+    return fingerprint
+
+
+def _size(path):
+    return sum(
+        os.path.getsize(os.path.join(dir_path, file_name))
+        for dir_path, _, file_names in os.walk(path)
+        for file_name in file_names
+    )
+
+
+def _run(name, number, capacity, error_rate):
+    # feed fingerprints directly instead of requests
+    cls = type(
+        FILTERS[name].__name__,
+        (FILTERS[name],),
+        {"request_fingerprint": staticmethod(_identity)},
+    )
+
+    with tempfile.TemporaryDirectory() as path:
+        if name == "bloom":
+            dupefilter = cls(path=path, capacity=capacity, error_rate=error_rate)
+        elif name == "sqlite":
+            dupefilter = cls(path=path)
+        else:
+            dupefilter = cls()
+
+        start = perf_counter()
+        false_positives = 0
+        for id_ in range(number):
+            # IDs are unique, so every request seen is a false positive
+            false_positives += bool(dupefilter.request_seen(_fingerprint(id_)))
+        insert_time = perf_counter() - start
+
+        start = perf_counter()
+        repeats = min(number, 100_000)
+        missed = sum(
+            not dupefilter.request_seen(_fingerprint(id_)) for id_ in range(repeats)
+        )
+        lookup_time = perf_counter() - start
+
+        dupefilter.close("finished")
+        disk = _size(path)
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(
+        f"{name:>6s} | {number / insert_time:9,.0f} req/s | "
+        + f"{repeats / lookup_time:9,.0f} dupes/s | "
+        + f"{max_rss:7,.0f} MB RSS | {disk / 2 ** 20:7,.0f} MB disk | "
+        + f"{false_positives:6,d} false positives ({false_positives / number:.4%}) | "
+        + f"{missed:d} missed"
+    )
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark duplicate filters.")
+    parser.add_argument(
+        "--number",
+        "-n",
+        type=int,
+        default=5_000_000,
+        help="number of distinct requests",
+    )
+    parser.add_argument(
+        "--filter",
+        "-f",
+        choices=tuple(FILTERS),
+        action="append",
+        help="filter(s) to benchmark (default: all)",
+    )
+    parser.add_argument(
+        "--capacity", "-c", type=int, default=1_000_000, help="Bloom filter capacity"
+    )
+    parser.add_argument(
+        "--error-rate",
+        "-e",
+        type=float,
+        default=0.001,
+        help="Bloom filter error rate",
+    )
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help=argparse.SUPPRESS,
+    )
+    return parser.parse_args()
+
+
+def main():
+    """Command line entry point."""
+
+    args = _parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+
+    if args.in_process:
+        for name in args.filter:
+            _run(name, args.number, args.capacity, args.error_rate)
+        return
+
+    for name in args.filter or FILTERS:
+        subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--number",
+                str(args.number),
+                "--filter",
+                name,
+                "--capacity",
+                str(args.capacity),
+                "--error-rate",
+                str(args.error_rate),
+                "--in-process",
+            ],
+            check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark building GameItems from Wikidata entities with and without compiled
+JMESPath expressions, as well as just the searches of the spider's expressions.
+
+Other code sharing jmespath's small internal cache, like resolving labels, is
+simulated by searching a new expression between entities, e.g.:
+
+    python benchmarks/bench_wikidata_entities.py --number 3000 --churn 3
+"""
+
+import argparse
+import bz2
+import json
+import logging
+import sys
+
+from itertools import count
+from pathlib import Path
+from time import perf_counter
+
+import jmespath
+
+from scrapy_extensions import JsonLoader
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(BASE_DIR))
+
+# pylint: disable=wrong-import-position
+from board_game_scraper.loaders import GameJsonLoader, GameLoader, compile_jmes
+from board_game_scraper.spiders import wikidata
+from board_game_scraper.spiders.wikidata import WikidataSpider
+
+LOGGER = logging.getLogger(__name__)
+
+FIXTURE = BASE_DIR / "tests" / "fixtures" / "wikidata_dump.json.bz2"
+EXPRESSIONS = (
+    "labels.en.value",
+    "aliases.en[].value",
+    "labels.*.value",
+    "aliases.*[].value",
+    "claims.P577[].mainsnak.datavalue.value.time",
+    "claims.P178[].mainsnak.datavalue.value.id",
+    "claims.P50[].mainsnak.datavalue.value.id",
+    "claims.P170[].mainsnak.datavalue.value.id",
+    "claims.P287[].mainsnak.datavalue.value.id",
+    "claims.P110[].mainsnak.datavalue.value.id",
+    "claims.P123[].mainsnak.datavalue.value.id",
+    "claims.P18[].mainsnak.datavalue.value",
+    "claims.P856[].mainsnak.datavalue.value",
+    "sitelinks.*.url",
+    "claims.P1872[].mainsnak.datavalue.value.amount",
+    "claims.P1873[].mainsnak.datavalue.value.amount",
+    "claims.P2899[].mainsnak.datavalue.value.amount",
+    "claims.P4135[].mainsnak.datavalue.value.amount",
+    "claims.P2339[].mainsnak.datavalue.value",
+    "claims.P646[].mainsnak.datavalue.value",
+    "id",
+    "title",
+    "claims.P3528[].mainsnak.datavalue.value",
+    "claims.P6491[].mainsnak.datavalue.value",
+)
+
+
+class UncachedGameJsonLoader(JsonLoader, GameLoader):
+    """GameJsonLoader without compiled JMESPath expressions."""
+
+
+def _entities(number):
+    with bz2.open(FIXTURE, "rt") as dump_file:
+        lines = (line.strip().rstrip(",") for line in dump_file)
+        entities = [json.loads(line) for line in lines if line not in ("", "[", "]")]
+    return [entities[i % len(entities)] for i in range(number)]
+
+
+def _run(entities, churn):
+    spider = WikidataSpider()
+    ids = count()
+    start = perf_counter()
+    for entity in entities:
+        for _ in range(churn):
+            jmespath.search(f"entities.Q{next(ids)}.labels", {})
+        spider.parse_entity(entity)
+    return perf_counter() - start
+
+
+def _run_searches(entities, churn, compiled):
+    expressions = (
+        tuple(compile_jmes(expression) for expression in EXPRESSIONS)
+        if compiled
+        else EXPRESSIONS
+    )
+    ids = count()
+    start = perf_counter()
+    for entity in entities:
+        for _ in range(churn):
+            jmespath.search(f"entities.Q{next(ids)}.labels", {})
+        for expression in expressions:
+            if compiled:
+                expression.search(entity)
+            else:
+                jmespath.search(expression, entity)
+    return perf_counter() - start
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark parsing entities.")
+    parser.add_argument(
+        "--number", "-n", type=int, default=3_000, help="number of entities"
+    )
+    parser.add_argument(
+        "--churn",
+        "-c",
+        type=int,
+        default=3,
+        help="new expressions searched between two entities",
+    )
+    parser.add_argument(
+        "--repeat", "-r", type=int, default=3, help="take the best of that many runs"
+    )
+    return parser.parse_args()
+
+
+def main():
+    """Command line entry point."""
+
+    args = _parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+
+    entities = _entities(args.number)
+
+    for loader_cls in (UncachedGameJsonLoader, GameJsonLoader):
+        wikidata.GameJsonLoader = loader_cls
+        duration = min(_run(entities, args.churn) for _ in range(args.repeat))
+        print(
+            f"{loader_cls.__name__:>22s} | {len(entities):,d} entities in "
+            + f"{duration:.2f}s | {duration / len(entities) * 1e6:6,.0f} µs/entity"
+        )
+
+    for compiled in (False, True):
+        duration = min(
+            _run_searches(entities, args.churn, compiled) for _ in range(args.repeat)
+        )
+        print(
+            f"{'compiled' if compiled else 'jmespath.search':>22s} | "
+            + f"{len(EXPRESSIONS)} searches on {len(entities):,d} entities in "
+            + f"{duration:.2f}s | {duration / len(entities) * 1e6:6,.0f} µs/entity"
+        )
+
+
+if __name__ == "__main__":
+    main()
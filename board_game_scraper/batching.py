@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+""" Batching utilities """
+
+import logging
+
+from time import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BatchAccumulator:
+    """ pool values across callbacks and release them in batches """
+
+    def __init__(self, batch_size=20, timeout=None):
+        self.batch_size = batch_size
+        self.timeout = timeout
+        # insertion ordered mapping from value to the time it was added
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, value):
+        return value in self._pending
+
+    def __iter__(self):
+        return iter(tuple(self._pending))
+
+    def add(self, *values, batch_size=None):
+        """ add values and return all batches which are ready to be processed """
+
+        curr_time = time()
+        for value in values:
+            self._pending.setdefault(value, curr_time)
+        return self.pop(batch_size=batch_size)
+
+    def expired(self):
+        """ True iff the oldest pending value has been waiting longer than timeout """
+
+        if not self._pending or self.timeout is None:
+            return False
+
+        oldest = next(iter(self._pending.values()))
+        return time() - oldest >= self.timeout
+
+    def _take(self, size):
+        batch = tuple(value for value, _ in zip(self._pending, range(size)))
+        for value in batch:
+            del self._pending[value]
+        return batch
+
+    def pop(self, batch_size=None, force=False):
+        """
+        return full batches; also the remainder if forced or if the oldest value
+        has been waiting longer than timeout
+        """
+
+        batch_size = max(batch_size or self.batch_size or 1, 1)
+        result = []
+
+        while len(self._pending) >= batch_size:
+            result.append(self._take(batch_size))
+
+        if self._pending and (force or self.expired()):
+            LOGGER.debug("flushing partial batch of %d value(s)", len(self._pending))
+            result.append(self._take(len(self._pending)))
+
+        return result
+
+
+class AdaptiveBatchSize:
+    """
+    grow or shrink batch sizes per request type based on response feedback:
+    additive increase after a streak of healthy responses, multiplicative
+    decrease on throttling or server errors
+    """
+
+    def __init__(
+        self,
+        initial=10,
+        min_size=1,
+        max_size=20,
+        target_latency=None,
+        max_response_size=None,
+        grow_after=5,
+        backoff_codes=(429, 503, 504),
+        stats=None,
+        stats_prefix="batch_size",
+    ):
+        self.initial = initial
+        self.min_size = max(min_size, 1)
+        self.max_size = max(max_size, self.min_size)
+        self.target_latency = target_latency
+        self.max_response_size = max_response_size
+        self.grow_after = max(grow_after, 1)
+        self.backoff_codes = frozenset(backoff_codes)
+        self.stats = stats
+        self.stats_prefix = stats_prefix
+        self.sizes = {}
+        self._streaks = {}
+
+    def _bounded(self, size):
+        return min(max(size, self.min_size), self.max_size)
+
+    def _inc_stats(self, batch_type, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(f"{self.stats_prefix}/{batch_type}/{key}", count)
+
+    def _set_size(self, batch_type, size, reason):
+        size = self._bounded(size)
+        prev_size = self.size(batch_type)
+        self._streaks[batch_type] = 0
+
+        if size == prev_size:
+            return size
+
+        LOGGER.debug(
+            "%s: changing batch size for <%s> from %d to %d",
+            reason,
+            batch_type,
+            prev_size,
+            size,
+        )
+        self.sizes[batch_type] = size
+        self._inc_stats(batch_type, reason)
+
+        if self.stats is not None:
+            self.stats.set_value(f"{self.stats_prefix}/{batch_type}", size)
+            for value in (prev_size, size):
+                self.stats.min_value(f"{self.stats_prefix}/{batch_type}/min", value)
+                self.stats.max_value(f"{self.stats_prefix}/{batch_type}/max", value)
+
+        return size
+
+    def size(self, batch_type):
+        """ current batch size for that request type """
+        return self.sizes.get(batch_type) or self._bounded(self.initial)
+
+    def record_request(self, batch_type, batch_size):
+        """ track number of requests and IDs sent per request type """
+        self._inc_stats(batch_type, "requests")
+        self._inc_stats(batch_type, "ids", batch_size)
+
+    def feedback(
+        self, batch_type, status=None, latency=None, response_size=None, error=False
+    ):
+        """ adjust the batch size of that request type given a response """
+
+        size = self.size(batch_type)
+
+        if error or status in self.backoff_codes:
+            self._inc_stats(batch_type, f"feedback/{status or 'error'}")
+            return self._set_size(batch_type, size // 2, "backoff")
+
+        if status == 202:
+            # request got queued by the server, large batches take longer to prepare
+            self._inc_stats(batch_type, "feedback/202")
+            return self._set_size(batch_type, size - 1, "queued")
+
+        if self.target_latency and latency and latency > self.target_latency:
+            self._inc_stats(batch_type, "feedback/slow")
+            return self._set_size(batch_type, size - 1, "slow")
+
+        if (
+            self.max_response_size
+            and response_size
+            and response_size > self.max_response_size
+        ):
+            self._inc_stats(batch_type, "feedback/large")
+            return self._set_size(batch_type, size - 1, "large")
+
+        streak = self._streaks.get(batch_type, 0) + 1
+        self._streaks[batch_type] = streak
+
+        if streak >= self.grow_after and size < self.max_size:
+            return self._set_size(batch_type, size + 1, "grow")
+
+        return size
@@ -0,0 +1,692 @@
+# -*- coding: utf-8 -*-
+
+"""Ingest games from local database dumps instead of crawling."""
+
+import argparse
+import bz2
+import gzip
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timezone
+from functools import partial
+from itertools import chain
+from pathlib import Path
+from urllib.parse import quote
+
+import jmespath
+
+from pytility import batchify, clear_list, parse_date
+from scrapy import Request
+from scrapy.exceptions import DropItem
+from scrapy.exporters import JsonLinesItemExporter
+from scrapy.http import XmlResponse
+from scrapy.utils.misc import arg_to_iter
+from scrapy.utils.project import get_project_settings
+from scrapy.utils.python import flatten
+from scrapy_extensions import ValidatePipeline
+
+from .indexes import SqliteStore
+from .items import GameItem
+from .pipelines import DataTypePipeline, ResolveImagePipeline, ResolveLabelPipeline
+from .spiders.bgg_hotness import BggHotnessSpider
+from .spiders.dbpedia import GAME_PROPERTIES, DBpediaSpider
+from .spiders.wikidata import WikidataSpider
+from .utils import parse_json, serialize_json
+
+LOGGER = logging.getLogger(__name__)
+
+WIKIDATA_SITE_HOSTS = {
+    "commonswiki": "commons.wikimedia.org",
+    "metawiki": "meta.wikimedia.org",
+    "specieswiki": "species.wikimedia.org",
+    "wikidatawiki": "www.wikidata.org",
+}
+WIKIDATA_SITE_FAMILIES = {
+    "wiki": "wikipedia",
+    "wikibooks": "wikibooks",
+    "wikinews": "wikinews",
+    "wikiquote": "wikiquote",
+    "wikisource": "wikisource",
+    "wikiversity": "wikiversity",
+    "wikivoyage": "wikivoyage",
+    "wiktionary": "wiktionary",
+}
+WIKIDATA_P31 = jmespath.compile("claims.P31[].mainsnak.datavalue.value.id")
+WIKIDATA_ID_REGEX = re.compile(rb'"id"\s*:\s*"([A-Z]\d+)"')
+
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+# subject, predicate, object, and an optional graph label (N-Quads)
+TRIPLE_REGEX = re.compile(
+    r"^\s*(<[^>]*>|_:\S+)\s+<([^>]*)>\s+"
+    + r'(<[^>]*>|_:\S+|"(?:[^"\\]|\\.)*"(?:@[A-Za-z0-9\-]+|\^\^<[^>]*>)?)'
+    + r"\s*(?:<[^>]*>\s*)?\.\s*$"
+)
+LITERAL_REGEX = re.compile(r'^"(.*)"(?:@([A-Za-z0-9\-]+)|\^\^<([^>]*)>)?$', re.DOTALL)
+ESCAPE_REGEX = re.compile(r"\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|[tbnrf\"'\\])")
+ESCAPES = {"t": "\t", "b": "\b", "n": "\n", "r": "\r", "f": "\f"}
+
+# per process state of the pool workers
+_WORKER = {}
+
+
+def _init_worker(**state):
+    _WORKER.update(state)
+
+
+def _open_dump(path):
+    # pylint: disable=consider-using-with
+    if path == "-":
+        return sys.stdin.buffer
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _chunks(lines, chunk_size):
+    """ group lines into lists of roughly chunk_size bytes """
+
+    chunk = []
+    size = 0
+
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield chunk
+            chunk = []
+            size = 0
+
+    if chunk:
+        yield chunk
+
+
+def _map_bounded(executor, func, iterable, max_pending):
+    """ like executor.map, but only keeps max_pending tasks in memory """
+
+    pending = deque()
+
+    for args in iterable:
+        pending.append(executor.submit(func, args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
+
+def _scan_dumps(paths, func, workers, chunk_size, **state):
+    """ run func on chunks of lines of all dumps in a process pool """
+
+    with ProcessPoolExecutor(
+        workers, initializer=partial(_init_worker, **state)
+    ) as executor:
+        for path in paths:
+            LOGGER.info("scanning dump <%s>", path)
+            with _open_dump(path) as dump_file:
+                yield from _map_bounded(
+                    executor, func, _chunks(dump_file, chunk_size), 2 * workers
+                )
+
+
+def _parse_dump_line(line):
+    line = line.strip()
+    if line.endswith(b","):
+        line = line[:-1]
+    if not line or line in (b"[", b"]"):
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        LOGGER.warning("unable to parse line: %r [...]", line[:100])
+    return None
+
+
+def _sitelink_url(site, title):
+    host = WIKIDATA_SITE_HOSTS.get(site)
+
+    if not host:
+        for suffix, family in sorted(
+            WIKIDATA_SITE_FAMILIES.items(), key=lambda x: -len(x[0])
+        ):
+            if site.endswith(suffix) and len(site) > len(suffix):
+                lang = site[: -len(suffix)].replace("_", "-")
+                host = f"{lang}.{family}.org"
+                break
+
+    if not host or not title:
+        return None
+
+    return "https://{}/wiki/{}".format(
+        host, quote(title.replace(" ", "_"), safe=";@$!*(),/~:")
+    )
+
+
+def _add_sitelink_urls(entity):
+    # dumps omit sitelink URLs which the API would include
+    for sitelink in (entity.get("sitelinks") or {}).values():
+        if not sitelink.get("url"):
+            url = _sitelink_url(sitelink.get("site") or "", sitelink.get("title"))
+            if url:
+                sitelink["url"] = url
+    return entity
+
+
+def _wikidata_games(lines, game_types):
+    """ parse dump lines and extract games, run in the pool workers """
+
+    spider = _WORKER.get("wikidata_spider")
+    if spider is None:
+        spider = _WORKER["wikidata_spider"] = WikidataSpider()
+
+    needles = _WORKER.get("wikidata_needles")
+    if needles is None:
+        needles = _WORKER["wikidata_needles"] = tuple(
+            f'"{game_type}"'.encode("utf-8") for game_type in game_types
+        )
+
+    result = []
+
+    for line in lines:
+        # cheap test before parsing the full entity
+        if not any(needle in line for needle in needles):
+            continue
+
+        entity = _parse_dump_line(line)
+
+        if not entity or not game_types.intersection(WIKIDATA_P31.search(entity) or ()):
+            continue
+
+        item = spider.parse_entity(_add_sitelink_urls(entity))
+        result.append(dict(item))
+
+    return result
+
+
+def _wikidata_labels(lines, ids):
+    """ extract labels of the given entities, run in the pool workers """
+
+    result = []
+
+    for line in lines:
+        # the ID is among the first keys of every entity
+        match = WIKIDATA_ID_REGEX.search(line, 0, 200)
+        if not match or match.group(1).decode("utf-8") not in ids:
+            continue
+
+        entity = _parse_dump_line(line)
+
+        if entity and entity.get("id") in ids:
+            result.append((entity["id"], entity.get("labels") or {}))
+
+    return result
+
+
+def _feed_fields():
+    settings = get_project_settings()
+    fields = settings.getdict("MULTI_FEED_EXPORT_FIELDS").get(GameItem.__name__)
+    return tuple(fields or settings.getlist("FEED_EXPORT_FIELDS")) or None
+
+
+def _export_games(games, out_path):
+    """ write games like the spiders' feeds after the offline pipelines """
+
+    pipelines = (DataTypePipeline(), ValidatePipeline(), ResolveImagePipeline())
+
+    # pylint: disable=consider-using-with
+    out_file = sys.stdout.buffer if out_path == "-" else open(out_path, "wb")
+    exporter = JsonLinesItemExporter(out_file, fields_to_export=_feed_fields())
+    exporter.start_exporting()
+    for game in games:
+        try:
+            for pipeline in pipelines:
+                game = pipeline.process_item(game, None)
+        except DropItem as exc:
+            LOGGER.warning("dropped item: %s", exc)
+            continue
+        exporter.export_item(game)
+    exporter.finish_exporting()
+    if out_file is not sys.stdout.buffer:
+        out_file.close()
+
+
+def _resolve_labels(items, pipeline):
+    for item in items:
+        for field in pipeline.fields:
+            if item.get(field):
+                labels = (
+                    parse_json(pipeline.labels.get(value)) or []
+                    for value in arg_to_iter(item[field])
+                )
+                item[field] = clear_list(flatten(labels)) or None
+        yield item
+
+
+def ingest_wikidata_dump(
+    dump_paths,
+    out_path="-",
+    game_types=WikidataSpider.game_types,
+    resolve_labels=True,
+    labels_path=None,
+    workers=None,
+    chunk_size=16 * 1024 * 1024,
+):
+    """
+    stream a Wikidata JSON dump (one entity per line, compression is inferred
+    from the file extension) and write GameItems for all entities which are an
+    instance of one of the game types, extracted just like the spider does
+    """
+
+    dump_paths = tuple(arg_to_iter(dump_paths))
+    game_types = frozenset(game_types)
+    workers = workers or os.cpu_count() or 1
+    max_pending = 2 * workers
+
+    settings = WikidataSpider.custom_settings
+    label_pipeline = ResolveLabelPipeline(
+        url=settings["RESOLVE_LABEL_URL"],
+        fields=settings["RESOLVE_LABEL_FIELDS"],
+        lang_priorities=settings["RESOLVE_LABEL_LANGUAGE_PRIORITIES"],
+        labels=SqliteStore(path=labels_path, table="labels", commit_every=1_000),
+    )
+
+    LOGGER.info(
+        "reading games from %d dump(s) with %d worker(s)", len(dump_paths), workers
+    )
+
+    # games are buffered on disk until their labels have been resolved
+    with tempfile.TemporaryFile() as games_file, ProcessPoolExecutor(
+        workers
+    ) as executor:
+        referenced = set()
+        count = 0
+
+        for path in dump_paths:
+            LOGGER.info("scanning dump <%s> for games", path)
+            dump_file = _open_dump(path)
+            try:
+                for games in _map_bounded(
+                    executor,
+                    partial(_wikidata_games, game_types=game_types),
+                    _chunks(dump_file, chunk_size),
+                    max_pending,
+                ):
+                    for game in games:
+                        for field in label_pipeline.fields:
+                            referenced.update(arg_to_iter(game.get(field)))
+                        games_file.write(serialize_json(game).encode("utf-8"))
+                        games_file.write(b"\n")
+                    count += len(games)
+            finally:
+                if dump_file is not sys.stdin.buffer:
+                    dump_file.close()
+
+        LOGGER.info("found %d game(s) referencing %d entities", count, len(referenced))
+
+        missing = frozenset(
+            id_ for id_ in referenced if label_pipeline.labels.get(id_) is None
+        )
+
+        if resolve_labels and missing and "-" not in dump_paths:
+            LOGGER.info("scanning dump(s) for labels of %d entities", len(missing))
+            for path in dump_paths:
+                with _open_dump(path) as dump_file:
+                    for labels in _map_bounded(
+                        executor,
+                        partial(_wikidata_labels, ids=missing),
+                        _chunks(dump_file, chunk_size),
+                        max_pending,
+                    ):
+                        for id_, labels_obj in labels:
+                            label_pipeline.labels_from_json(
+                                {"entities": {id_: {"labels": labels_obj}}}, id_
+                            )
+        elif missing:
+            LOGGER.warning("unable to resolve labels of %d entities", len(missing))
+
+        label_pipeline.labels.commit()
+
+        games_file.seek(0)
+        games = (GameItem(parse_json(line)) for line in games_file)
+        games = _resolve_labels(games, label_pipeline) if resolve_labels else games
+
+        _export_games(games, out_path)
+
+    label_pipeline.labels.close()
+    LOGGER.info("done writing %d game(s) to <%s>", count, out_path)
+
+    return count
+
+
+def _unescape(string):
+    return ESCAPE_REGEX.sub(
+        lambda match: chr(int(match.group(1)[1:], 16))
+        if match.group(1)[0] in "uU"
+        else ESCAPES.get(match.group(1), match.group(1)),
+        string,
+    )
+
+
+def _iri(raw):
+    """ normalise an IRI term, resolving escapes, so it can be used as a key """
+    return f"<{_unescape(raw[1:-1])}>" if "\\" in raw else raw
+
+
+def _parse_triple(line):
+    """ parse an N-Triples line into subject, predicate, and raw object """
+
+    if isinstance(line, bytes):
+        line = line.decode("utf-8", errors="replace")
+    match = TRIPLE_REGEX.match(line)
+    return match.groups() if match else None
+
+
+def _term(raw):
+    """ SPARQL JSON style representation of a raw N-Triples term """
+
+    if raw.startswith("<"):
+        return {"type": "uri", "value": _unescape(raw[1:-1])}
+    if raw.startswith("_:"):
+        return {"type": "bnode", "value": raw[2:]}
+
+    match = LITERAL_REGEX.match(raw)
+    value, lang, datatype = match.groups() if match else (raw, None, None)
+    term = {"type": "literal", "value": _unescape(value)}
+    if lang:
+        term["xml:lang"] = lang
+    if datatype:
+        term["type"] = "typed-literal"
+        term["datatype"] = datatype
+    return term
+
+
+def _dbpedia_subjects(lines):
+    """ subjects typed as one of the game types, run in the pool workers """
+
+    game_types = _WORKER["game_types"]
+    result = []
+
+    for line in lines:
+        if b"22-rdf-syntax-ns#type>" not in line:
+            continue
+        triple = _parse_triple(line)
+        if triple and triple[1] == RDF_TYPE and _iri(triple[2]) in game_types:
+            result.append(_iri(triple[0]))
+
+    return result
+
+
+def _dbpedia_triples(lines):
+    """ triples of the given subjects and properties, run in the pool workers """
+
+    subjects = _WORKER["subjects"]
+    properties = _WORKER["properties"]
+    result = []
+
+    for line in lines:
+        # cheap test on the subject before parsing the full line
+        subject = line.split(b">", 1)[0].lstrip().decode("utf-8", errors="replace")
+        subject = _iri(subject + ">")
+        if subject not in subjects:
+            continue
+        triple = _parse_triple(line)
+        if triple and triple[1] in properties:
+            result.append((subject, triple[1], triple[2]))
+
+    return result
+
+
+def _dbpedia_games(triples_db, labels, spider):
+    cursor = triples_db.execute(
+        "SELECT subject, property, object FROM triples ORDER BY subject, rowid"
+    )
+    curr_subject = None
+    bindings = defaultdict(list)
+
+    for subject, prop, raw in chain(cursor, ((None, None, None),)):
+        if subject != curr_subject and curr_subject is not None:
+            yield spider.parse_bindings(_unescape(curr_subject[1:-1]), bindings)
+            bindings = defaultdict(list)
+        curr_subject = subject
+        if subject is None:
+            break
+
+        value = _term(raw)
+        value_labels = labels.get(_iri(raw)) if value["type"] == "uri" else None
+        if value_labels:
+            bindings[prop].extend(
+                {"value": value, "label": label} for label in value_labels
+            )
+        else:
+            bindings[prop].append({"value": value})
+
+
+def ingest_dbpedia_dump(
+    dump_paths,
+    out_path="-",
+    game_types=None,
+    workers=None,
+    chunk_size=16 * 1024 * 1024,
+):
+    """
+    stream DBpedia N-Triples dumps (or line based Turtle, as DBpedia publishes
+    it) and write GameItems for all subjects typed as one of the game types,
+    extracted with the same property mapping as the spider
+    """
+
+    dump_paths = tuple(arg_to_iter(dump_paths))
+    if "-" in dump_paths:
+        raise ValueError("DBpedia dumps need to be read multiple times")
+
+    if game_types is None:
+        game_types = tuple(DBpediaSpider.game_types) + tuple(
+            f"http://www.wikidata.org/entity/{t}" for t in WikidataSpider.game_types
+        )
+    game_types = frozenset(f"<{t}>" for t in game_types)
+    properties = frozenset(prop for _, prop, _ in GAME_PROPERTIES)
+    label_properties = frozenset(
+        prop
+        for _, prop, kwargs in GAME_PROPERTIES
+        if kwargs.get("value_var") == "label"
+    )
+    workers = workers or os.cpu_count() or 1
+
+    subjects = set()
+    for result in _scan_dumps(
+        dump_paths, _dbpedia_subjects, workers, chunk_size, game_types=game_types
+    ):
+        subjects.update(result)
+    LOGGER.info("found %d game(s)", len(subjects))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # triples of the games are buffered on disk and grouped by subject
+        triples_db = sqlite3.connect(os.path.join(temp_dir, "triples.sqlite"))
+        triples_db.execute(
+            "CREATE TABLE triples (subject TEXT, property TEXT, object TEXT)"
+        )
+        referenced = set()
+
+        for result in _scan_dumps(
+            dump_paths,
+            _dbpedia_triples,
+            workers,
+            chunk_size,
+            subjects=frozenset(subjects),
+            properties=properties,
+        ):
+            triples_db.executemany("INSERT INTO triples VALUES (?, ?, ?)", result)
+            referenced.update(
+                _iri(obj) for _, prop, obj in result if prop in label_properties
+            )
+        triples_db.execute("CREATE INDEX triples_subject ON triples (subject)")
+        triples_db.commit()
+        LOGGER.info("found %d resource(s) which need labels", len(referenced))
+
+        labels = defaultdict(list)
+        if referenced:
+            for result in _scan_dumps(
+                dump_paths,
+                _dbpedia_triples,
+                workers,
+                chunk_size,
+                subjects=frozenset(referenced),
+                properties=frozenset((RDFS_LABEL,)),
+            ):
+                for subject, _, obj in result:
+                    labels[subject].append(_term(obj))
+
+        count = len(subjects)
+        _export_games(_dbpedia_games(triples_db, labels, DBpediaSpider()), out_path)
+        triples_db.close()
+
+    LOGGER.info("done writing %d game(s) to <%s>", count, out_path)
+
+    return count
+
+
+def _hotness_games(paths):
+    """ parse local hotness snapshots like the spider, run in the pool workers """
+
+    spider = _WORKER.get("spider")
+    if spider is None:
+        spider = _WORKER["spider"] = BggHotnessSpider()
+        spider.direct_items = True
+
+    result = []
+
+    for path in paths:
+        url = path.as_uri()
+        published_at = parse_date(path.stem, tzinfo=timezone.utc)
+        request = Request(url, meta={"published_at": published_at})
+        response = XmlResponse(url=url, body=path.read_bytes(), request=request)
+        result.extend(dict(item) for item in spider.parse(response))
+
+    return result
+
+
+def _hotness_files(paths):
+    for path in map(Path, arg_to_iter(paths)):
+        path = path.resolve()
+        if path.is_dir():
+            yield from sorted(p for p in path.iterdir() if p.is_file())
+        elif path.is_file():
+            yield path
+
+
+def ingest_hotness_files(paths, out_path="-", workers=None, batch_size=64):
+    """
+    parse directories of BGG hotness XML snapshots, as BGG_HOTNESS_DIR would
+    feed them to the spider, in a process pool and write the GameItems directly
+    """
+
+    workers = workers or os.cpu_count() or 1
+    count = 0
+
+    def _games():
+        nonlocal count
+        with ProcessPoolExecutor(workers) as executor:
+            for games in _map_bounded(
+                executor,
+                _hotness_games,
+                map(tuple, batchify(_hotness_files(paths), batch_size)),
+                2 * workers,
+            ):
+                count += len(games)
+                yield from map(GameItem, games)
+
+    _export_games(_games(), out_path)
+    LOGGER.info("done writing %d game(s) to <%s>", count, out_path)
+
+    return count
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description="ingest games from local database dumps"
+    )
+    parser.add_argument(
+        "source",
+        choices=("wikidata", "dbpedia", "hotness"),
+        help="which kind of dump to ingest",
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help="dump files (use '-' to read from stdin) or directories of hotness files",
+    )
+    parser.add_argument("--out-path", "-o", default="-", help="output path")
+    parser.add_argument(
+        "--labels-path", "-l", help="SQLite file to cache resolved labels in"
+    )
+    parser.add_argument(
+        "--no-labels", action="store_true", help="do not resolve labels"
+    )
+    parser.add_argument("--workers", "-w", type=int, help="number of processes")
+    parser.add_argument(
+        "--chunk-size",
+        "-c",
+        type=int,
+        default=16,
+        help="megabytes of dump handed to a worker at a time",
+    )
+    parser.add_argument(
+        "--verbose",
+        "-v",
+        action="count",
+        default=0,
+        help="log level (repeat for more verbosity)",
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    """Command line entry point."""
+
+    args = _parse_args()
+
+    logging.basicConfig(
+        stream=sys.stderr,
+        level=logging.DEBUG if args.verbose > 0 else logging.INFO,
+        format="%(asctime)s %(levelname)-8.8s [%(name)s:%(lineno)s] %(message)s",
+    )
+
+    LOGGER.info(args)
+
+    if args.source == "hotness":
+        ingest_hotness_files(
+            paths=args.paths, out_path=args.out_path, workers=args.workers
+        )
+        return
+
+    if args.source == "dbpedia":
+        ingest_dbpedia_dump(
+            dump_paths=args.paths,
+            out_path=args.out_path,
+            workers=args.workers,
+            chunk_size=args.chunk_size * 1024 * 1024,
+        )
+        return
+
+    ingest_wikidata_dump(
+        dump_paths=args.paths,
+        out_path=args.out_path,
+        resolve_labels=not args.no_labels,
+        labels_path=args.labels_path,
+        workers=args.workers,
+        chunk_size=args.chunk_size * 1024 * 1024,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+""" Scrapy duplicate request filters """
+
+import os
+
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.utils.job import job_dir
+
+from .indexes import ScalableBloomFilter, SqliteStore
+
+
+class BloomDupeFilter(RFPDupeFilter):
+    """
+    request fingerprint duplicates filter backed by a scalable Bloom filter;
+    memory stays bounded, but a small fraction of requests will be dropped
+    as false positives
+    """
+
+    @classmethod
+    def from_settings(cls, settings):
+        """ init from settings """
+
+        return cls(
+            path=job_dir(settings),
+            debug=settings.getbool("DUPEFILTER_DEBUG"),
+            capacity=settings.getint("DUPEFILTER_BLOOM_CAPACITY", 1_000_000),
+            error_rate=settings.getfloat("DUPEFILTER_BLOOM_ERROR_RATE", 0.001),
+        )
+
+    def __init__(self, path=None, debug=False, capacity=1_000_000, error_rate=0.001):
+        super().__init__(path=None, debug=debug)
+        self.fingerprints = ScalableBloomFilter(
+            path=os.path.join(path, "requests.bloom") if path else None,
+            capacity=capacity,
+            error_rate=error_rate,
+        )
+
+    def request_seen(self, request):
+        """ True if request has (probably) been seen before """
+        return not self.fingerprints.add(self.request_fingerprint(request))
+
+    def close(self, reason):
+        """ close filter files """
+        self.fingerprints.close()
+
+
+class SqliteDupeFilter(RFPDupeFilter):
+    """
+    request fingerprint duplicates filter backed by an exact on-disk index;
+    memory stays bounded by the SQLite page cache
+    """
+
+    @classmethod
+    def from_settings(cls, settings):
+        """ init from settings """
+
+        return cls(path=job_dir(settings), debug=settings.getbool("DUPEFILTER_DEBUG"))
+
+    def __init__(self, path=None, debug=False):
+        super().__init__(path=None, debug=debug)
+        self.fingerprints = SqliteStore(
+            path=os.path.join(path, "requests.sqlite") if path else None,
+            table="fingerprints",
+        )
+
+    def request_seen(self, request):
+        """ True if request has been seen before """
+        return not self.fingerprints.add(self.request_fingerprint(request))
+
+    def close(self, reason):
+        """ close database """
+        self.fingerprints.close()
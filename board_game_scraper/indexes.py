@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+
+""" compact and persistent indexes for long running crawls """
+
+import hashlib
+import logging
+import math
+import mmap
+import os
+import sqlite3
+
+from pathlib import Path
+from time import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BitmapIdSet:
+    """
+    set of non-negative integer IDs backed by a bitmap; if a path is given, the
+    bitmap is memory-mapped to that file and updated in place
+    """
+
+    def __init__(self, path=None, chunk_size=1 << 16):
+        self.path = Path(path).resolve() if path else None
+        self.chunk_size = max(chunk_size, 1)
+        self._file = None
+
+        if self.path is None:
+            self._bitmap = bytearray()
+            self._count = 0
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a+b")  # pylint: disable=consider-using-with
+        size = os.fstat(self._file.fileno()).st_size
+        self._bitmap = self._map(size) if size else bytearray()
+        self._count = bin(int.from_bytes(self._bitmap, "little")).count("1")
+
+        LOGGER.info("loaded %d ID(s) from bitmap <%s>", self._count, self.path)
+
+    def _map(self, size):
+        return mmap.mmap(self._file.fileno(), size)
+
+    def _grow(self, min_size):
+        size = -(-min_size // self.chunk_size) * self.chunk_size
+
+        if self._file is None:
+            self._bitmap.extend(bytes(size - len(self._bitmap)))
+            return
+
+        if isinstance(self._bitmap, mmap.mmap):
+            self._bitmap.close()
+
+        self._file.truncate(size)
+        self._bitmap = self._map(size)
+
+    def __contains__(self, id_):
+        if not isinstance(id_, int) or id_ < 0:
+            return False
+        byte, bit = divmod(id_, 8)
+        return byte < len(self._bitmap) and bool(self._bitmap[byte] & (1 << bit))
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for byte in range(len(self._bitmap)):
+            value = self._bitmap[byte]
+            if not value:
+                continue
+            for bit in range(8):
+                if value & (1 << bit):
+                    yield byte * 8 + bit
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def add(self, id_):
+        """ add a single ID """
+
+        if id_ < 0:
+            raise ValueError(f"IDs must be non-negative, found {id_}")
+
+        byte, bit = divmod(id_, 8)
+
+        if byte >= len(self._bitmap):
+            self._grow(byte + 1)
+
+        value = self._bitmap[byte]
+        if not value & (1 << bit):
+            self._bitmap[byte] = value | (1 << bit)
+            self._count += 1
+
+    def update(self, *others):
+        """ add all IDs """
+        for other in others:
+            for id_ in other:
+                self.add(id_)
+
+    def flush(self):
+        """ write changes to disk """
+        if isinstance(self._bitmap, mmap.mmap):
+            self._bitmap.flush()
+
+    def close(self):
+        """ flush and close the underlying file """
+
+        if self._file is None:
+            return
+
+        if isinstance(self._bitmap, mmap.mmap):
+            self._bitmap.flush()
+            self._bitmap.close()
+
+        self._file.close()
+        self._file = None
+        self._bitmap = bytearray()
+        self._count = 0
+
+
+class ScalableBloomFilter:
+    """
+    scalable Bloom filter: a series of bitmaps with growing capacity and
+    tightening error rates such that the overall false positive rate stays
+    below the given error rate; bitmaps are persisted if a directory is given
+    """
+
+    def __init__(
+        self,
+        path=None,
+        capacity=1_000_000,
+        error_rate=0.001,
+        growth=2,
+        ratio=0.5,
+        prefix="bloom",
+    ):
+        self.path = Path(path).resolve() if path else None
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.ratio = ratio
+        self.prefix = prefix
+        self._slices = []
+
+        index = 0
+        while self.path is not None and self._slice_path(index).is_file():
+            self._add_slice()
+            index += 1
+
+        if not self._slices:
+            self._add_slice()
+
+        LOGGER.info(
+            "loaded Bloom filter with %d slice(s) and ~%d value(s)",
+            len(self._slices),
+            len(self),
+        )
+
+    def _slice_path(self, index):
+        return self.path / f"{self.prefix}.{index:03d}" if self.path else None
+
+    def _add_slice(self):
+        index = len(self._slices)
+        capacity = int(self.capacity * self.growth ** index)
+        error_rate = self.error_rate * (1 - self.ratio) * self.ratio ** index
+        num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        num_hashes = max(round(num_bits / capacity * math.log(2)), 1)
+        bitmap = BitmapIdSet(self._slice_path(index))
+        # estimate number of values from the fraction of bits set
+        fill = min(len(bitmap) / num_bits, 1 - 1 / num_bits)
+        count = round(-num_bits / num_hashes * math.log(1 - fill))
+        self._slices.append([bitmap, num_bits, num_hashes, capacity, count])
+
+    @staticmethod
+    def _hashes(value):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        digest = hashlib.sha1(value).digest()
+        return (
+            int.from_bytes(digest[:8], "little"),
+            int.from_bytes(digest[8:16], "little") | 1,
+        )
+
+    @staticmethod
+    def _bits(hashes, num_bits, num_hashes):
+        first, second = hashes
+        return ((first + i * second) % num_bits for i in range(num_hashes))
+
+    def _slice_contains(self, hashes, bitmap, num_bits, num_hashes):
+        return all(bit in bitmap for bit in self._bits(hashes, num_bits, num_hashes))
+
+    def __contains__(self, value):
+        hashes = self._hashes(value)
+        return any(
+            self._slice_contains(hashes, bitmap, num_bits, num_hashes)
+            for bitmap, num_bits, num_hashes, _, _ in self._slices
+        )
+
+    def __len__(self):
+        return sum(count for _, _, _, _, count in self._slices)
+
+    def add(self, value):
+        """ add value; returns False if value was (probably) added before """
+
+        hashes = self._hashes(value)
+
+        if any(
+            self._slice_contains(hashes, bitmap, num_bits, num_hashes)
+            for bitmap, num_bits, num_hashes, _, _ in self._slices
+        ):
+            return False
+
+        if self._slices[-1][4] >= self._slices[-1][3]:
+            self._slices[-1][0].flush()
+            self._add_slice()
+
+        curr = self._slices[-1]
+        bitmap, num_bits, num_hashes, _, _ = curr
+        for bit in self._bits(hashes, num_bits, num_hashes):
+            bitmap.add(bit)
+        curr[4] += 1
+
+        return True
+
+    def flush(self):
+        """ write changes to disk """
+        for bitmap, _, _, _, _ in self._slices:
+            bitmap.flush()
+
+    def close(self):
+        """ flush and close the underlying files """
+        for bitmap, _, _, _, _ in self._slices:
+            bitmap.close()
+
+
+class RangeIndex:
+    """
+    persistent set of non-negative integer IDs stored as disjoint ranges, compact
+    for long runs of consecutive IDs; in memory if no path is given; ranges
+    older than ttl seconds are ignored and evicted
+    """
+
+    def __init__(self, path=None, table="ranges", commit_every=1_000, ttl=None):
+        self.path = Path(path).resolve() if path else None
+        self.table = table
+        self.commit_every = commit_every
+        self.ttl = ttl or None
+        self._uncommitted = 0
+
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(str(self.path) if self.path else ":memory:")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            + "(start INTEGER PRIMARY KEY, end INTEGER, updated_at REAL)"
+        )
+        if self.ttl:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE updated_at < ?", (self._cutoff(),)
+            )
+        self._conn.commit()
+
+        LOGGER.info(
+            "opened range index <%s> with %d ID(s)", self.path or ":memory:", len(self)
+        )
+
+    def _cutoff(self):
+        return time() - self.ttl if self.ttl else -math.inf
+
+    def _range(self, id_):
+        row = self._conn.execute(
+            f"SELECT start, end FROM {self.table} WHERE start <= ? AND updated_at >= ? "
+            + "ORDER BY start DESC LIMIT 1",
+            (id_, self._cutoff()),
+        ).fetchone()
+        return row if row is not None and row[1] >= id_ else None
+
+    def __contains__(self, id_):
+        return isinstance(id_, int) and self._range(id_) is not None
+
+    def __len__(self):
+        return self._conn.execute(
+            f"SELECT COALESCE(SUM(end - start + 1), 0) FROM {self.table} "
+            + "WHERE updated_at >= ?",
+            (self._cutoff(),),
+        ).fetchone()[0]
+
+    def add(self, start, end=None):
+        """ add all IDs from start to end (inclusive), merging adjacent ranges """
+
+        end = start if end is None else end
+        if start < 0 or end < start:
+            raise ValueError(f"invalid range from {start} to {end}")
+
+        cutoff = self._cutoff()
+        rows = self._conn.execute(
+            f"SELECT start, end, updated_at FROM {self.table} "
+            + "WHERE start <= ? AND end >= ?",
+            (end + 1, start - 1),
+        ).fetchall()
+        for row_start, row_end, updated_at in rows:
+            # expired ranges are dropped rather than revived
+            if updated_at >= cutoff:
+                start = min(start, row_start)
+                end = max(end, row_end)
+
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE start <= ? AND end >= ?",
+            (end + 1, start - 1),
+        )
+        self._conn.execute(
+            f"INSERT INTO {self.table} (start, end, updated_at) VALUES (?, ?, ?)",
+            (start, end, time()),
+        )
+
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def next_missing(self, id_):
+        """ smallest ID from id_ onwards which is not in the index """
+        curr = self._range(id_)
+        while curr is not None:
+            id_ = curr[1] + 1
+            curr = self._range(id_)
+        return id_
+
+    def commit(self):
+        """ commit pending changes """
+        self._conn.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        """ commit and close the database """
+        self.commit()
+        self._conn.close()
+
+
+class SqliteStore:
+    """
+    persistent key-value store backed by SQLite; in memory if no path is given;
+    entries older than ttl seconds are ignored and evicted, as are the oldest
+    entries beyond max_size
+    """
+
+    def __init__(
+        self, path=None, table="store", commit_every=10_000, ttl=None, max_size=None
+    ):
+        self.path = Path(path).resolve() if path else None
+        self.table = table
+        self.commit_every = commit_every
+        self.ttl = ttl or None
+        self.max_size = max_size or None
+        self._uncommitted = 0
+
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(str(self.path) if self.path else ":memory:")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            + "(key TEXT PRIMARY KEY, value TEXT, updated_at REAL) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_updated_at "
+            + f"ON {self.table} (updated_at)"
+        )
+        self.evict()
+        self._conn.commit()
+
+        LOGGER.info(
+            "opened store <%s> with %d key(s)", self.path or ":memory:", len(self)
+        )
+
+    def _cutoff(self):
+        return time() - self.ttl if self.ttl else -math.inf
+
+    def _changed(self, count=1):
+        self._uncommitted += count
+        if self._uncommitted >= self.commit_every:
+            self.evict()
+            self.commit()
+
+    def __contains__(self, key):
+        cursor = self._conn.execute(
+            f"SELECT 1 FROM {self.table} WHERE key = ? AND updated_at >= ?",
+            (key, self._cutoff()),
+        )
+        return cursor.fetchone() is not None
+
+    def __len__(self):
+        return self._conn.execute(
+            f"SELECT COUNT(*) FROM {self.table} WHERE updated_at >= ?",
+            (self._cutoff(),),
+        ).fetchone()[0]
+
+    def items(self):
+        """ all current keys and values """
+        return self._conn.execute(
+            f"SELECT key, value FROM {self.table} WHERE updated_at >= ?",
+            (self._cutoff(),),
+        ).fetchall()
+
+    def add(self, key, value=None):
+        """ add key if not present yet; returns False if it existed before """
+
+        cursor = self._conn.execute(
+            f"INSERT INTO {self.table} (key, value, updated_at) VALUES (?, ?, ?) "
+            + "ON CONFLICT (key) DO UPDATE SET "
+            + "value = excluded.value, updated_at = excluded.updated_at "
+            + "WHERE updated_at < ?",
+            (key, value, time(), self._cutoff()),
+        )
+        if cursor.rowcount:
+            self._changed()
+            return True
+        return False
+
+    def get(self, key, default=None):
+        """ value stored for key """
+
+        row = self._conn.execute(
+            f"SELECT value FROM {self.table} WHERE key = ? AND updated_at >= ?",
+            (key, self._cutoff()),
+        ).fetchone()
+        return row[0] if row is not None else default
+
+    def set(self, key, value):
+        """ store value for key """
+
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, updated_at) "
+            + "VALUES (?, ?, ?)",
+            (key, value, time()),
+        )
+        self._changed()
+
+    def evict(self):
+        """ remove expired entries and the oldest ones beyond max_size """
+
+        removed = 0
+
+        if self.ttl:
+            removed += self._conn.execute(
+                f"DELETE FROM {self.table} WHERE updated_at < ?", (self._cutoff(),)
+            ).rowcount
+
+        if self.max_size:
+            excess = len(self) - self.max_size
+            if excess > 0:
+                removed += self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    + f"(SELECT key FROM {self.table} ORDER BY updated_at LIMIT ?)",
+                    (excess,),
+                ).rowcount
+
+        if removed:
+            LOGGER.info(
+                "evicted %d key(s) from store <%s>", removed, self.path or ":memory:"
+            )
+
+        return removed
+
+    def commit(self):
+        """ commit pending changes """
+        self._conn.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        """ evict, commit and close the database """
+        self.evict()
+        self.commit()
+        self._conn.close()
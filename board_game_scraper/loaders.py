@@ -2,15 +2,43 @@
 
 """ Scrapy item loaders """
 
+from collections import defaultdict
+from functools import lru_cache
+
+import jmespath
+
 from pytility import normalize_space
 from scrapy.loader import ItemLoader
 from scrapy.loader.processors import TakeFirst, MapCompose
+from scrapy.utils.misc import arg_to_iter
+from scrapy.utils.python import flatten, get_func_args
 from scrapy_extensions import JsonLoader
 from w3lib.html import remove_tags
 
 from .utils import identity, replace_all_entities
 
 
+@lru_cache(maxsize=None)
+def compile_jmes(expression):
+    """ compile a JMESPath expression, cached for the lifetime of the process """
+    return jmespath.compile(expression)
+
+
+class CompiledJsonLoader(JsonLoader):
+    """
+    JsonLoader which compiles every JMESPath expression only once; accepts
+    expression strings as well as already compiled expressions
+    """
+
+    def _get_jmes_values(self, jmes_paths):
+        return flatten(
+            (jmes if hasattr(jmes, "search") else compile_jmes(jmes)).search(
+                self.json_obj
+            )
+            for jmes in arg_to_iter(jmes_paths)
+        )
+
+
 class GameLoader(ItemLoader):
     """ loader for GameItem """
 
@@ -20,7 +48,7 @@ class GameLoader(ItemLoader):
     default_output_processor = TakeFirst()
 
 
-class GameJsonLoader(JsonLoader, GameLoader):
+class GameJsonLoader(CompiledJsonLoader, GameLoader):
     """ loader for GameItem plus JMESPath capabilities """
 
 
@@ -42,5 +70,84 @@ class RatingLoader(ItemLoader):
     default_output_processor = TakeFirst()
 
 
-class RatingJsonLoader(JsonLoader, RatingLoader):
+class RatingJsonLoader(CompiledJsonLoader, RatingLoader):
     """ loader for RatingItem plus JMESPath capabilities """
+
+
+def _compile_processor(proc):
+    """
+    unroll MapCompose into a plain function chain, skipping the per call
+    inspection of the functions' signatures
+    """
+
+    if not isinstance(proc, MapCompose) or any(
+        "loader_context" in get_func_args(func) for func in proc.functions
+    ):
+        return proc
+
+    functions = proc.functions
+
+    def _map_compose(values):
+        for func in functions:
+            next_values = []
+            for value in values:
+                next_values += arg_to_iter(func(value))
+            values = next_values
+        return values
+
+    return _map_compose
+
+
+class DirectLoader:
+    """
+    lightweight alternative to an ItemLoader for plain values: applies the same
+    input and output processors as the given loader class, but without
+    selectors or loader contexts and with processors looked up only once
+    """
+
+    def __init__(self, loader_cls):
+        self.loader_cls = loader_cls
+        self._processors = {}
+
+    def _field_processors(self, item, field_name):
+        key = (type(item), field_name)
+        processors = self._processors.get(key)
+
+        if processors is None:
+            field = item.fields[field_name]
+            in_proc = getattr(self.loader_cls, f"{field_name}_in", None) or field.get(
+                "input_processor", self.loader_cls.default_input_processor
+            )
+            out_proc = getattr(self.loader_cls, f"{field_name}_out", None) or field.get(
+                "output_processor", self.loader_cls.default_output_processor
+            )
+            processors = self._processors[key] = (
+                _compile_processor(in_proc),
+                _compile_processor(out_proc),
+            )
+
+        return processors
+
+    def load_item(self, item, values):
+        """ add (field, value) pairs to item the same way an ItemLoader would """
+
+        collected = defaultdict(list)
+
+        for field_name, value in item.items():
+            collected[field_name] += arg_to_iter(value)
+
+        for field_name, value in values:
+            if value is None:
+                continue
+            in_proc, _ = self._field_processors(item, field_name)
+            processed = in_proc(arg_to_iter(value))
+            if processed:
+                collected[field_name] += arg_to_iter(processed)
+
+        for field_name, field_values in collected.items():
+            _, out_proc = self._field_processors(item, field_name)
+            value = out_proc(field_values)
+            if value is not None:
+                item[field_name] = value
+
+        return item
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+""" Scrapy downloader middlewares """
+
+import logging
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks
+from twisted.internet.task import deferLater
+from twisted.internet.threads import deferToThread
+
+from .ratelimit import RedisTokenBucket, SqliteTokenBucket
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BatchFeedbackMiddleware:
+    """
+    report status, latency, and size of responses to batched requests
+    back to the spider's batch size controller
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """ init from crawler """
+
+        if not crawler.settings.getbool("BATCH_FEEDBACK_ENABLED"):
+            raise NotConfigured
+
+        return cls()
+
+    # pylint: disable=no-self-use
+    def _feedback(self, request, spider, **kwargs):
+        controller = getattr(spider, "batch_sizes", None)
+        batch_type = request.meta.get("batch_type")
+
+        if controller is None or not batch_type:
+            return
+
+        controller.feedback(
+            batch_type, latency=request.meta.get("download_latency"), **kwargs
+        )
+
+    def process_response(self, request, response, spider):
+        """ feedback response status and size """
+
+        self._feedback(
+            request, spider, status=response.status, response_size=len(response.body)
+        )
+        return response
+
+    def process_exception(self, request, exception, spider):
+        """ feedback download errors """
+
+        LOGGER.debug("error while downloading %r: %s", request, exception)
+        self._feedback(request, spider, error=True)
+
+
+class SharedRateLimitMiddleware:
+    """
+    enforce one request budget per domain across all processes on the host
+    through shared token buckets; processes with a higher priority may use the
+    reserve of the bucket, others wait until it is refilled without taking
+    tokens; throttling responses pause every process; the buckets are
+    accessed in a thread as they may block on other processes
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """ init from crawler """
+
+        settings = crawler.settings
+        domains = settings.getdict("RATE_LIMIT_DOMAINS")
+
+        if not settings.getbool("RATE_LIMIT_ENABLED") or not domains:
+            raise NotConfigured
+
+        redis_url = settings.get("RATE_LIMIT_REDIS_URL")
+        bucket = None
+
+        if redis_url:
+            try:
+                bucket = RedisTokenBucket(redis_url)
+            except ImportError:
+                LOGGER.warning("redis is not installed, falling back to SQLite")
+
+        if bucket is None:
+            bucket = SqliteTokenBucket(settings.get("RATE_LIMIT_PATH"))
+
+        middleware = cls(
+            bucket=bucket,
+            domains=domains,
+            burst=settings.getfloat("RATE_LIMIT_BURST", 1),
+            priority=settings.getint("RATE_LIMIT_PRIORITY"),
+            reserve=settings.getfloat("RATE_LIMIT_RESERVE"),
+            backoff_codes=settings.getlist("RATE_LIMIT_BACKOFF_CODES"),
+            backoff=settings.getfloat("RATE_LIMIT_BACKOFF"),
+            stats=crawler.stats,
+        )
+        crawler.signals.connect(middleware._spider_closed, signals.spider_closed)
+        return middleware
+
+    def __init__(
+        self,
+        bucket,
+        domains,
+        burst=1,
+        priority=0,
+        reserve=0,
+        backoff_codes=(429, 503),
+        backoff=0,
+        stats=None,
+    ):
+        self.bucket = bucket
+        self.domains = {domain: float(rate) for domain, rate in domains.items()}
+        self.burst = max(burst, 1)
+        # only processes with priority may dip into the reserve
+        self.floor = 0 if priority > 0 else min(reserve, self.burst - 1)
+        self.backoff_codes = frozenset(map(int, backoff_codes))
+        self.backoff = backoff
+        self.stats = stats
+
+    def _domain(self, request):
+        hostname = urlparse_cached(request).hostname or ""
+        for domain in self.domains:
+            if hostname == domain or hostname.endswith("." + domain):
+                return domain
+        return None
+
+    def _inc_stats(self, domain, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(f"rate_limit/{domain}/{key}", count)
+
+    def _acquire(self, domain):
+        return deferToThread(
+            self.bucket.acquire,
+            domain,
+            rate=self.domains[domain],
+            capacity=self.burst,
+            floor=self.floor,
+        )
+
+    @inlineCallbacks
+    def _wait_for_token(self, domain):
+        wait = yield self._acquire(domain)
+        self._inc_stats(domain, "requests")
+
+        if wait > 0:
+            self._inc_stats(domain, "waited")
+
+        while wait > 0:
+            LOGGER.debug("waiting %.1f seconds for a token for <%s>", wait, domain)
+            self._inc_stats(domain, "wait_time", wait)
+            yield deferLater(reactor, wait, lambda: None)
+            if self.floor:
+                # nothing was taken from the reserve, so try again
+                wait = yield self._acquire(domain)
+            else:
+                # the server may have throttled another request in the meantime
+                wait = yield deferToThread(self.bucket.blocked, domain)
+
+    def process_request(self, request, spider):
+        """ wait for a token of the request's domain """
+
+        domain = self._domain(request)
+        if domain is None:
+            return None
+
+        return self._wait_for_token(domain)
+
+    def process_response(self, request, response, spider):
+        """ pause all processes if the server throttles us """
+
+        domain = self._domain(request)
+
+        if domain is not None and response.status in self.backoff_codes:
+            LOGGER.info(
+                "received status %d from <%s>, pausing for %.1f seconds",
+                response.status,
+                domain,
+                self.backoff,
+            )
+            self._inc_stats(domain, f"backoff/{response.status}")
+            deferred = deferToThread(
+                self.bucket.penalize,
+                domain,
+                rate=self.domains[domain],
+                capacity=self.burst,
+                seconds=self.backoff,
+            )
+            deferred.addCallback(lambda _: response)
+            return deferred
+
+        return response
+
+    # pylint: disable=unused-argument
+    def _spider_closed(self, spider):
+        self.bucket.close()
@@ -10,17 +10,20 @@ from itertools import islice
 from urllib.parse import quote, unquote_plus
 from typing import Optional
 
-import jmespath
-
-from pytility import clear_list, take_first
+from pytility import clear_list
 from scrapy import Request
 from scrapy.exceptions import DropItem, NotConfigured
 from scrapy.utils.defer import defer_result
 from scrapy.utils.misc import arg_to_iter
 from scrapy.utils.python import flatten
-from twisted.internet.defer import DeferredList
+from twisted.internet.defer import Deferred, DeferredList
+from twisted.internet.task import LoopingCall
+from twisted.python.failure import Failure
 
-from .utils import REGEX_DBPEDIA_DOMAIN, parse_json, parse_url
+from .batching import BatchAccumulator
+from .indexes import SqliteStore
+from .loaders import compile_jmes
+from .utils import REGEX_DBPEDIA_DOMAIN, parse_json, parse_url, serialize_json
 
 LOGGER = logging.getLogger(__name__)
 
@@ -58,7 +61,12 @@ class DataTypePipeline:
 
 
 class ResolveLabelPipeline:
-    """ resolve labels """
+    """
+    resolve labels; labels are cached across runs, and concurrent lookups of
+    the same ID share a single request; if a batch URL is configured, IDs are
+    pooled and resolved in batches; IDs that cannot be resolved due to an error
+    are kept as they are
+    """
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -71,43 +79,165 @@ class ResolveLabelPipeline:
             raise NotConfigured
 
         lang_priorities = crawler.settings.getlist("RESOLVE_LABEL_LANGUAGE_PRIORITIES")
+        cache = SqliteStore(
+            path=crawler.settings.get("RESOLVE_LABEL_CACHE_PATH"),
+            table="labels",
+            commit_every=1_000,
+            ttl=crawler.settings.getfloat("RESOLVE_LABEL_CACHE_TTL"),
+            max_size=crawler.settings.getint("RESOLVE_LABEL_CACHE_MAX_SIZE"),
+        )
 
-        return cls(url=url, fields=fields, lang_priorities=lang_priorities)
+        return cls(
+            url=url,
+            fields=fields,
+            lang_priorities=lang_priorities,
+            labels=cache,
+            stats=crawler.stats,
+            batch_url=crawler.settings.get("RESOLVE_LABEL_BATCH_URL"),
+            batch_size=crawler.settings.getint("RESOLVE_LABEL_BATCH_SIZE"),
+            batch_timeout=crawler.settings.getfloat("RESOLVE_LABEL_BATCH_TIMEOUT"),
+        )
 
-    def __init__(self, url, fields, lang_priorities=None):
+    def __init__(
+        self,
+        url,
+        fields,
+        lang_priorities=None,
+        labels=None,
+        stats=None,
+        batch_url=None,
+        batch_size=50,
+        batch_timeout=1,
+    ):
         self.url = url
         self.fields = fields
         self.lang_priorities = {
             lang: prio for prio, lang in enumerate(arg_to_iter(lang_priorities))
         }
-        self.labels = {}
+        self.labels = labels if labels is not None else SqliteStore(table="labels")
+        self.stats = stats
+        # IDs with a request in flight mapped to Deferreds waiting for its result
+        self._in_flight = {}
         self.logger = LOGGER
 
-    def _extract_labels(self, response, value):
-        json_obj = parse_json(response.text) if hasattr(response, "text") else {}
+        self.batch_url = batch_url if batch_url and batch_size > 1 else None
+        self._pending = BatchAccumulator(batch_size=batch_size)
+        self._flush_loop = None
+        self._flush_interval = batch_timeout or 1
+
+    def _inc_stats(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(f"resolve_label/{key}", count)
+
+    def labels_from_json(self, json_obj, value):
+        """ extract labels of the given ID from an entity document and cache them """
+
+        # fixed expressions only, a new expression per ID would churn the cache
+        entities = compile_jmes("entities").search(json_obj)
+        entities = entities if isinstance(entities, dict) else {}
+        entity = entities.get(value) or next(
+            (
+                other
+                for other in entities.values()
+                if compile_jmes("redirects.from").search(other) == value
+            ),
+            None,
+        )
+
+        if not isinstance(entity, dict) or "missing" in entity:
+            # do not persist IDs the response does not know about (yet)
+            self.logger.debug("no entity found for %s", value)
+            self._inc_stats("missing")
+            return []
 
-        labels = take_first(jmespath.search(f"entities.{value}.labels", json_obj)) or {}
-        labels = labels.values()
+        labels = compile_jmes("labels").search(entity) or {}
+        labels = labels.values() if isinstance(labels, dict) else ()
         labels = sorted(
             labels,
             key=lambda label: self.lang_priorities.get(label.get("language"), math.inf),
         )
         labels = clear_list(label.get("value") for label in labels)
 
-        self.labels[value] = labels
+        self.labels.set(value, serialize_json(labels))
         self.logger.debug("resolved labels for %s: %s", value, labels)
 
         return labels
 
+    def _unresolved(self, value, reason):
+        """ keep the ID itself, without persisting the failed lookup """
+        self.logger.warning("unable to resolve labels for %s: %s", value, reason)
+        self._inc_stats("errors")
+        return [value]
+
+    def _extract_labels(self, response, value):
+        if not hasattr(response, "text"):
+            return self._unresolved(value, response)
+
+        return self.labels_from_json(parse_json(response.text) or {}, value)
+
+    def _extract_batch_labels(self, response, values):
+        if not hasattr(response, "text"):
+            for value in values:
+                self._release(self._unresolved(value, response), value)
+            return
+
+        json_obj = parse_json(response.text) or {}
+        for value in values:
+            try:
+                labels = self.labels_from_json(json_obj, value)
+            except Exception:  # pylint: disable=broad-except
+                labels = Failure()
+            self._release(labels, value)
+
+    def _release(self, labels, value):
+        if isinstance(labels, Failure):
+            labels = self._unresolved(value, labels)
+        for deferred in self._in_flight.pop(value, ()):
+            deferred.callback(labels)
+        return labels
+
+    def _batch_request(self, values, spider):
+        self.logger.debug("resolving labels for %d ID(s)", len(values))
+        self._inc_stats("requests")
+        request = Request(self.batch_url.format("|".join(values)), priority=1)
+        deferred = spider.crawler.engine.download(request, spider)
+        deferred.addBoth(self._extract_batch_labels, values)
+        return deferred
+
+    def _flush(self, spider):
+        for batch in self._pending.pop(force=True):
+            self._batch_request(batch, spider)
+
     def _deferred_value(self, value, spider):
-        labels = self.labels.get(value)
+        labels = parse_json(self.labels.get(value))
         if labels is not None:
             self.logger.debug("found labels in cache for %s: %s", value, labels)
+            self._inc_stats("cached")
             return defer_result(labels)
 
+        waiting = self._in_flight.get(value)
+        if waiting is not None:
+            self.logger.debug("waiting for request in flight for %s", value)
+            self._inc_stats("coalesced")
+            deferred = Deferred()
+            waiting.append(deferred)
+            return deferred
+
+        self._inc_stats("ids")
+
+        if self.batch_url:
+            deferred = Deferred()
+            self._in_flight[value] = [deferred]
+            for batch in self._pending.add(value):
+                self._batch_request(batch, spider)
+            return deferred
+
+        self._in_flight[value] = []
+        self._inc_stats("requests")
         request = Request(self.url.format(value), priority=1)
         deferred = spider.crawler.engine.download(request, spider)
         deferred.addBoth(self._extract_labels, value)
+        deferred.addBoth(self._release, value)
         return deferred
 
     def _add_value(self, result, field, item):
@@ -141,6 +271,19 @@ class ResolveLabelPipeline:
         deferred.addBoth(lambda _: item)
         return deferred
 
+    def open_spider(self, spider):
+        """ flush partial batches periodically """
+        if self.batch_url:
+            self._flush_loop = LoopingCall(self._flush, spider)
+            self._flush_loop.start(self._flush_interval, now=False)
+
+    # pylint: disable=unused-argument
+    def close_spider(self, spider):
+        """ persist the label cache """
+        if self._flush_loop is not None and self._flush_loop.running:
+            self._flush_loop.stop()
+        self.labels.close()
+
 
 class ResolveImagePipeline:
     """ resolve image URLs """
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+""" token buckets shared between processes """
+
+import logging
+import sqlite3
+import threading
+
+from pathlib import Path
+from time import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _refill(tokens, updated_at, curr_time, rate, capacity):
+    if tokens is None or updated_at is None:
+        return capacity
+    return min(capacity, tokens + max(curr_time - updated_at, 0) * rate)
+
+
+class SqliteTokenBucket:
+    """
+    token buckets per key in a SQLite database, shared by all processes with
+    access to the file; an acquisition without floor reserves its token right
+    away, possibly running the bucket into debt, and returns how long to wait
+    before using it; one with a floor only takes tokens above that floor and
+    otherwise returns how long to wait before trying again, so the reserve
+    stays available to those without floor; safe to use from multiple threads
+    """
+
+    def __init__(self, path=None, table="buckets", timeout=10):
+        self.path = Path(path).resolve() if path else None
+        self.table = table
+
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(
+            str(self.path) if self.path else ":memory:",
+            timeout=timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            + "(key TEXT PRIMARY KEY, tokens REAL, updated_at REAL, blocked_until REAL)"
+        )
+
+        LOGGER.info("opened token buckets <%s>", self.path or ":memory:")
+
+    def _update(self, key, rate, capacity, func):
+        with self._lock:
+            # take the write lock up front so concurrent updates are serialised
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT tokens, updated_at, blocked_until FROM {self.table} "
+                    + "WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                tokens, updated_at, blocked_until = row or (None, None, None)
+                curr_time = time()
+                tokens = _refill(tokens, updated_at, curr_time, rate, capacity)
+                tokens, blocked_until, result = func(
+                    tokens, blocked_until or 0, curr_time
+                )
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} "
+                    + "(key, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)",
+                    (key, tokens, curr_time, blocked_until),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def acquire(self, key, rate, capacity, floor=0, cost=1):
+        """
+        take cost tokens and return the seconds to wait until the bucket would
+        have been at floor again; with a floor, nothing is taken unless the
+        wait is zero, the caller has to try again after the returned seconds
+        """
+
+        def _acquire(tokens, blocked_until, _):
+            wait = max(floor - tokens + cost, 0) / rate
+            if floor <= 0 or wait <= 0:
+                tokens -= cost
+            return tokens, blocked_until, wait
+
+        return self._update(key, rate, capacity, _acquire)
+
+    def penalize(self, key, rate, capacity, seconds):
+        """
+        empty the bucket such that further acquisitions wait for seconds;
+        penalties do not stack, the bucket's debt is capped at seconds
+        """
+        return self._update(
+            key,
+            rate,
+            capacity,
+            lambda tokens, blocked_until, curr_time: (
+                min(tokens, -seconds * rate),
+                max(blocked_until, curr_time + seconds),
+                None,
+            ),
+        )
+
+    def blocked(self, key):
+        """
+        seconds until the latest penalty ends; tokens acquired before the
+        penalty should not be used before then
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT blocked_until FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        return max((row[0] or 0) - time(), 0) if row else 0
+
+    def close(self):
+        """ close the database """
+        with self._lock:
+            self._conn.close()
+
+
+class RedisTokenBucket:
+    """
+    token buckets per key in Redis, shared by all processes with access to the
+    server; same semantics as SqliteTokenBucket, using the server's clock
+    """
+
+    script = """
+        if redis.replicate_commands then
+            -- effects replication, needed for TIME before Redis 5
+            redis.replicate_commands()
+        end
+        local clock = redis.call("TIME")
+        local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+        if ARGV[1] == "blocked" then
+            local blocked_until = tonumber(redis.call("HGET", KEYS[1], "blocked_until"))
+            return tostring(math.max((blocked_until or 0) - now, 0))
+        end
+        local rate = tonumber(ARGV[1])
+        local capacity = tonumber(ARGV[2])
+        local floor = tonumber(ARGV[3])
+        local cost = tonumber(ARGV[4])
+        local penalty = tonumber(ARGV[5])
+        local state = redis.call("HMGET", KEYS[1], "tokens", "updated_at", "blocked_until")
+        local tokens = tonumber(state[1])
+        local updated_at = tonumber(state[2])
+        if tokens == nil or updated_at == nil then
+            tokens = capacity
+        else
+            tokens = math.min(capacity, tokens + math.max(now - updated_at, 0) * rate)
+        end
+        local blocked_until = tonumber(state[3]) or 0
+        local wait = 0
+        if penalty > 0 then
+            tokens = math.min(tokens, -penalty * rate)
+            blocked_until = math.max(blocked_until, now + penalty)
+        else
+            wait = math.max(floor - tokens + cost, 0) / rate
+            if floor <= 0 or wait <= 0 then
+                tokens = tokens - cost
+            end
+        end
+        redis.call(
+            "HSET", KEYS[1],
+            "tokens", tokens, "updated_at", now, "blocked_until", blocked_until
+        )
+        local ttl = math.max((capacity - tokens) / rate, blocked_until - now)
+        redis.call("EXPIRE", KEYS[1], math.ceil(ttl) + 60)
+        return tostring(wait)
+    """
+
+    def __init__(self, url, prefix="rate_limit:"):
+        # pylint: disable=import-outside-toplevel
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.script)
+
+        LOGGER.info("using token buckets in Redis <%s>", url)
+
+    def acquire(self, key, rate, capacity, floor=0, cost=1):
+        """
+        take cost tokens and return the seconds to wait until the bucket would
+        have been at floor again; with a floor, nothing is taken unless the
+        wait is zero, the caller has to try again after the returned seconds
+        """
+        return float(
+            self._script(
+                keys=[self.prefix + key], args=[rate, capacity, floor, cost, 0]
+            )
+        )
+
+    def penalize(self, key, rate, capacity, seconds):
+        """
+        empty the bucket such that further acquisitions wait for seconds;
+        penalties do not stack, the bucket's debt is capped at seconds
+        """
+        self._script(keys=[self.prefix + key], args=[rate, capacity, 0, 0, seconds])
+
+    def blocked(self, key):
+        """
+        seconds until the latest penalty ends; tokens acquired before the
+        penalty should not be used before then
+        """
+        return float(self._script(keys=[self.prefix + key], args=["blocked"]))
+
+    def close(self):
+        """ close the connection """
+        self._client.close()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+""" plan recrawls by how fast the scraped data changes """
+
+import logging
+import math
+import os
+
+from pytility import parse_float, parse_int
+
+from .indexes import SqliteStore
+from .utils import now, parse_json, serialize_json
+
+LOGGER = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+
+
+class RecrawlPlanner:
+    """
+    track votes and rank of games across crawls and derive how often each game
+    is worth refreshing: a game's change rate is the number of new votes plus
+    rank positions it moved per day; it is due once the changes expected since
+    the last scrape reach min_change, and due games are ranked by that amount
+    """
+
+    def __init__(
+        self,
+        path=None,
+        min_change=10,
+        min_interval=DAY,
+        max_interval=90 * DAY,
+        prior_days=10 * 365,
+        smoothing=0.5,
+    ):
+        self.store = SqliteStore(path, table="games", commit_every=1_000)
+        self.min_change = min_change
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        # games without history are assumed to have gathered their votes evenly
+        self.prior_days = prior_days
+        self.smoothing = smoothing
+
+    def __len__(self):
+        return len(self.store)
+
+    def _record(self, bgg_id):
+        return parse_json(self.store.get(str(bgg_id))) or {}
+
+    def _rate(self, record):
+        rate = parse_float(record.get("rate"))
+        if rate is not None:
+            return rate
+        num_votes = parse_int(record.get("num_votes")) or 0
+        return num_votes / self.prior_days
+
+    def observe(self, bgg_id, num_votes=None, rank=None, scraped_at=None):
+        """ record a scrape of that game and update its change rate """
+
+        bgg_id = parse_int(bgg_id)
+        if bgg_id is None:
+            return
+
+        scraped_at = parse_float(scraped_at) or now().timestamp()
+        num_votes = parse_int(num_votes)
+        rank = parse_int(rank)
+
+        record = self._record(bgg_id)
+        prev_at = parse_float(record.get("scraped_at"))
+        rate = parse_float(record.get("rate"))
+
+        if prev_at is not None and scraped_at < prev_at:
+            # older than what we know already
+            return
+
+        if prev_at is not None and scraped_at - prev_at >= DAY / 24:
+            prev_votes = parse_int(record.get("num_votes"))
+            prev_rank = parse_int(record.get("rank"))
+            changes = 0
+            if num_votes is not None and prev_votes is not None:
+                changes += abs(num_votes - prev_votes)
+            if rank is not None and prev_rank is not None:
+                changes += abs(rank - prev_rank)
+            observed = changes * DAY / (scraped_at - prev_at)
+            rate = (
+                observed
+                if rate is None
+                else self.smoothing * observed + (1 - self.smoothing) * rate
+            )
+
+        record = {"num_votes": num_votes, "rank": rank, "scraped_at": scraped_at}
+        if rate is not None:
+            record["rate"] = rate
+        self.store.set(str(bgg_id), serialize_json(record))
+
+    def load_snapshot(self, path):
+        """
+        seed games from a merged JSON lines file of GameItems; the file's
+        modification time serves as scrape time as merged items carry none
+        """
+
+        if not path or not os.path.isfile(path):
+            LOGGER.warning("no snapshot found at <%s>", path)
+            return 0
+
+        scraped_at = os.path.getmtime(path)
+        count = 0
+
+        with open(path, encoding="utf-8") as file_obj:
+            for line in file_obj:
+                game = parse_json(line)
+                bgg_id = parse_int(game.get("bgg_id")) if game else None
+                if bgg_id is None:
+                    continue
+                prev_at = parse_float(self._record(bgg_id).get("scraped_at"))
+                if prev_at is not None and prev_at >= scraped_at:
+                    continue
+                self.observe(
+                    bgg_id,
+                    num_votes=game.get("num_votes"),
+                    rank=game.get("rank"),
+                    scraped_at=scraped_at,
+                )
+                count += 1
+
+        LOGGER.info("loaded %d game(s) from snapshot <%s>", count, path)
+        return count
+
+    def interval(self, record):
+        """ seconds between two scrapes of that game """
+        rate = self._rate(record)
+        interval = self.min_change / rate * DAY if rate > 0 else math.inf
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def _status(self, record, curr_time):
+        scraped_at = parse_float(record.get("scraped_at")) or 0
+        elapsed = curr_time - scraped_at
+        changes = self._rate(record) * elapsed / DAY
+        return elapsed >= self.interval(record), changes
+
+    def status(self, bgg_id, curr_time=None):
+        """
+        whether that game is due for a refresh and the number of changes
+        expected since its last scrape, or None if the game is unknown
+        """
+
+        value = self.store.get(str(bgg_id))
+        if value is None:
+            return None
+        return self._status(parse_json(value) or {}, curr_time or now().timestamp())
+
+    def plan(self, curr_time=None):
+        """
+        IDs of games due for a refresh and of those not yet due, each with the
+        number of changes expected since their last scrape, most changes first
+        """
+
+        curr_time = curr_time or now().timestamp()
+        due = []
+        not_due = []
+
+        for key, value in self.store.items():
+            is_due, changes = self._status(parse_json(value) or {}, curr_time)
+            if is_due:
+                due.append((int(key), changes))
+            else:
+                not_due.append((int(key), changes))
+
+        due.sort(key=lambda x: -x[1])
+        not_due.sort(key=lambda x: -x[1])
+
+        return due, not_due
+
+    def close(self):
+        """ persist the index """
+        self.store.close()
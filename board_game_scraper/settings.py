@@ -178,7 +178,19 @@ DEFAULT_REQUEST_HEADERS = {
 
 # Enable or disable downloader middlewares
 # See http://scrapy.readthedocs.org/en/latest/topics/downloader-middleware.html
-DOWNLOADER_MIDDLEWARES = {"scrapy_extensions.DelayedRetry": 555}
+DOWNLOADER_MIDDLEWARES = {
+    "scrapy_extensions.DelayedRetry": 555,
+    "board_game_scraper.middlewares.BatchFeedbackMiddleware": 560,
+    "board_game_scraper.middlewares.SharedRateLimitMiddleware": 585,
+}
+
+# Duplicate request filters: scrapy.dupefilters.RFPDupeFilter (default),
+# board_game_scraper.dupefilters.SqliteDupeFilter (exact, on disk), or
+# board_game_scraper.dupefilters.BloomDupeFilter (approximate, bounded memory);
+# opt in to SqliteDupeFilter for long bgg crawls with a JOBDIR
+DUPEFILTER_CLASS = os.getenv("DUPEFILTER_CLASS") or "scrapy.dupefilters.RFPDupeFilter"
+DUPEFILTER_BLOOM_CAPACITY = 1_000_000
+DUPEFILTER_BLOOM_ERROR_RATE = 0.001
 
 # Enable or disable extensions
 # See http://scrapy.readthedocs.org/en/latest/topics/extensions.html
@@ -254,6 +266,62 @@ DUMP_STATS_INTERVAL = 5 * 60
 SCRAPE_BGG_RATINGS = True
 SCRAPE_BGG_COLLECTIONS = True
 SCRAPE_BGG_USERS = True
+BGG_USERS_FRESHNESS = None  # process every user only once per job
+BGG_RATINGS_PAGE_WINDOW = 4
+BGG_DIRECT_RATINGS = False  # build RatingItems without ItemLoader
+BGG_COLLECTION_STREAMING = True  # parse collections incrementally
+BGG_USERS_INDEX_PATH = os.path.join(BASE_DIR, ".scrapy", "bgg_users.sqlite")
+BGG_COLLECTION_MAX_AGE = 30 * 24 * 60 * 60  # refetch unchanged collections monthly
+# refresh known games by how fast their data changes, including those found while
+# browsing; off by default as it re-queues every game in the index on each run
+BGG_RECRAWL_ENABLED = False
+BGG_RECRAWL_INDEX_PATH = os.path.join(BASE_DIR, ".scrapy", "bgg_recrawl.sqlite")
+BGG_RECRAWL_SNAPSHOT = os.getenv("BGG_RECRAWL_SNAPSHOT")  # merged bgg_GameItem.jl
+BGG_RECRAWL_MIN_CHANGE = 10  # new votes plus rank moves expected before a refresh
+BGG_RECRAWL_MIN_INTERVAL = 24 * 60 * 60  # 1 day
+BGG_RECRAWL_MAX_INTERVAL = 90 * 24 * 60 * 60  # 90 days
+BGG_ID_SWEEP_ENABLED = False  # discover games by sweeping the ID space, not browsing
+BGG_ID_SWEEP_TYPES = ("boardgame",)
+BGG_ID_SWEEP_START_ID = 1
+BGG_ID_SWEEP_MAX_ID = None  # otherwise stop once past the frontier
+BGG_ID_SWEEP_FRONTIER = 10_000  # IDs to probe beyond the highest one found
+BGG_ID_SWEEP_WINDOW = 4  # sweep requests in flight
+BGG_ID_SWEEP_MAX_STRIDE = 8
+BGG_ID_SWEEP_DEAD_IDS_PATH = os.path.join(BASE_DIR, ".scrapy", "bgg_dead_ids.sqlite")
+BGG_ID_SWEEP_DEAD_IDS_TTL = 180 * 24 * 60 * 60  # 180 days
+BGG_THING_BATCH_SIZE = 20
+BGG_THING_BATCH_TIMEOUT = 60  # 1 minute
+BGG_THING_BATCH_ADAPTIVE = True
+BGG_THING_BATCH_SIZE_MIN = 1
+BGG_THING_BATCH_SIZE_MAX = 20
+BGG_THING_BATCH_TARGET_LATENCY = 30  # 30 seconds
+BGG_THING_BATCH_MAX_RESPONSE_SIZE = 10 * 1024 * 1024  # 10 MB
+
+WIKIDATA_ENTITY_BATCH_SIZE = 50  # 0 to request every entity separately
+DBPEDIA_GAME_BATCH_SIZE = 20  # 0 to query every game separately
+DBPEDIA_SPARQL_MAX_ROWS = 10_000  # result limit of the endpoint
+BGG_RANKINGS_CDX_ENABLED = True  # plan Wayback Machine snapshots via the CDX API
+BGG_RANKINGS_CDX_URL = "https://web.archive.org/cdx/search/cdx"
+BGG_RANKINGS_CDX_FILE = os.getenv("BGG_RANKINGS_CDX_FILE")  # local stand-in
+BGG_RANKINGS_COVERAGE_PATH = os.path.join(
+    BASE_DIR, ".scrapy", "bgg_rankings_snapshots.sqlite"
+)
+
+BATCH_FEEDBACK_ENABLED = False
+
+# Rate limits shared by all processes on the host, enable when several scrapers
+# hit the same site at the same time
+RATE_LIMIT_ENABLED = parse_bool(os.getenv("RATE_LIMIT_ENABLED"))
+RATE_LIMIT_DOMAINS = {"boardgamegeek.com": 2.0}  # requests per second
+RATE_LIMIT_BURST = 5
+RATE_LIMIT_PRIORITY = 0  # processes with priority may use the reserve
+RATE_LIMIT_RESERVE = 2
+RATE_LIMIT_BACKOFF_CODES = (429, 503)
+RATE_LIMIT_BACKOFF = 30  # seconds every process pauses after being throttled
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH") or os.path.join(
+    BASE_DIR, "feeds", ".rate_limit.sqlite"  # feeds are shared by all containers
+)
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
 
 # State tags
 STATE_TAG_FILE = ".state"
@@ -270,6 +338,13 @@ MEDIA_ALLOW_REDIRECTS = True
 LIMIT_IMAGES_TO_DOWNLOAD = 0
 LIMIT_IMAGES_URLS_FIELD = "image_url"
 
+# ResolveLabelPipeline
+RESOLVE_LABEL_CACHE_PATH = os.path.join(BASE_DIR, ".scrapy", "labels.sqlite")
+RESOLVE_LABEL_CACHE_TTL = 60 * 60 * 24 * 30  # 30 days
+RESOLVE_LABEL_CACHE_MAX_SIZE = 1_000_000
+RESOLVE_LABEL_BATCH_SIZE = 50
+RESOLVE_LABEL_BATCH_TIMEOUT = 1  # 1 second
+
 # Image processing
 IMAGES_STORE = os.path.join(BASE_DIR, "images")
 IMAGES_URLS_FIELD = "image_url_download"
@@ -288,6 +363,8 @@ BGA_CLIENT_ID = os.getenv("BGA_CLIENT_ID")
 BGA_SCRAPE_IMAGES = False
 BGA_SCRAPE_VIDEOS = False
 BGA_SCRAPE_REVIEWS = False
+BGA_GAME_REQUESTS_TIMEOUT = 300  # 5 minutes
+BGA_PAGE_WINDOW = 4
 
 PULL_QUEUE_ENABLED = False
 PULL_QUEUE_PROJECT = os.getenv("PULL_QUEUE_PROJECT")
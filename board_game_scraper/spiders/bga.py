@@ -6,10 +6,12 @@ import os
 
 from functools import partial
 from itertools import chain
+from time import time
 from urllib.parse import urlencode
 
 from pytility import parse_float, parse_int
-from scrapy import Request, Spider
+from scrapy import Request, Spider, signals
+from scrapy.exceptions import DontCloseSpider
 from scrapy.utils.project import get_project_settings
 
 from ..items import GameItem, RatingItem
@@ -37,9 +39,19 @@ def _extract_bga_id(item=None, response=None):
     return extract_bga_id(url)
 
 
-def _extract_requests(response=None):
-    meta = extract_meta(response)
-    return meta.get("game_requests")
+class _GameJoin:
+    """ collect the results of a game's concurrent sub-requests into its item """
+
+    def __init__(self, item, parts, timeout=None):
+        self.item = item
+        self.pending = set(parts)
+        self.timeout = timeout
+        self.started = time()
+        self.done = False
+
+    def expired(self):
+        """ True iff the sub-requests were scheduled longer than timeout ago """
+        return self.timeout is not None and time() - self.started >= self.timeout
 
 
 class BgaSpider(Spider):
@@ -49,6 +61,7 @@ class BgaSpider(Spider):
     allowed_domains = ("boardgameatlas.com",)
     item_classes = (GameItem, RatingItem)
     api_url = API_URL
+    page_window = 4
 
     custom_settings = {
         "IMAGES_URLS_FIELD": None,
@@ -66,6 +79,7 @@ class BgaSpider(Spider):
         kwargs.setdefault("settings", crawler.settings)
         spider = cls(*args, **kwargs)
         spider._set_crawler(crawler)
+        crawler.signals.connect(spider._spider_idle, signal=signals.spider_idle)
         return spider
 
     def __init__(self, *args, settings=None, **kwargs):
@@ -75,6 +89,11 @@ class BgaSpider(Spider):
         self.scrape_images = settings.getbool("BGA_SCRAPE_IMAGES")
         self.scrape_videos = settings.getbool("BGA_SCRAPE_VIDEOS")
         self.scrape_reviews = settings.getbool("BGA_SCRAPE_REVIEWS")
+        self.game_requests_timeout = (
+            settings.getfloat("BGA_GAME_REQUESTS_TIMEOUT") or None
+        )
+        self._joins = set()
+        self.page_window = max(settings.getint("BGA_PAGE_WINDOW", self.page_window), 1)
 
     def _api_url(self, path="search", query=None):
         query = query or {}
@@ -92,19 +111,114 @@ class BgaSpider(Spider):
         if self.scrape_reviews:
             yield self._api_url("game/reviews", {"game_id": bga_id}), self.parse_reviews
 
-    # pylint: disable=no-self-use
-    def _next_request_or_item(self, item, requests):
+    def _next_offsets(self, response, num_results, total=None):
+        """
+        offsets of further pages: the first page fans out to a window of pages,
+        every further page moves the window by one; without a total, pages are
+        requested speculatively and an empty page ends its part of the window
+        """
+
+        if not num_results:
+            return ()
+
+        skip = parse_int(extract_query_param(response.url, "skip")) or 0
+        limit = parse_int(extract_query_param(response.url, "limit")) or 100
+        page = skip // limit
+        pages = (
+            range(1, self.page_window + 1) if page == 0 else (page + self.page_window,)
+        )
+        offsets = (p * limit for p in pages)
+
+        if total is not None:
+            offsets = (offset for offset in offsets if offset < total)
+
+        return tuple((offset, limit) for offset in offsets)
+
+    def _inc_stats(self, key, count=1):
+        if getattr(self, "crawler", None) is not None:
+            self.crawler.stats.inc_value(f"bga/game_requests/{key}", count)
+
+    def _requests_or_item(self, item, requests):
+        """ all sub-requests of a game at once, or the item if there are none """
+
         if not requests:
-            return item
-
-        url, callback = requests.pop(0)
-        callback = partial(callback, item=item)
-        return Request(
-            url=url,
-            callback=callback,
-            errback=callback,
-            meta={"item": item, "game_requests": requests},
+            yield item
+            return
+
+        join = _GameJoin(
+            item=item,
+            parts=(url for url, _ in requests),
+            timeout=self.game_requests_timeout,
         )
+        self._joins.add(join)
+
+        for url, parse in requests:
+            callback = partial(self._join, join=join, part=url, parse=parse)
+            yield Request(
+                url=url,
+                callback=callback,
+                errback=callback,
+                meta={"item": item},
+                priority=3,
+            )
+
+    def _finish(self, join):
+        join.done = True
+        self._joins.discard(join)
+        return join.item
+
+    def _expired_items(self, force=False):
+        """ items of games that timed out, or of all waiting games if forced """
+
+        for join in tuple(self._joins):
+            expired = join.expired()
+            if expired or force:
+                self.logger.debug(
+                    "%s waiting for %d request(s) for <%s>",
+                    "timeout" if expired else "gave up",
+                    len(join.pending),
+                    join.item.get("url"),
+                )
+                self._inc_stats("timed_out" if expired else "abandoned")
+                yield self._finish(join)
+
+    def _parse_waiting(self, response):
+        # pylint: disable=unused-argument
+        yield from self._expired_items(force=True)
+
+    def _spider_idle(self):
+        # nothing is in flight anymore, so waiting games won't receive any more
+        # sub-responses, e.g., because they were dropped by the dupefilter
+        if not self._joins:
+            return
+
+        self.logger.info("emitting %d game(s) waiting for requests", len(self._joins))
+        self.crawler.engine.crawl(
+            Request(
+                url="data:,",
+                callback=self._parse_waiting,
+                dont_filter=True,
+                priority=3,
+            ),
+            self,
+        )
+
+        raise DontCloseSpider
+
+    def _join(self, response, join, part, parse):
+        yield from self._expired_items()
+
+        if join.done:
+            # arrived after the game timed out
+            self._inc_stats("late")
+            return
+
+        join.item = parse(response, item=join.item)
+        join.pending.discard(part)
+
+        if not join.pending:
+            self._inc_stats("joined")
+            yield self._finish(join)
 
     def start_requests(self):
         """ generate start requests """
@@ -125,7 +239,7 @@ class BgaSpider(Spider):
         """
         @url https://api.boardgameatlas.com/api/search?client_id=8jfqHypg2l&order_by=popularity&limit=100
         @returns items 100 100
-        @returns requests 1 1
+        @returns requests 4 4
         @scrapes name description url image_url bga_id scraped_at worst_rating best_rating
         """
 
@@ -133,14 +247,15 @@ class BgaSpider(Spider):
         games = result.get("games") or ()
         scraped_at = now()
 
-        if games:
-            skip = parse_int(extract_query_param(response.url, "skip")) or 0
-            limit = parse_int(extract_query_param(response.url, "limit")) or 100
-            query = {"order_by": "popularity", "skip": skip + limit, "limit": limit}
+        total = parse_int(result.get("count"))
+        for skip, limit in self._next_offsets(response, len(games), total):
+            query = {"order_by": "popularity", "skip": skip, "limit": limit}
             yield Request(
                 url=self._api_url(query=query), callback=self.parse, priority=2
             )
 
+        yield from self._expired_items()
+
         for game in games:
             bga_id = game.get("id") or extract_bga_id(game.get("url"))
             ldr = GameJsonLoader(
@@ -191,7 +306,7 @@ class BgaSpider(Spider):
 
             item = ldr.load_item()
             requests = list(self._game_requests(bga_id))
-            yield self._next_request_or_item(item, requests)
+            yield from self._requests_or_item(item, requests)
 
     def parse_images(self, response, item=None):
         """
@@ -209,9 +324,7 @@ class BgaSpider(Spider):
         ldr.add_jmes("image_url", "images[].url")
         ldr.add_jmes("image_url", "images[].thumb")
 
-        item = ldr.load_item()
-        requests = _extract_requests(response)
-        return self._next_request_or_item(item, requests)
+        return ldr.load_item()
 
     def parse_videos(self, response, item=None):
         """
@@ -228,9 +341,7 @@ class BgaSpider(Spider):
         ldr.add_value("video_url", item.get("video_url"))
         ldr.add_jmes("video_url", "videos[].url")
 
-        item = ldr.load_item()
-        requests = _extract_requests(response)
-        return self._next_request_or_item(item, requests)
+        return ldr.load_item()
 
     # pylint: disable=no-self-use
     def parse_reviews(self, response, item=None):
@@ -248,15 +359,13 @@ class BgaSpider(Spider):
         ldr.add_value("review_url", item.get("review_url"))
         ldr.add_jmes("review_url", "reviews[].url")
 
-        item = ldr.load_item()
-        requests = _extract_requests(response)
-        return self._next_request_or_item(item, requests)
+        return ldr.load_item()
 
     def parse_user_reviews(self, response):
         """
         @url https://api.boardgameatlas.com/api/reviews?client_id=8jfqHypg2l&limit=100
         @returns items 100 100
-        @returns requests 1 1
+        @returns requests 4 4
         @scrapes item_id bga_id bga_user_id bga_user_name
         """
 
@@ -264,10 +373,9 @@ class BgaSpider(Spider):
         reviews = result.get("reviews") or ()
         scraped_at = now()
 
-        if reviews:
-            skip = parse_int(extract_query_param(response.url, "skip")) or 0
-            limit = parse_int(extract_query_param(response.url, "limit")) or 100
-            query = {"skip": skip + limit, "limit": limit}
+        total = parse_int(result.get("count"))
+        for skip, limit in self._next_offsets(response, len(reviews), total):
+            query = {"skip": skip, "limit": limit}
             yield Request(
                 url=self._api_url(path="reviews", query=query),
                 callback=self.parse_user_reviews,
@@ -291,3 +399,10 @@ class BgaSpider(Spider):
             ldr.add_value("comment", "\n".join(filter(None, comments)))
 
             yield ldr.load_item()
+
+    def closed(self, reason):
+        """ report games still waiting for sub-requests """
+        if self._joins:
+            self.logger.warning(
+                "closing spider with %d game(s) waiting for requests", len(self._joins)
+            )
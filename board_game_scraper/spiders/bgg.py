@@ -2,38 +2,60 @@
 
 """ BoardGameGeek spider """
 
+import logging
+import math
 import os
 import re
-import statistics
 
+from collections import defaultdict
+from datetime import datetime, timezone
 from functools import partial
-from itertools import repeat
+from io import BytesIO
+from random import randrange
 from urllib.parse import urlencode
 
-from pytility import batchify, clear_list, normalize_space, parse_float, parse_int
+from lxml import etree
+from pytility import (
+    batchify,
+    clear_list,
+    normalize_space,
+    parse_date,
+    parse_float,
+    parse_int,
+)
 from scrapy import signals
-from scrapy import Request, Spider
+from scrapy import Request, Selector, Spider
+from scrapy.exceptions import DontCloseSpider
+from scrapy.http import TextResponse
+from scrapy.utils.job import job_dir
 from scrapy.utils.misc import arg_to_iter
 from scrapy.utils.project import get_project_settings
 
+from ..batching import AdaptiveBatchSize, BatchAccumulator
+from ..indexes import BitmapIdSet, RangeIndex, SqliteStore
 from ..items import GameItem, RatingItem, UserItem
-from ..loaders import GameLoader, RatingLoader, UserLoader
+from ..loaders import DirectLoader, GameLoader, RatingLoader, UserLoader
+from ..recrawl import RecrawlPlanner
 from ..utils import (
     extract_bgg_id,
     extract_bgg_user_name,
     extract_item,
     extract_query_param,
     now,
+    parse_json,
+    serialize_json,
+    weighted_mean,
+    weighted_median_grouped,
 )
 
-DIGITS_REGEX = re.compile(r"^\D*(\d+).*$")
+LOGGER = logging.getLogger(__name__)
 
+DIGITS_REGEX = re.compile(r"^\D*(\d+).*$")
+DIRECT_RATING_LOADER = DirectLoader(RatingLoader)
 
-def _parse_int(element, xpath, default=None, lenient=False):
-    if not element or not xpath:
-        return default
 
-    string = normalize_space(element.xpath(xpath).extract_first())
+def _parse_int(string, default=None, lenient=False):
+    string = normalize_space(string)
 
     if not string:
         return default
@@ -47,9 +69,110 @@ def _parse_int(element, xpath, default=None, lenient=False):
     return result if result is not None else default
 
 
+def _attr(element, attr):
+    return element.get(attr) if element is not None else None
+
+
+def _iterparse_children(body, tag):
+    """
+    parse an XML document incrementally: yield the root element first, then its
+    children with the given tag one at a time; every child is removed from the
+    tree once the next one is requested, so memory does not grow with the document
+    """
+
+    root = None
+    events = etree.iterparse(
+        BytesIO(body),
+        events=("start", "end"),
+        huge_tree=True,
+        recover=True,
+        remove_comments=True,
+        resolve_entities=False,
+    )
+
+    try:
+        for event, element in events:
+            if root is None:
+                root = element
+                yield root
+                continue
+
+            if (
+                event != "end"
+                or element.tag != tag
+                or element.getparent() is not root
+            ):
+                continue
+
+            yield element
+
+            element.clear()
+            while element.getprevious() is not None:
+                del root[0]
+
+    except etree.XMLSyntaxError as exc:
+        # even recover cannot deal with, e.g., an empty document
+        LOGGER.warning("stopped parsing XML document: %s", exc)
+
+
+class _ThingIndex:
+    """
+    single pass over the children of a thing item, bucketing links by type,
+    polls by name and ranks by type
+    """
+
+    def __init__(self, element):
+        self.links = defaultdict(list)
+        self.polls = {}
+        self.ratings = {}
+        self.ranks = defaultdict(list)
+        self.children = defaultdict(list)
+
+        for child in element.iterchildren(tag=etree.Element):
+            tag = child.tag
+            if tag == "link":
+                self.links[child.get("type")].append(child)
+            elif tag == "poll":
+                self.polls.setdefault(child.get("name"), child)
+            elif tag == "statistics":
+                self._index_statistics(child)
+            else:
+                self.children[tag].append(child)
+
+    def _index_statistics(self, statistics):
+        for ratings in statistics.iterchildren("ratings"):
+            for child in ratings.iterchildren(tag=etree.Element):
+                if child.tag == "ranks":
+                    for rank in child.iterchildren("rank"):
+                        self.ranks[rank.get("type")].append(rank)
+                else:
+                    self.ratings.setdefault(child.tag, child)
+
+    def first(self, tag):
+        """ first child element with that tag """
+        children = self.children.get(tag)
+        return children[0] if children else None
+
+    def values(self, tag, attr="value"):
+        """ attribute of all child elements with that tag """
+        return [child.get(attr) for child in self.children.get(tag, ())]
+
+    def rating(self, tag):
+        """ value of the statistics/ratings element with that tag """
+        return _attr(self.ratings.get(tag), "value")
+
+    def inbound_ids(self, link_type):
+        """ IDs of inbound links of that type """
+        return [
+            link.get("id")
+            for link in self.links.get(link_type, ())
+            if link.get("inbound") == "true"
+        ]
+
+
 def _parse_player_count(poll):
-    for result in poll.xpath("results"):
-        numplayers = normalize_space(result.xpath("@numplayers").extract_first())
+    for result in poll.iterchildren("results"):
+        numplayers = normalize_space(result.get("numplayers"))
         players = parse_int(numplayers)
 
         if not players and numplayers.endswith("+"):
@@ -59,31 +182,33 @@ def _parse_player_count(poll):
         if not players:
             continue
 
-        votes_best = _parse_int(result, 'result[@value = "Best"]/@numvotes', 0)
-        votes_rec = _parse_int(result, 'result[@value = "Recommended"]/@numvotes', 0)
-        votes_not = _parse_int(
-            result, 'result[@value = "Not Recommended"]/@numvotes', 0
-        )
+        votes = {}
+        for vote in result.iterchildren("result"):
+            votes.setdefault(vote.get("value"), vote.get("numvotes"))
+
+        votes_best = _parse_int(votes.get("Best"), 0)
+        votes_rec = _parse_int(votes.get("Recommended"), 0)
+        votes_not = _parse_int(votes.get("Not Recommended"), 0)
 
         yield players, votes_best, votes_rec, votes_not
 
 
 def _parse_votes(poll, attr="value", enum=False):
-    if not poll:
+    if poll is None:
         return
 
-    for i, result in enumerate(poll.xpath("results/result"), start=1):
-        value = i if enum else _parse_int(result, "@" + attr, lenient=True)
-        numvotes = _parse_int(result, "@numvotes", 0)
+    for i, result in enumerate(poll.iterfind("results/result"), start=1):
+        value = i if enum else _parse_int(result.get(attr), lenient=True)
+        numvotes = _parse_int(result.get("numvotes"), 0)
 
         if value is not None:
-            yield from repeat(value, numvotes)
+            yield value, numvotes
 
 
 def _value_id(items, sep=":"):
     for item in arg_to_iter(items):
-        value = item.xpath("@value").extract_first() or ""
-        id_ = item.xpath("@id").extract_first() or ""
+        value = item.get("value") or ""
+        id_ = item.get("id") or ""
         yield f"{value}{sep}{id_}" if id_ else value
 
 
@@ -97,9 +222,9 @@ def _remove_rank(value):
 
 def _value_id_rank(items, sep=":"):
     for item in arg_to_iter(items):
-        value = item.xpath("@friendlyname").extract_first() or ""
+        value = item.get("friendlyname") or ""
         value = _remove_rank(value)
-        id_ = item.xpath("@id").extract_first() or ""
+        id_ = item.get("id") or ""
         yield f"{value}{sep}{id_}" if id_ else value
 
 
@@ -129,6 +254,7 @@ class BggSpider(Spider):
         "DELAYED_RETRY_DELAY": 5.0,
         "AUTOTHROTTLE_HTTP_CODES": (429, 503, 504),
         "PULL_QUEUE_ENABLED": True,
+        "BATCH_FEEDBACK_ENABLED": True,
         "LIMIT_IMAGES_TO_DOWNLOAD": parse_int(os.getenv("LIMIT_IMAGES_TO_DOWNLOAD_BGG"))
         or 0,
     }
@@ -137,6 +263,21 @@ class BggSpider(Spider):
     scrape_collections = False
     scrape_users = False
     min_votes = 20
+    batch_size = 20
+    batch_timeout = 60
+    users_freshness = None
+    ratings_window = 4
+    direct_ratings = False
+    stream_collections = False
+    collection_max_age = 30 * 24 * 60 * 60
+    sweep = False
+    sweep_types = ("boardgame",)
+    sweep_start_id = 1
+    sweep_max_id = None
+    sweep_frontier = 10_000
+    sweep_window = 4
+    sweep_max_stride = 8
+    sweep_max_retries = 2
 
     @classmethod
     def from_crawler(cls, crawler, *args, **kwargs):
@@ -145,27 +286,140 @@ class BggSpider(Spider):
         kwargs.pop("settings", None)
         spider = cls(*args, settings=crawler.settings, **kwargs)
         spider._set_crawler(crawler)
+        spider.batch_sizes.stats = crawler.stats
 
         crawler.signals.connect(spider._spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(spider._spider_idle, signal=signals.spider_idle)
 
         return spider
 
     def __init__(self, *args, settings=None, **kwargs):
         super().__init__(*args, **kwargs)
-        self._ids_seen = set()
 
         settings = settings or get_project_settings()
 
+        jobdir = job_dir(settings)
+        self._ids_seen = BitmapIdSet(
+            os.path.join(jobdir, "ids_seen.bitmap") if jobdir else None
+        )
+        self._users_seen = SqliteStore(
+            os.path.join(jobdir, "users_seen.sqlite") if jobdir else None,
+            table="users",
+        )
+        # collection freshness across jobs: pubdate, last login and scrape time
+        self._users_index = SqliteStore(
+            settings.get("BGG_USERS_INDEX_PATH"), table="users", commit_every=1_000
+        )
+
+        self._recrawl = (
+            RecrawlPlanner(
+                path=settings.get("BGG_RECRAWL_INDEX_PATH"),
+                min_change=settings.getfloat("BGG_RECRAWL_MIN_CHANGE", 10),
+                min_interval=settings.getfloat(
+                    "BGG_RECRAWL_MIN_INTERVAL", 24 * 60 * 60
+                ),
+                max_interval=settings.getfloat(
+                    "BGG_RECRAWL_MAX_INTERVAL", 90 * 24 * 60 * 60
+                ),
+            )
+            if settings.getbool("BGG_RECRAWL_ENABLED")
+            else None
+        )
+        self.recrawl_snapshot = settings.get("BGG_RECRAWL_SNAPSHOT")
+
+        self.sweep = settings.getbool("BGG_ID_SWEEP_ENABLED", self.sweep)
+        self.sweep_types = (
+            tuple(settings.getlist("BGG_ID_SWEEP_TYPES")) or self.sweep_types
+        )
+        self.sweep_start_id = settings.getint(
+            "BGG_ID_SWEEP_START_ID", self.sweep_start_id
+        )
+        self.sweep_max_id = settings.getint("BGG_ID_SWEEP_MAX_ID") or self.sweep_max_id
+        self.sweep_frontier = settings.getint(
+            "BGG_ID_SWEEP_FRONTIER", self.sweep_frontier
+        )
+        self.sweep_window = max(
+            settings.getint("BGG_ID_SWEEP_WINDOW", self.sweep_window), 1
+        )
+        self.sweep_max_stride = max(
+            settings.getint("BGG_ID_SWEEP_MAX_STRIDE", self.sweep_max_stride), 1
+        )
+        # IDs known not to belong to any thing of the swept types
+        self._dead_ids = (
+            RangeIndex(
+                settings.get("BGG_ID_SWEEP_DEAD_IDS_PATH"),
+                table="dead_ids",
+                ttl=settings.getfloat("BGG_ID_SWEEP_DEAD_IDS_TTL"),
+            )
+            if self.sweep
+            else None
+        )
+        self._sweep = {
+            "cursor": self.sweep_start_id,
+            "stride": 1,
+            "max_hit": 0,
+            # spans to sweep densely after a hit while skipping ahead
+            "fill": [],
+            # empty IDs above the highest hit, these may still be assigned later
+            "empty": set(),
+            # batches of failed requests and their number of attempts
+            "retry": [],
+        }
+
         self.scrape_ratings = settings.getbool("SCRAPE_BGG_RATINGS")
         self.scrape_collections = self.scrape_ratings and settings.getbool(
             "SCRAPE_BGG_COLLECTIONS"
         )
         self.scrape_users = self.scrape_ratings and settings.getbool("SCRAPE_BGG_USERS")
         self.min_votes = settings.getint("MIN_VOTES", self.min_votes)
+        self.users_freshness = (
+            settings.getfloat("BGG_USERS_FRESHNESS") or self.users_freshness
+        )
+        self.direct_ratings = settings.getbool(
+            "BGG_DIRECT_RATINGS", self.direct_ratings
+        )
+        self.stream_collections = settings.getbool(
+            "BGG_COLLECTION_STREAMING", self.stream_collections
+        )
+        self.collection_max_age = settings.getfloat(
+            "BGG_COLLECTION_MAX_AGE", self.collection_max_age
+        )
+        self.ratings_window = max(
+            settings.getint("BGG_RATINGS_PAGE_WINDOW", self.ratings_window), 1
+        )
+        self.batch_size = settings.getint("BGG_THING_BATCH_SIZE", self.batch_size)
+        self.batch_timeout = settings.getfloat(
+            "BGG_THING_BATCH_TIMEOUT", self.batch_timeout
+        )
+        self._ids_pending = BatchAccumulator(
+            batch_size=self.batch_size, timeout=self.batch_timeout
+        )
+        adaptive = settings.getbool("BGG_THING_BATCH_ADAPTIVE")
+        self.batch_sizes = AdaptiveBatchSize(
+            initial=self.batch_size,
+            min_size=(
+                settings.getint("BGG_THING_BATCH_SIZE_MIN", 1)
+                if adaptive
+                else self.batch_size
+            ),
+            max_size=(
+                settings.getint("BGG_THING_BATCH_SIZE_MAX", 20)
+                if adaptive
+                else self.batch_size
+            ),
+            target_latency=settings.getfloat("BGG_THING_BATCH_TARGET_LATENCY"),
+            max_response_size=settings.getint("BGG_THING_BATCH_MAX_RESPONSE_SIZE"),
+            stats_prefix="bgg/batch_size",
+        )
 
         self.logger.info("scrape ratings: %r", self.scrape_ratings)
         self.logger.info("scrape collections: %r", self.scrape_collections)
         self.logger.info("scrape users: %r", self.scrape_users)
+        self.logger.info(
+            "%s thing batch size: %d",
+            "adaptive" if adaptive else "fixed",
+            self.batch_size,
+        )
 
     def _spider_opened(self):
         state = getattr(self, "state", None)
@@ -175,12 +429,52 @@ class BggSpider(Spider):
             state = {}
             self.state = state
 
-        ids_seen = state.get("ids_seen") or frozenset()
-        self.logger.info("%d ID(s) seen in previous state", len(ids_seen))
-
+        # migrate IDs from state of previous versions into the bitmap
+        ids_seen = state.pop("ids_seen", None) or frozenset()
         self._ids_seen |= ids_seen
 
-        self.state["ids_seen"] = self._ids_seen
+        self.logger.info("%d ID(s) seen in previous runs", len(self._ids_seen))
+
+        ids_pending = state.get("ids_pending") or ()
+        self.logger.info("%d ID(s) pending in previous state", len(ids_pending))
+
+        self._ids_pending.add(*ids_pending)
+
+        self.state["ids_pending"] = self._ids_pending
+
+        if self.sweep:
+            self._sweep.update(state.get("sweep") or {})
+            self.logger.info("sweeping IDs from %d", self._sweep["cursor"])
+            self.state["sweep"] = self._sweep
+
+    def _spider_idle(self):
+        # flush partial batch of game IDs before closing
+        requests = list(self._pending_game_requests(force=True))
+
+        if not requests:
+            return
+
+        self.logger.info("scheduling %d pending game request(s)", len(requests))
+
+        for request in requests:
+            self.crawler.engine.crawl(request, self)
+
+        raise DontCloseSpider
+
+    def closed(self, reason):
+        """ persist seen IDs on close """
+        self.logger.info("closing spider with %d ID(s) seen", len(self._ids_seen))
+        self._ids_seen.close()
+        self._users_seen.close()
+        self._users_index.close()
+        if self._recrawl is not None:
+            self._recrawl.close()
+        if self._dead_ids is not None:
+            self._dead_ids.close()
+
+    def _inc_stats(self, key, count=1):
+        if getattr(self, "crawler", None) is not None:
+            self.crawler.stats.inc_value(f"bgg/collections/{key}", count)
 
     def _api_url(self, action, **kwargs):
         kwargs["pagesize"] = self.page_size
@@ -189,50 +483,94 @@ class BggSpider(Spider):
             self.xml_api_url, action, urlencode(sorted(params, key=lambda x: x[0]))
         )
 
-    def _game_requests(self, *bgg_ids, batch_size=10, page=1, priority=0, **kwargs):
-        bgg_ids = clear_list(map(parse_int, bgg_ids))
-
-        if not bgg_ids:
-            return
-
-        bgg_ids = (
-            (bgg_id for bgg_id in bgg_ids if bgg_id not in self._ids_seen)
+    def _batch_type(self, page=1):
+        return "ratings" if page == 1 and self.scrape_ratings else "stats"
+
+    def _thing_request(
+        self,
+        bgg_ids,
+        page=1,
+        priority=0,
+        types=None,
+        callback=None,
+        errback=None,
+        **kwargs,
+    ):
+        ids = ",".join(map(str, bgg_ids))
+
+        url = (
+            self._api_url(
+                action="thing",
+                id=ids,
+                stats=1,
+                videos=1,
+                versions=int(self.scrape_ratings),
+                ratingcomments=int(self.scrape_ratings),
+                page=1,
+                type=",".join(types) if types else None,
+            )
             if page == 1
-            else bgg_ids
+            else self._api_url(
+                action="thing", id=ids, versions=1, ratingcomments=1, page=page
+            )
         )
 
-        for batch in batchify(bgg_ids, batch_size):
-            batch = tuple(batch)
+        request = Request(
+            url,
+            callback=callback or self.parse_game,
+            errback=errback,
+            priority=priority,
+        )
 
-            ids = ",".join(map(str, batch))
+        if len(bgg_ids) == 1:
+            request.meta["bgg_id"] = bgg_ids[0]
+        if page == 1:
+            batch_type = self._batch_type(page)
+            request.meta["batch_type"] = batch_type
+            self.batch_sizes.record_request(batch_type, len(bgg_ids))
+        request.meta["page"] = page
+        request.meta.update(kwargs)
 
-            url = (
-                self._api_url(
-                    action="thing",
-                    id=ids,
-                    stats=1,
-                    videos=1,
-                    versions=int(self.scrape_ratings),
-                    ratingcomments=int(self.scrape_ratings),
-                    page=1,
-                )
-                if page == 1
-                else self._api_url(
-                    action="thing", id=ids, versions=1, ratingcomments=1, page=page
-                )
-            )
+        return request
+
+    def _pending_game_requests(self, force=False):
+        batch_size = self.batch_sizes.size(self._batch_type())
+        for batch in self._ids_pending.pop(batch_size=batch_size, force=force):
+            yield self._thing_request(batch)
 
-            request = Request(url, callback=self.parse_game, priority=priority)
+    def _game_requests(self, *bgg_ids, batch_size=None, page=1, priority=0, **kwargs):
+        bgg_ids = clear_list(map(parse_int, bgg_ids))
+
+        if page == 1:
+            bgg_ids = [bgg_id for bgg_id in bgg_ids if bgg_id not in self._ids_seen]
+
+        if page == 1 and not priority and not kwargs and self._recrawl is not None:
+            # known games found while browsing are ranked like in the recrawl plan
+            bgg_ids, known = self._recrawl_partition(bgg_ids)
+            for known_priority, known_ids in sorted(known.items(), reverse=True):
+                yield from self._game_requests(
+                    *known_ids,
+                    batch_size=batch_size,
+                    priority=known_priority,
+                    recrawl=True,
+                )
 
-            if len(batch) == 1:
-                request.meta["bgg_id"] = batch[0]
-            request.meta["page"] = page
-            request.meta.update(kwargs)
+        if page != 1 or priority or kwargs:
+            # special requests are sent right away
+            batch_size = batch_size or self.batch_sizes.size(self._batch_type(page))
+            for batch in batchify(bgg_ids, batch_size):
+                batch = tuple(batch)
+                yield self._thing_request(batch, page=page, priority=priority, **kwargs)
+                if page == 1:
+                    self._ids_seen.update(batch)
+            return
 
-            yield request
+        # pool new IDs across responses and send full batches only
+        self._ids_seen.update(bgg_ids)
 
-            if page == 1:
-                self._ids_seen.update(batch)
+        batch_size = batch_size or self.batch_sizes.size(self._batch_type())
+        for batch in self._ids_pending.add(*bgg_ids, batch_size=batch_size):
+            yield self._thing_request(batch)
 
     def _game_request(self, bgg_id, default=None, **kwargs):
         return next(self._game_requests(bgg_id, **kwargs), default)
@@ -261,6 +599,312 @@ class BggSpider(Spider):
 
         return request
 
+    @staticmethod
+    def _recrawl_priority(changes, due=True):
+        if not due:
+            # games not yet due only get whatever budget is left in the end
+            return -2
+        # buckets of expected changes: <10, <100, <1000 and more
+        return min(int(math.log10(1 + changes)), 3) - 1
+
+    def _recrawl_partition(self, bgg_ids):
+        """ new games, and known games by their recrawl priority """
+
+        curr_time = now().timestamp()
+        new = []
+        known = defaultdict(list)
+
+        for bgg_id in bgg_ids:
+            status = self._recrawl.status(bgg_id, curr_time=curr_time)
+            if status is None:
+                new.append(bgg_id)
+                continue
+            due, changes = status
+            known[self._recrawl_priority(changes, due=due)].append(bgg_id)
+
+        return new, known
+
+    def _recrawl_requests(self):
+        """
+        refresh requests for known games, those due and expected to have changed
+        the most first and with higher priority
+        """
+
+        if self.recrawl_snapshot:
+            self._recrawl.load_snapshot(self.recrawl_snapshot)
+
+        due, not_due = self._recrawl.plan()
+        self.logger.info(
+            "%d known game(s) due for a refresh, %d not yet", len(due), len(not_due)
+        )
+        if getattr(self, "crawler", None) is not None:
+            self.crawler.stats.set_value("bgg/recrawl/due", len(due))
+            self.crawler.stats.set_value("bgg/recrawl/not_due", len(not_due))
+
+        batch_size = self.batch_sizes.size(self._batch_type())
+
+        for batch in batchify(due, batch_size):
+            bgg_ids, changes = zip(*batch)
+            yield from self._game_requests(
+                *bgg_ids,
+                batch_size=batch_size,
+                priority=self._recrawl_priority(max(changes)),
+                recrawl=True,
+            )
+
+        for batch in batchify(not_due, batch_size):
+            bgg_ids, _ = zip(*batch)
+            yield from self._game_requests(
+                *bgg_ids,
+                batch_size=batch_size,
+                priority=self._recrawl_priority(0, due=False),
+                recrawl=True,
+            )
+
+    def _sweep_ids(self, start, end, stride, limit):
+        """
+        up to limit IDs from start to end, at most one at a random position per
+        stride step, skipping dead and seen IDs; also the known games that were
+        skipped and the position to continue from
+        """
+
+        ids = []
+        known = []
+        pos = start
+
+        while pos <= end and len(ids) < limit:
+            step_end = min(pos + stride, end + 1)
+            bgg_id = self._dead_ids.next_missing(pos + randrange(step_end - pos))
+            if stride > 1 and bgg_id >= step_end:
+                pos = step_end
+                continue
+            if bgg_id > end:
+                pos = bgg_id
+                break
+            if bgg_id not in self._ids_seen:
+                ids.append(bgg_id)
+            elif bgg_id not in self._sweep["empty"]:
+                # seen by other means, e.g., a recrawl or a previous run
+                known.append(bgg_id)
+            pos = step_end if stride > 1 else bgg_id + 1
+
+        return ids, known, pos
+
+    def _sweep_batch(self):
+        batch_size = self.batch_sizes.size(self._batch_type())
+        retry = self._sweep["retry"]
+        fill = self._sweep["fill"]
+
+        if retry:
+            ids, attempts = retry.pop()
+            return ids, min(ids), max(ids), 1, attempts
+
+        while fill:
+            start, end = fill[-1]
+            ids, known, pos = self._sweep_ids(start, end, 1, batch_size)
+            if pos > end:
+                fill.pop()
+            else:
+                fill[-1] = (pos, end)
+            self._sweep_known(known, 1, (start, pos - 1))
+            if ids:
+                return ids, start, pos - 1, 1, 0
+
+        while True:
+            frontier = max(self._sweep["max_hit"], self.sweep_start_id)
+            end = frontier + self.sweep_frontier
+            if self.sweep_max_id:
+                end = min(end, self.sweep_max_id)
+            if self._sweep["cursor"] > end:
+                return None
+
+            start = self._sweep["cursor"]
+            stride = self._sweep["stride"]
+            ids, known, pos = self._sweep_ids(start, end, stride, batch_size)
+            self._sweep["cursor"] = pos
+            self._sweep_known(known, stride, (start, pos - 1))
+            if ids:
+                return ids, start, pos - 1, stride, 0
+
+    def _sweep_requests(self, count=1):
+        for _ in range(count):
+            batch = self._sweep_batch()
+
+            if batch is None:
+                self.logger.info(
+                    "ID sweep done up to %d, highest ID found: %d",
+                    self._sweep["cursor"] - 1,
+                    self._sweep["max_hit"],
+                )
+                return
+
+            ids, start, end, stride, attempts = batch
+            self._ids_seen.update(ids)
+            yield self._thing_request(
+                ids,
+                types=self.sweep_types,
+                callback=self.parse_sweep,
+                errback=self._sweep_failed,
+                sweep_span=(start, end),
+                sweep_stride=stride,
+                sweep_attempts=attempts,
+            ).replace(dont_filter=attempts > 0)
+
+    def _record_dead(self, ids):
+        runs = []
+        for bgg_id in sorted(ids):
+            if runs and bgg_id == runs[-1][1] + 1:
+                runs[-1][1] = bgg_id
+            else:
+                runs.append([bgg_id, bgg_id])
+        for start, end in runs:
+            self._dead_ids.add(start, end)
+
+    def _sweep_hit(self, bgg_id):
+        """ raise the highest hit, empty IDs below it are not assigned anymore """
+
+        if bgg_id <= self._sweep["max_hit"]:
+            return
+
+        self._sweep["max_hit"] = bgg_id
+        empty = self._sweep["empty"]
+        below = {empty_id for empty_id in empty if empty_id < bgg_id}
+        if below:
+            self._record_dead(below)
+            empty -= below
+
+    def _sweep_known(self, known, stride, span):
+        """ games skipped by the sweep as they were seen before count as hits """
+
+        if not known:
+            return
+
+        self._inc_sweep_stats("known", len(known))
+        self._sweep_hit(max(known))
+
+        if stride > 1:
+            self._sweep["fill"].append(span)
+            self._inc_sweep_stats("fills")
+        self._sweep["stride"] = 1
+
+    def _sweep_feedback(self, requested, found, span, stride):
+        """ record empty IDs and adapt the stride to the hits of a sweep batch """
+
+        hits = requested & found
+        empty = requested - found
+        self._inc_sweep_stats("ids", len(requested))
+        self._inc_sweep_stats("hits", len(hits))
+
+        if hits:
+            self._sweep_hit(max(hits))
+
+        below = {bgg_id for bgg_id in empty if bgg_id < self._sweep["max_hit"]}
+        if below:
+            self._record_dead(below)
+        self._sweep["empty"] |= empty - below
+
+        if not hits:
+            self._sweep["stride"] = min(
+                self._sweep["stride"] * 2, self.sweep_max_stride
+            )
+            return
+
+        if stride > 1:
+            # skipped IDs around a hit are likely games as well
+            self._sweep["fill"].append(span)
+            self._inc_sweep_stats("fills")
+        self._sweep["stride"] = 1
+
+    def _inc_sweep_stats(self, key, count=1):
+        if getattr(self, "crawler", None) is not None:
+            self.crawler.stats.inc_value(f"bgg/sweep/{key}", count)
+
+    def _sweep_retry(self, request, reason):
+        """ queue the IDs of a failed sweep request unless out of retries """
+
+        ids = list(map(parse_int, extract_query_param(request.url, "id").split(",")))
+        attempts = request.meta.get("sweep_attempts", 0) + 1
+
+        if attempts <= self.sweep_max_retries:
+            self.logger.info("sweep request failed, retrying later: %s", reason)
+            self._inc_sweep_stats("retried")
+            self._sweep["retry"].append((ids, attempts))
+        else:
+            self.logger.warning(
+                "sweep request failed %d times, dropping IDs %s: %s",
+                attempts,
+                ids,
+                reason,
+            )
+            self._inc_sweep_stats("failed")
+            self._inc_sweep_stats("failed_ids", len(ids))
+
+    def _sweep_failed(self, failure):
+        self._sweep_retry(failure.request, failure)
+        return list(self._sweep_requests())
+
+    def start_requests(self):
+        """
+        browse pages or an ID sweep for discovery, then refreshes of known games
+        """
+
+        if self.sweep:
+            yield from self._sweep_requests(self.sweep_window)
+        else:
+            yield from super().start_requests()
+
+        if self._recrawl is not None:
+            yield from self._recrawl_requests()
+
+    def _user_record(self, user_name):
+        return parse_json(self._users_index.get(user_name)) or {}
+
+    def _update_user_record(self, user_name, **values):
+        record = self._user_record(user_name)
+        record.update(values)
+        self._users_index.set(user_name, serialize_json(record))
+
+    def _collection_scraped_at(self, record):
+        """ time of the last collection scrape, unless it is older than max age """
+        scraped_at = parse_float(record.get("scraped_at"))
+        if (
+            scraped_at is None
+            or now().timestamp() - scraped_at >= self.collection_max_age
+        ):
+            return None
+        return datetime.fromtimestamp(scraped_at, timezone.utc)
+
+    def _collection_fresh(self, record):
+        """ True if the collection cannot have changed since it was last scraped """
+
+        scraped_at = self._collection_scraped_at(record)
+        last_login = parse_date(record.get("last_login"), tzinfo=timezone.utc)
+        # logins are reported by day, so one on the day of the scrape may be later
+        return (
+            scraped_at is not None
+            and last_login is not None
+            and last_login.date() < scraped_at.date()
+        )
+
+    def _collection_or_user_request(self, user_name):
+        """
+        collection request, or a request for the user to check their last login
+        first if the collection has been scraped recently
+        """
+
+        user_name = user_name.lower()
+
+        if (
+            not self.scrape_users
+            or self._collection_scraped_at(self._user_record(user_name)) is None
+        ):
+            return self.collection_request(user_name)
+
+        self._inc_stats("checked")
+        request = self._user_item_or_request(user_name, scraped_at=now())
+        request.meta["bgg_check_collection"] = True
+        return request
+
     def _filter_votes(self, votes_best, votes_rec, votes_not, best=False):
         if votes_best + votes_rec + votes_not < self.min_votes / 2:
             return False
@@ -274,14 +918,13 @@ class BggSpider(Spider):
 
         return votes_true > votes_false
 
-    def _player_count_votes(self, game):
-        min_players = _parse_int(game, "minplayers/@value")
-        max_players = _parse_int(game, "maxplayers/@value")
+    def _player_count_votes(self, index):
+        min_players = _parse_int(_attr(index.first("minplayers"), "value"))
+        max_players = _parse_int(_attr(index.first("maxplayers"), "value"))
 
-        polls = game.xpath('poll[@name = "suggested_numplayers"]')
-        poll = polls[0] if polls else None
+        poll = index.polls.get("suggested_numplayers")
 
-        if not poll or _parse_int(poll, "@totalvotes", 0) < self.min_votes:
+        if poll is None or _parse_int(poll.get("totalvotes"), 0) < self.min_votes:
             return min_players, max_players, min_players, max_players
 
         votes = sorted(_parse_player_count(poll), key=lambda x: x[0])
@@ -298,12 +941,11 @@ class BggSpider(Spider):
         )
 
     def _poll(
-        self, game, name, attr="value", enum=False, func=statistics.mean, default=None
+        self, index, name, attr="value", enum=False, func=weighted_mean, default=None
     ):
-        polls = game.xpath('poll[@name = "{}"]'.format(name))
-        poll = polls[0] if polls else None
+        poll = index.polls.get(name)
 
-        if not poll or _parse_int(poll, "@totalvotes", 0) < self.min_votes:
+        if poll is None or _parse_int(poll.get("totalvotes"), 0) < self.min_votes:
             return default
 
         try:
@@ -313,6 +955,20 @@ class BggSpider(Spider):
 
         return default
 
+    def _user_seen(self, user_name):
+        """ True if user has been processed within the freshness window """
+
+        curr_time = now().timestamp()
+        last_seen = parse_float(self._users_seen.get(user_name))
+
+        if last_seen is not None and (
+            not self.users_freshness or curr_time - last_seen < self.users_freshness
+        ):
+            return True
+
+        self._users_seen.set(user_name, curr_time)
+        return False
+
     def _user_item_or_request(self, user_name, priority=3, from_request=None, **kwargs):
         if not user_name:
             return None
@@ -337,11 +993,121 @@ class BggSpider(Spider):
             priority=priority,
         )
 
+    def _comment_rating(self, comment, bgg_id, user_name, scraped_at, response):
+        item = RatingItem(
+            item_id=f"{user_name}:{bgg_id}",
+            bgg_id=bgg_id,
+            bgg_user_name=user_name,
+            scraped_at=scraped_at,
+        )
+
+        if self.direct_ratings:
+            element = comment.root
+            return DIRECT_RATING_LOADER.load_item(
+                item,
+                (
+                    ("bgg_user_rating", element.get("rating")),
+                    ("comment", element.get("value")),
+                ),
+            )
+
+        ldr = RatingLoader(item=item, selector=comment, response=response)
+        ldr.add_xpath("bgg_user_rating", "@rating")
+        ldr.add_xpath("comment", "@value")
+        return ldr.load_item()
+
+    # pylint: disable=no-self-use
+    def _direct_collection_rating(self, element, item, bgg_id, user_name):
+        rating = element.find("stats/rating")
+        status = element.find("status")
+        status = status.attrib if status is not None else {}
+        return DIRECT_RATING_LOADER.load_item(
+            item,
+            (
+                ("item_id", parse_int(element.get("collid"))),
+                ("item_id", f"{user_name}:{bgg_id}"),
+                (
+                    "bgg_user_rating",
+                    rating.get("value") if rating is not None else None,
+                ),
+                ("bgg_user_owned", status.get("own")),
+                ("bgg_user_prev_owned", status.get("prevowned")),
+                ("bgg_user_for_trade", status.get("fortrade")),
+                ("bgg_user_want_in_trade", status.get("want")),
+                ("bgg_user_want_to_play", status.get("wanttoplay")),
+                ("bgg_user_want_to_buy", status.get("wanttobuy")),
+                ("bgg_user_preordered", status.get("preordered")),
+                (
+                    "bgg_user_wishlist",
+                    status.get("wishlistpriority")
+                    if status.get("wishlist") == "1"
+                    else None,
+                ),
+                ("bgg_user_play_count", element.findtext("numplays")),
+                ("comment", element.findtext("comment")),
+                ("updated_at", status.get("lastmodified")),
+            ),
+        )
+
+    def _collection_rating(self, game, bgg_id, user_name, scraped_at, response):
+        item = RatingItem(bgg_id=bgg_id, bgg_user_name=user_name, scraped_at=scraped_at)
+
+        if self.direct_ratings:
+            return self._direct_collection_rating(game.root, item, bgg_id, user_name)
+
+        ldr = RatingLoader(item=item, selector=game, response=response)
+
+        ldr.add_value("item_id", parse_int(game.xpath("@collid").extract_first()))
+        ldr.add_value("item_id", f"{user_name}:{bgg_id}")
+
+        ldr.add_xpath("bgg_user_rating", "stats/rating/@value")
+        ldr.add_xpath("bgg_user_owned", "status/@own")
+        ldr.add_xpath("bgg_user_prev_owned", "status/@prevowned")
+        ldr.add_xpath("bgg_user_for_trade", "status/@fortrade")
+        ldr.add_xpath("bgg_user_want_in_trade", "status/@want")
+        ldr.add_xpath("bgg_user_want_to_play", "status/@wanttoplay")
+        ldr.add_xpath("bgg_user_want_to_buy", "status/@wanttobuy")
+        ldr.add_xpath("bgg_user_preordered", "status/@preordered")
+        ldr.add_xpath("bgg_user_wishlist", 'status[@wishlist = "1"]/@wishlistpriority')
+        ldr.add_xpath("bgg_user_play_count", "numplays/text()")
+
+        ldr.add_xpath("comment", "comment/text()")
+
+        ldr.add_xpath("updated_at", "status/@lastmodified")
+
+        return ldr.load_item()
+
+    def _stream_collection_ratings(self, elements, user_name, scraped_at, response):
+        for element in elements:
+            bgg_id = parse_int(element.get("objectid"))
+
+            if not bgg_id:
+                self.logger.warning("no BGG ID found, cannot process rating")
+                continue
+
+            # game IDs are pooled anyway, so adding them one by one is fine
+            yield from self._game_requests(bgg_id)
+
+            if self.direct_ratings:
+                item = RatingItem(
+                    bgg_id=bgg_id, bgg_user_name=user_name, scraped_at=scraped_at
+                )
+                yield self._direct_collection_rating(element, item, bgg_id, user_name)
+                continue
+
+            yield self._collection_rating(
+                Selector(root=element, type="xml"),
+                bgg_id,
+                user_name,
+                scraped_at,
+                response,
+            )
+
     def parse(self, response):
         """
         @url https://boardgamegeek.com/browse/boardgame/
         @returns items 0 0
-        @returns requests 11
+        @returns requests 6
         """
 
         next_page = response.xpath('//a[@title = "next page"]/@href').extract_first()
@@ -361,18 +1127,17 @@ class BggSpider(Spider):
         scraped_at = now()
 
         for user_name in clear_list(user_names):
-            yield self.collection_request(
-                user_name
-            ) if self.scrape_collections else self._user_item_or_request(
-                user_name, scraped_at=scraped_at
-            )
+            if self.scrape_collections:
+                yield self._collection_or_user_request(user_name)
+            elif not self._user_seen(user_name):
+                yield self._user_item_or_request(user_name, scraped_at=scraped_at)
 
     def parse_game(self, response):
         # pylint: disable=line-too-long
         """
         @url https://www.boardgamegeek.com/xmlapi2/thing?id=13,822,36218&stats=1&versions=1&videos=1&ratingcomments=1&page=1&pagesize=100
         @returns items 3 3
-        @returns requests 303 303
+        @returns requests 312 312
         @scrapes name alt_name year description \
             designer artist publisher \
             url image_url video_url \
@@ -391,15 +1156,14 @@ class BggSpider(Spider):
         scraped_at = now()
 
         for game in response.xpath("/items/item"):
-            bgg_id = parse_int(
-                game.xpath("@id").extract_first() or response.meta.get("bgg_id")
-            )
+            index = _ThingIndex(game.root)
+            comments_element = index.first("comments")
+            bgg_id = parse_int(game.root.get("id") or response.meta.get("bgg_id"))
             page = parse_int(
-                game.xpath("comments/@page").extract_first()
-                or response.meta.get("page")
+                _attr(comments_element, "page") or response.meta.get("page")
             )
             total_items = parse_int(
-                game.xpath("comments/@totalitems").extract_first()
+                _attr(comments_element, "totalitems")
                 or response.meta.get("total_items")
             )
             comments = game.xpath("comments/comment") if self.scrape_ratings else ()
@@ -410,14 +1174,22 @@ class BggSpider(Spider):
                 and comments
                 and page * self.page_size < total_items
             ):
-                # pylint: disable=invalid-unary-operand-type
-                yield self._game_request(
-                    bgg_id,
-                    page=page + 1,
-                    priority=-page,
-                    skip_game_item=True,
-                    profile_url=profile_url,
+                # first page fans out to a window of pages, every further page
+                # moves the window by one
+                last_page = -(-total_items // self.page_size)
+                next_pages = (
+                    range(2, min(1 + self.ratings_window, last_page) + 1)
+                    if page == 1
+                    else range(page + self.ratings_window, last_page + 1)[:1]
                 )
+                for next_page in next_pages:
+                    yield self._game_request(
+                        bgg_id,
+                        page=next_page,
+                        priority=1 - next_page,
+                        skip_game_item=True,
+                        profile_url=profile_url,
+                    )
 
             for comment in comments:
                 user_name = comment.xpath("@username").extract_first()
@@ -429,24 +1201,15 @@ class BggSpider(Spider):
                 user_name = user_name.lower()
 
                 if self.scrape_collections:
-                    yield self.collection_request(user_name)
+                    yield self._collection_or_user_request(user_name)
                     continue
 
-                yield self._user_item_or_request(user_name, scraped_at=scraped_at)
+                if not self._user_seen(user_name):
+                    yield self._user_item_or_request(user_name, scraped_at=scraped_at)
 
-                ldr = RatingLoader(
-                    item=RatingItem(
-                        item_id=f"{user_name}:{bgg_id}",
-                        bgg_id=bgg_id,
-                        bgg_user_name=user_name,
-                        scraped_at=scraped_at,
-                    ),
-                    selector=comment,
-                    response=response,
+                yield self._comment_rating(
+                    comment, bgg_id, user_name, scraped_at, response
                 )
-                ldr.add_xpath("bgg_user_rating", "@rating")
-                ldr.add_xpath("comment", "@value")
-                yield ldr.load_item()
 
             if response.meta.get("skip_game_item"):
                 continue
@@ -466,30 +1229,40 @@ class BggSpider(Spider):
                 response=response,
             )
 
-            ldr.add_xpath("name", 'name[@type = "primary"]/@value')
-            ldr.add_xpath("alt_name", "name/@value")
-            ldr.add_xpath("year", "yearpublished/@value")
-            ldr.add_xpath("description", "description")
-
+            names = index.children.get("name", ())
             ldr.add_value(
-                "designer", _value_id(game.xpath('link[@type = "boardgamedesigner"]'))
+                "name",
+                [name.get("value") for name in names if name.get("type") == "primary"],
             )
+            ldr.add_value("alt_name", [name.get("value") for name in names])
+            ldr.add_value("year", index.values("yearpublished"))
             ldr.add_value(
-                "artist", _value_id(game.xpath('link[@type = "boardgameartist"]'))
-            )
-            ldr.add_value(
-                "publisher", _value_id(game.xpath('link[@type = "boardgamepublisher"]'))
+                "description",
+                [
+                    etree.tostring(
+                        description, method="xml", encoding="unicode", with_tail=False
+                    )
+                    for description in index.children.get("description", ())
+                ],
             )
 
+            ldr.add_value("designer", _value_id(index.links.get("boardgamedesigner")))
+            ldr.add_value("artist", _value_id(index.links.get("boardgameartist")))
+            ldr.add_value("publisher", _value_id(index.links.get("boardgamepublisher")))
+
             ldr.add_value("url", profile_url)
             ldr.add_value(
                 "url", "https://boardgamegeek.com/boardgame/{}".format(bgg_id)
             )
-            images = game.xpath("image/text()").extract()
-            ldr.add_value("image_url", (response.urljoin(i) for i in images))
-            images = game.xpath("thumbnail/text()").extract()
-            ldr.add_value("image_url", (response.urljoin(i) for i in images))
-            videos = game.xpath("videos/video/@link").extract()
+            for tag in ("image", "thumbnail"):
+                images = [i.text for i in index.children.get(tag, ()) if i.text]
+                ldr.add_value("image_url", (response.urljoin(i) for i in images))
+            videos = [
+                video.get("link")
+                for videos in index.children.get("videos", ())
+                for video in videos.iterchildren("video")
+                if video.get("link") is not None
+            ]
             ldr.add_value("video_url", (response.urljoin(v) for v in videos))
 
             (
@@ -497,107 +1270,132 @@ class BggSpider(Spider):
                 max_players_rec,
                 min_players_best,
                 max_players_best,
-            ) = self._player_count_votes(game)
+            ) = self._player_count_votes(index)
 
-            ldr.add_xpath("min_players", "minplayers/@value")
-            ldr.add_xpath("max_players", "maxplayers/@value")
+            ldr.add_value("min_players", index.values("minplayers"))
+            ldr.add_value("max_players", index.values("maxplayers"))
             ldr.add_value("min_players_rec", min_players_rec)
             ldr.add_value("max_players_rec", max_players_rec)
             ldr.add_value("min_players_best", min_players_best)
             ldr.add_value("max_players_best", max_players_best)
 
-            ldr.add_xpath("min_age", "minage/@value")
-            ldr.add_xpath("max_age", "maxage/@value")
+            ldr.add_value("min_age", index.values("minage"))
+            ldr.add_value("max_age", index.values("maxage"))
             ldr.add_value(
                 "min_age_rec",
-                self._poll(game, "suggested_playerage", func=statistics.median_grouped),
-            )
-            ldr.add_xpath("min_time", "minplaytime/@value")
-            ldr.add_xpath("min_time", "playingtime/@value")
-            ldr.add_xpath("max_time", "maxplaytime/@value")
-            ldr.add_xpath("max_time", "playingtime/@value")
-            ldr.add_xpath("max_time", "minplaytime/@value")
-
-            ldr.add_value(
-                "game_type",
-                _value_id_rank(
-                    game.xpath('statistics/ratings/ranks/rank[@type = "family"]')
-                ),
-            )
-            ldr.add_value(
-                "category", _value_id(game.xpath('link[@type = "boardgamecategory"]'))
-            )
-            ldr.add_value(
-                "mechanic", _value_id(game.xpath('link[@type = "boardgamemechanic"]'))
+                self._poll(index, "suggested_playerage", func=weighted_median_grouped),
             )
+            ldr.add_value("min_time", index.values("minplaytime"))
+            ldr.add_value("min_time", index.values("playingtime"))
+            ldr.add_value("max_time", index.values("maxplaytime"))
+            ldr.add_value("max_time", index.values("playingtime"))
+            ldr.add_value("max_time", index.values("minplaytime"))
+
+            family_ranks = index.ranks.get("family", ())
+            ldr.add_value("game_type", _value_id_rank(family_ranks))
+            ldr.add_value("category", _value_id(index.links.get("boardgamecategory")))
+            ldr.add_value("mechanic", _value_id(index.links.get("boardgamemechanic")))
             # look for <link type="boardgamemechanic" id="2023" value="Co-operative Play" />
             ldr.add_value(
                 "cooperative",
-                bool(game.xpath('link[@type = "boardgamemechanic" and @id = "2023"]')),
-            )
-            ldr.add_value(
-                "compilation",
-                bool(
-                    game.xpath(
-                        'link[@type = "boardgamecompilation" and @inbound = "true"]'
-                    )
+                any(
+                    link.get("id") == "2023"
+                    for link in index.links.get("boardgamemechanic", ())
                 ),
             )
-            ldr.add_xpath(
-                "compilation_of",
-                'link[@type = "boardgamecompilation" and @inbound = "true"]/@id',
-            )
+            compilation_of = index.inbound_ids("boardgamecompilation")
+            ldr.add_value("compilation", bool(compilation_of))
+            ldr.add_value("compilation_of", compilation_of)
+            ldr.add_value("family", _value_id(index.links.get("boardgamefamily")))
+            ldr.add_value("expansion", _value_id(index.links.get("boardgameexpansion")))
             ldr.add_value(
-                "family", _value_id(game.xpath('link[@type = "boardgamefamily"]'))
+                "implementation", index.inbound_ids("boardgameimplementation")
             )
             ldr.add_value(
-                "expansion", _value_id(game.xpath('link[@type = "boardgameexpansion"]'))
+                "integration",
+                [
+                    link.get("id")
+                    for link in index.links.get("boardgameintegration", ())
+                ],
             )
-            ldr.add_xpath(
-                "implementation",
-                'link[@type = "boardgameimplementation" and @inbound = "true"]/@id',
-            )
-            ldr.add_xpath("integration", 'link[@type = "boardgameintegration"]/@id')
 
-            ldr.add_xpath(
-                "rank", 'statistics/ratings/ranks/rank[@name = "boardgame"]/@value'
+            ldr.add_value(
+                "rank",
+                [
+                    rank.get("value")
+                    for ranks in index.ranks.values()
+                    for rank in ranks
+                    if rank.get("name") == "boardgame"
+                ],
             )
-            ldr.add_xpath("num_votes", "statistics/ratings/usersrated/@value")
-            ldr.add_xpath("avg_rating", "statistics/ratings/average/@value")
-            ldr.add_xpath("stddev_rating", "statistics/ratings/stddev/@value")
-            ldr.add_xpath("bayes_rating", "statistics/ratings/bayesaverage/@value")
-            ldr.add_xpath("complexity", "statistics/ratings/averageweight/@value")
+            ldr.add_value("num_votes", index.rating("usersrated"))
+            ldr.add_value("avg_rating", index.rating("average"))
+            ldr.add_value("stddev_rating", index.rating("stddev"))
+            ldr.add_value("bayes_rating", index.rating("bayesaverage"))
+            ldr.add_value("complexity", index.rating("averageweight"))
             ldr.add_value(
                 "language_dependency",
                 self._poll(
-                    game,
+                    index,
                     "language_dependence",
                     attr="level",
                     enum=True,
-                    func=statistics.median_grouped,
+                    func=weighted_median_grouped,
                 ),
             )
 
-            for rank in game.xpath('statistics/ratings/ranks/rank[@type = "family"]'):
+            for rank in family_ranks:
                 add_rank = {
-                    "game_type": rank.xpath("@name").extract_first(),
-                    "game_type_id": parse_int(rank.xpath("@id").extract_first()),
-                    "name": _remove_rank(rank.xpath("@friendlyname").extract_first()),
-                    "rank": parse_int(rank.xpath("@value").extract_first()),
-                    "bayes_rating": parse_float(
-                        rank.xpath("@bayesaverage").extract_first()
-                    ),
+                    "game_type": rank.get("name"),
+                    "game_type_id": parse_int(rank.get("id")),
+                    "name": _remove_rank(rank.get("friendlyname")),
+                    "rank": parse_int(rank.get("value")),
+                    "bayes_rating": parse_float(rank.get("bayesaverage")),
                 }
                 ldr.add_value("add_rank", add_rank)
 
-            yield ldr.load_item()
+            item = ldr.load_item()
+
+            if self._recrawl is not None:
+                self._recrawl.observe(
+                    bgg_id,
+                    num_votes=item.get("num_votes"),
+                    rank=item.get("rank"),
+                    scraped_at=scraped_at.timestamp(),
+                )
+
+            yield item
+
+    def parse_sweep(self, response):
+        """ parse a batch of swept IDs, then continue the sweep """
+
+        if not isinstance(response, TextResponse) or not response.xpath("/items"):
+            # not an API result, e.g., an empty body, an error or a proxy's page,
+            # so nothing can be said about the IDs
+            self._sweep_retry(response.request, f"no items in <{response.url}>")
+            yield from self._sweep_requests()
+            return
+
+        requested = set(
+            map(parse_int, extract_query_param(response.url, "id").split(","))
+        )
+        found = set(map(parse_int, response.xpath("/items/item/@id").extract()))
+        self._sweep_feedback(
+            requested,
+            found,
+            response.meta.get("sweep_span"),
+            response.meta.get("sweep_stride") or 1,
+        )
+
+        yield from self.parse_game(response)
+        yield from self._sweep_requests()
 
     def parse_collection(self, response):
         # pylint: disable=line-too-long
         """
         @url https://www.boardgamegeek.com/xmlapi2/collection?username=Markus+Shepherd&subtype=boardgame&excludesubtype=boardgameexpansion&stats=1&version=0
         @returns items 1000
-        @returns requests 100
+        @returns requests 50
         @scrapes item_id bgg_id bgg_user_name bgg_user_owned bgg_user_prev_owned \
             bgg_user_for_trade bgg_user_want_to_play bgg_user_want_to_buy \
             bgg_user_preordered bgg_user_play_count updated_at scraped_at
@@ -614,19 +1412,50 @@ class BggSpider(Spider):
 
         user_name = user_name.lower()
 
-        if not extract_query_param(response.url, "played"):
+        if self.stream_collections:
+            elements = _iterparse_children(response.body, "item")
+            root = next(elements, None)
+            updated_at = root.get("pubdate") if root is not None else None
+        else:
+            elements = None
             updated_at = response.xpath("/items/@pubdate").extract_first()
-            yield self._user_item_or_request(
-                user_name,
-                updated_at=updated_at,
-                scraped_at=scraped_at,
-                from_request=response.request,
+
+        if not extract_query_param(response.url, "played"):
+            user_item = response.meta.get("bgg_user_item")
+            if user_item is None:
+                yield self._user_item_or_request(
+                    user_name,
+                    updated_at=updated_at,
+                    scraped_at=scraped_at,
+                    from_request=response.request,
+                )
+            else:
+                # user was fetched before the collection to check for changes
+                ldr = UserLoader(item=user_item)
+                ldr.add_value("updated_at", updated_at)
+                yield ldr.load_item()
+
+            record = self._user_record(user_name)
+            self._inc_stats("fetched")
+
+            # explicitly fetch played games (not part of collection by default),
+            # unless the collection has not been republished since last time
+            if updated_at and updated_at == record.get("pubdate"):
+                self._inc_stats("played_skipped")
+            else:
+                yield self.collection_request(
+                    user_name, played=1, priority=1, from_request=response.request
+                )
+
+            self._update_user_record(
+                user_name, pubdate=updated_at, scraped_at=scraped_at.timestamp()
             )
 
-            # explicitly fetch played games (not part of collection by default)
-            yield self.collection_request(
-                user_name, played=1, priority=1, from_request=response.request
+        if elements is not None:
+            yield from self._stream_collection_ratings(
+                elements, user_name, scraped_at, response
             )
+            return
 
         games = response.xpath("/items/item")
         bgg_ids = games.xpath("@objectid").extract()
@@ -639,37 +1468,8 @@ class BggSpider(Spider):
                 self.logger.warning("no BGG ID found, cannot process rating")
                 continue
 
-            ldr = RatingLoader(
-                item=RatingItem(
-                    bgg_id=bgg_id, bgg_user_name=user_name, scraped_at=scraped_at
-                ),
-                selector=game,
-                response=response,
-            )
-
-            ldr.add_value("item_id", parse_int(game.xpath("@collid").extract_first()))
-            ldr.add_value("item_id", f"{user_name}:{bgg_id}")
-
-            ldr.add_xpath("bgg_user_rating", "stats/rating/@value")
-            ldr.add_xpath("bgg_user_owned", "status/@own")
-            ldr.add_xpath("bgg_user_prev_owned", "status/@prevowned")
-            ldr.add_xpath("bgg_user_for_trade", "status/@fortrade")
-            ldr.add_xpath("bgg_user_want_in_trade", "status/@want")
-            ldr.add_xpath("bgg_user_want_to_play", "status/@wanttoplay")
-            ldr.add_xpath("bgg_user_want_to_buy", "status/@wanttobuy")
-            ldr.add_xpath("bgg_user_preordered", "status/@preordered")
-            ldr.add_xpath(
-                "bgg_user_wishlist", 'status[@wishlist = "1"]/@wishlistpriority'
-            )
-            ldr.add_xpath("bgg_user_play_count", "numplays/text()")
-
-            ldr.add_xpath("comment", "comment/text()")
+            yield self._collection_rating(game, bgg_id, user_name, scraped_at, response)
 
-            ldr.add_xpath("updated_at", "status/@lastmodified")
-
-            yield ldr.load_item()
-
-    # pylint: disable=no-self-use
     def parse_user(self, response, item=None):
         """
         @url https://www.boardgamegeek.com/xmlapi2/user?name=Markus+Shepherd
@@ -700,4 +1500,25 @@ class BggSpider(Spider):
 
         ldr.replace_value("scraped_at", now())
 
+        user_name = ldr.get_output_value("bgg_user_name")
+        if not user_name or not self.scrape_collections:
+            return ldr.load_item()
+
+        user_name = user_name.lower()
+        self._update_user_record(
+            user_name, last_login=response.xpath("/user/lastlogin/@value").get()
+        )
+
+        if not response.meta.get("bgg_check_collection"):
+            return ldr.load_item()
+
+        record = self._user_record(user_name)
+
+        if not self._collection_fresh(record):
+            return self.collection_request(
+                user_name, meta={"bgg_user_item": ldr.load_item()}
+            )
+
+        self._inc_stats("skipped")
+        ldr.add_value("updated_at", record.get("pubdate"))
         return ldr.load_item()
@@ -9,9 +9,16 @@ from pytility import parse_date
 from scrapy import Request, Spider
 
 from ..items import GameItem
-from ..loaders import GameLoader
+from ..loaders import DirectLoader, GameLoader
 from ..utils import now
 
+DIRECT_GAME_LOADER = DirectLoader(GameLoader)
+
+
+def _child_value(element, tag):
+    child = element.find(tag)
+    return child.get("value") if child is not None else None
+
 
 class BggHotnessSpider(Spider):
     """BoardGameGeek hotness spider."""
@@ -26,8 +33,12 @@ class BggHotnessSpider(Spider):
         "CONCURRENT_REQUESTS_PER_DOMAIN": 1024,
         "AUTOTHROTTLE_TARGET_CONCURRENCY": 1024,
         "AUTOTHROTTLE_HTTP_CODES": (429, 503, 504),
+        "RATE_LIMIT_PRIORITY": 1,
     }
 
+    # build items without ItemLoader, e.g., for bulk ingestion of local files
+    direct_items = False
+
     def _local_requests(self, path_dir="."):
         path_dir = Path(path_dir).resolve()
 
@@ -66,6 +77,23 @@ class BggHotnessSpider(Spider):
         scraped_at = now()
 
         for game in response.xpath("/items/item"):
+            if self.direct_items:
+                element = game.root
+                yield DIRECT_GAME_LOADER.load_item(
+                    GameItem(),
+                    (
+                        ("bgg_id", element.get("id")),
+                        ("rank", element.get("rank")),
+                        ("name", _child_value(element, "name")),
+                        ("year", _child_value(element, "yearpublished")),
+                        ("image_url", _child_value(element, "thumbnail")),
+                        ("published_at", response.meta.get("published_at")),
+                        ("published_at", scraped_at),
+                        ("scraped_at", scraped_at),
+                    ),
+                )
+                continue
+
             ldr = GameLoader(item=GameItem(), selector=game, response=response)
 
             ldr.add_xpath("bgg_id", "@id")
@@ -8,20 +8,35 @@ import re
 from datetime import datetime, timezone
 from itertools import product
 from random import randint
+from urllib.parse import urlencode
 
 from pytility import normalize_space, parse_date, parse_int
 from scrapy import Request, Spider
 from scrapy.utils.misc import arg_to_iter
+from scrapy.utils.project import get_project_settings
 
+from ..indexes import SqliteStore
 from ..items import GameItem
 from ..loaders import GameLoader
-from ..utils import extract_bgg_id, now, parse_url
+from ..utils import extract_bgg_id, now, parse_json, parse_url
 
 DIGITS_REGEX = re.compile(r"^\D*(\d+).*$")
 BGG_URL_REGEX = re.compile(r"^.*(https?://?(www\.)?boardgamegeek\.com.*)$")
 HTTP_REGEX = re.compile(r"^(https?):/([^/])")
 DATE_PATH_REGEX = re.compile(r"^/[^/]+/(\d+).*$")
 WEB_ARCHIVE_DATE_FORMAT = "%Y%m%d%H%M%S"
+WEB_ARCHIVE_URL = "https://web.archive.org/web/{timestamp}/{original}"
+CDX_FIELDS = ("timestamp", "original", "digest", "statuscode", "mimetype")
+# fields of the default, space separated CDX output
+CDX_DEFAULT_FIELDS = (
+    "urlkey",
+    "timestamp",
+    "original",
+    "mimetype",
+    "statuscode",
+    "digest",
+    "length",
+)
 
 
 def _parse_int(element, xpath=None, css=None, default=None, lenient=False):
@@ -115,6 +130,24 @@ def _extract_date(url, tzinfo=timezone.utc, format_str=WEB_ARCHIVE_DATE_FORMAT):
     return _parse_date(match.group(1), tzinfo, format_str) if match else None
 
 
+def _parse_cdx(text):
+    """Parse CDX rows, either JSON output or the default space separated format."""
+
+    text = text.strip() if text else ""
+
+    if text.startswith("["):
+        rows = parse_json(text) or ()
+        header = rows[0] if rows else ()
+        for row in rows[1:]:
+            yield dict(zip(header, row))
+        return
+
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) == len(CDX_DEFAULT_FIELDS):
+            yield dict(zip(CDX_DEFAULT_FIELDS, fields))
+
+
 class BggRankingsSpider(Spider):
     """BoardGameGeek rankings spider."""
 
@@ -145,20 +178,139 @@ class BggRankingsSpider(Spider):
         "LATEST_DATE": parse_date(os.getenv("LATEST_DATE"), tzinfo=timezone.utc),
     }
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        """Initialise spider from crawler."""
+
+        kwargs.setdefault("settings", crawler.settings)
+        spider = cls(*args, **kwargs)
+        spider._set_crawler(crawler)
+        return spider
+
+    def __init__(self, *args, settings=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        settings = settings or get_project_settings()
+        self.cdx_url = settings.get("BGG_RANKINGS_CDX_URL")
+        self.cdx_file = settings.get("BGG_RANKINGS_CDX_FILE")
+        self._coverage = (
+            SqliteStore(
+                settings.get("BGG_RANKINGS_COVERAGE_PATH"),
+                table="snapshots",
+                commit_every=100,
+            )
+            if settings.getbool("BGG_RANKINGS_CDX_ENABLED")
+            and not settings.get("START_DATE")
+            else None
+        )
+        self._digests_planned = set()
+
+    def _inc_stats(self, key, count=1):
+        if getattr(self, "crawler", None) is not None:
+            self.crawler.stats.inc_value(f"bgg_rankings/snapshots/{key}", count)
+
+    def _date_range(self):
+        earliest_date = (
+            parse_date(self.settings.get("EARLIEST_DATE"), tzinfo=timezone.utc) or now()
+        )
+        latest_date = (
+            parse_date(self.settings.get("LATEST_DATE"), tzinfo=timezone.utc) or now()
+        )
+        return earliest_date, latest_date
+
+    def _paths(self):
+        return (
+            tuple(arg_to_iter(self.bgg_path))
+            if hasattr(self, "bgg_path") and self.bgg_path
+            else self.bgg_paths
+        )
+
+    def _cdx_request(self, path, earliest_date, latest_date):
+        # CDX canonicalises scheme and "www.", so one query covers all domains
+        query = {
+            "url": "boardgamegeek.com/" + path,
+            "output": "json",
+            "fl": ",".join(CDX_FIELDS),
+            "filter": "statuscode:200",
+            "collapse": "digest",
+            "from": earliest_date.strftime(WEB_ARCHIVE_DATE_FORMAT),
+            "to": latest_date.strftime(WEB_ARCHIVE_DATE_FORMAT),
+        }
+        return Request(
+            url=f"{self.cdx_url}?{urlencode(query)}",
+            callback=self.parse_cdx,
+            priority=2,
+            meta={"max_retry_times": 10},
+        )
+
+    def _snapshot_requests(self, snapshots):
+        earliest_date, latest_date = self._date_range()
+
+        for snapshot in snapshots:
+            timestamp = snapshot.get("timestamp")
+            original = snapshot.get("original")
+            digest = snapshot.get("digest")
+            published_at = _parse_date(timestamp) if timestamp else None
+
+            if (
+                not original
+                or not digest
+                or published_at is None
+                or str(snapshot.get("statuscode")) != "200"
+                or not earliest_date <= published_at <= latest_date
+            ):
+                continue
+
+            self._inc_stats("found")
+
+            if digest in self._digests_planned:
+                self._inc_stats("duplicate")
+                continue
+            self._digests_planned.add(digest)
+
+            if digest in self._coverage:
+                self._inc_stats("covered")
+                continue
+
+            self._inc_stats("planned")
+            yield Request(
+                url=WEB_ARCHIVE_URL.format(timestamp=timestamp, original=original),
+                callback=self.parse,
+                priority=1,
+                meta={
+                    "published_at": published_at,
+                    "snapshot_digest": digest,
+                    "snapshot_timestamp": timestamp,
+                    "max_retry_times": 10,
+                },
+            )
+
+    def _planned_requests(self):
+        self.logger.info("%d snapshot(s) covered in previous runs", len(self._coverage))
+
+        for start_url in _start_urls(self._paths(), prefix_urls=""):
+            yield Request(url=start_url, callback=self.parse, priority=1)
+
+        if self.cdx_file:
+            self.logger.info("reading snapshots from <%s>", self.cdx_file)
+            with open(self.cdx_file, encoding="utf-8") as cdx_file:
+                yield from self._snapshot_requests(_parse_cdx(cdx_file.read()))
+            return
+
+        earliest_date, latest_date = self._date_range()
+        for path in self._paths():
+            yield self._cdx_request(path, earliest_date, latest_date)
+
     def start_requests(self):
         """Generate start requests."""
 
+        if self._coverage is not None:
+            yield from self._planned_requests()
+            return
+
         start_date = parse_date(self.settings.get("START_DATE"), tzinfo=timezone.utc)
 
         if not start_date:
-            earliest_date = (
-                parse_date(self.settings.get("EARLIEST_DATE"), tzinfo=timezone.utc)
-                or now()
-            )
-            latest_date = (
-                parse_date(self.settings.get("LATEST_DATE"), tzinfo=timezone.utc)
-                or now()
-            )
+            earliest_date, latest_date = self._date_range()
             start_date_ts = randint(earliest_date.timestamp(), latest_date.timestamp())
             start_date = datetime.fromtimestamp(start_date_ts, tz=timezone.utc)
 
@@ -180,6 +332,16 @@ class BggRankingsSpider(Spider):
                 priority=1,
             )
 
+    def parse_cdx(self, response):
+        # pylint: disable=line-too-long
+        """
+        @url https://web.archive.org/cdx/search/cdx?url=boardgamegeek.com%2Ftop50.htm&output=json&fl=timestamp%2Coriginal%2Cdigest%2Cstatuscode%2Cmimetype&filter=statuscode%3A200&collapse=digest&from=20000101000000&to=20100101000000
+        @returns items 0 0
+        @returns requests 1
+        """
+
+        yield from self._snapshot_requests(_parse_cdx(response.text))
+
     def parse(self, response):
         """
         @url https://boardgamegeek.com/browse/boardgame
@@ -193,6 +355,7 @@ class BggRankingsSpider(Spider):
             or response.meta.get("published_at")
             or scraped_at
         )
+        num_items = 0
 
         for next_page in response.xpath(
             "//a[contains(@title, 'page')]/@href"
@@ -243,6 +406,7 @@ class BggRankingsSpider(Spider):
                 ldr.add_value("avg_rating", values[1])
                 ldr.add_value("num_votes", values[2])
 
+            num_items += 1
             yield ldr.load_item()
 
         for row in response.css("div.simplebox table tr"):
@@ -272,6 +436,7 @@ class BggRankingsSpider(Spider):
             ldr.add_xpath("name", "td[2]")
             ldr.add_xpath("bayes_rating", "td[3]")
 
+            num_items += 1
             yield ldr.load_item()
 
         for row in response.css("table.gamebrowser_table tr"):
@@ -306,6 +471,7 @@ class BggRankingsSpider(Spider):
             ldr.add_xpath("bayes_rating", "td[4]")
             ldr.add_xpath("num_votes", "td[5]")
 
+            num_items += 1
             yield ldr.load_item()
 
         # Parse Top 50 page: top50.htm, top50.php3, topn.php3?count=50
@@ -340,8 +506,23 @@ class BggRankingsSpider(Spider):
             ldr.add_xpath("bayes_rating", "td[3]")
             ldr.add_xpath("num_votes", "td[4]")
 
+            num_items += 1
             yield ldr.load_item()
 
+        digest = response.meta.get("snapshot_digest")
+        if digest and self._coverage is not None:
+            if num_items:
+                self._coverage.set(digest, response.meta.get("snapshot_timestamp"))
+                self._inc_stats("ingested")
+            else:
+                # e.g., an archived error page or an unknown layout, try again later
+                self.logger.warning("no rankings found in <%s>", response.url)
+                self._inc_stats("empty")
+
+        if self._coverage is not None:
+            # the planner already enumerates all snapshots
+            return
+
         for anchor in response.xpath(
             "//div[@id = 'wm-ipp']//table//a[@title and @href]"
         ):
@@ -352,3 +533,8 @@ class BggRankingsSpider(Spider):
                     priority=-1,
                     meta={"max_retry_times": 10},
                 )
+
+    def closed(self, reason):
+        """Persist the snapshot coverage index."""
+        if self._coverage is not None:
+            self._coverage.close()
@@ -4,6 +4,7 @@
 
 import os
 
+from collections import defaultdict
 from urllib.parse import urlencode
 
 from pytility import batchify, parse_int, normalize_space
@@ -13,7 +14,46 @@ from scrapy.utils.misc import arg_to_iter
 from .wikidata import WikidataSpider
 from ..items import GameItem
 from ..loaders import GameLoader
-from ..utils import extract_ids
+from ..utils import extract_ids, parse_json
+
+RDFS = "http://www.w3.org/2000/01/rdf-schema#"
+FOAF = "http://xmlns.com/foaf/0.1/"
+DBO = "http://dbpedia.org/ontology/"
+DBP = "http://dbpedia.org/property/"
+
+# (field, property, options of the value) in order of preference
+GAME_PROPERTIES = (
+    ("name", RDFS + "label", {"lang": "en"}),
+    ("name", FOAF + "name", {"lang": "en"}),
+    ("name", DBP + "name", {"lang": "en"}),
+    ("name", RDFS + "label", {}),
+    ("name", FOAF + "name", {}),
+    ("name", DBP + "name", {}),
+    ("alt_name", RDFS + "label", {}),
+    ("alt_name", FOAF + "name", {}),
+    ("alt_name", DBP + "name", {}),
+    ("year", DBP + "date", {}),
+    ("year", DBP + "years", {}),
+    ("description", DBO + "abstract", {"lang": "en"}),
+    ("description", RDFS + "comment", {"lang": "en"}),
+    ("description", DBO + "abstract", {}),
+    ("description", RDFS + "comment", {}),
+    ("designer", DBO + "designer", {"value_var": "label", "lang": "en"}),
+    ("designer", DBO + "designer", {"value_var": "label"}),
+    ("publisher", DBO + "publisher", {"value_var": "label", "lang": "en"}),
+    ("publisher", DBO + "publisher", {"value_var": "label"}),
+    ("official_url", FOAF + "homepage", {"value_type": "uri"}),
+    ("official_url", DBP + "web", {"value_type": "uri"}),
+    ("image_url", FOAF + "depiction", {"value_type": "uri"}),
+    ("image_url", DBO + "thumbnail", {"value_type": "uri"}),
+    ("image_url", DBP + "imageLink", {"value_type": "uri"}),
+    ("external_link", DBO + "wikiPageExternalLink", {"value_type": "uri"}),
+    ("external_link", FOAF + "isPrimaryTopicOf", {"value_type": "uri"}),
+    ("external_link", "http://www.w3.org/2002/07/owl#sameAs", {"value_type": "uri"}),
+    ("min_players", DBP + "players", {}),
+    ("min_age", DBP + "ages", {}),
+    ("bgg_id", DBP + "bggid", {}),
+)
 
 
 def _sparql_xpath(
@@ -40,6 +80,27 @@ def _sparql_xpath(
     )
 
 
+def _binding_values(
+    bindings, prop, *, value_var="value", value_type="literal", lang=None
+):
+    """
+    same selection as _sparql_xpath, but on SPARQL JSON style bindings grouped
+    by property
+    """
+
+    for binding in bindings.get(prop, ()):
+        term = binding.get(value_var) or {}
+        term_type = (
+            "literal" if term.get("type") == "typed-literal" else term.get("type")
+        )
+        if (
+            term.get("value")
+            and term_type == value_type
+            and (not lang or term.get("xml:lang") == lang)
+        ):
+            yield term["value"]
+
+
 class DBpediaSpider(Spider):
     """ DBpedia spider """
 
@@ -282,8 +343,8 @@ class DBpediaSpider(Spider):
         # 'http://dbpedia.org/class/yago/WordGame100501870',
     )
 
-    def _api_url(self, query):
-        args = {"format": "text/xml", "query": query}
+    def _api_url(self, query, fformat="text/xml"):
+        args = {"format": fformat, "query": query}
         return "{}?{}".format(self.sparql_api_url, urlencode(args))
 
     # def _entity_url(self, wikidata_id, fformat='json'):
@@ -342,7 +403,7 @@ class DBpediaSpider(Spider):
         """
         @url http://dbpedia.org/sparql?query=SELECT+DISTINCT+%3Fgame+WHERE+%7B+%3Fgame+a+%3Chttp%3A%2F%2Fdbpedia.org%2Fclass%2Fyago%2FBoardGame100502415%3E+.+%7D&format=text%2Fxml
         @returns items 0 0
-        @returns requests 1200
+        @returns requests 60
         """
 
         response.selector.register_namespace(
@@ -361,16 +422,48 @@ class DBpediaSpider(Spider):
             }}"""
         )
 
-        for game in games:
-            # dbpedia_id = game.split('/')[-1]
-            # http://dbpedia.org/resource/{dbpedia_id}
-            query = query_tmpl.format(game=game)
-            # self.logger.debug(query)
-            yield Request(
-                self._api_url(query),
-                callback=self.parse_game,
-                meta={"dbpedia_uri": game},
-            )
+        batch_size = self.settings.getint("DBPEDIA_GAME_BATCH_SIZE")
+
+        if batch_size <= 1:
+            for game in games:
+                # dbpedia_id = game.split('/')[-1]
+                # http://dbpedia.org/resource/{dbpedia_id}
+                query = query_tmpl.format(game=game)
+                # self.logger.debug(query)
+                yield Request(
+                    self._api_url(query),
+                    callback=self.parse_game,
+                    meta={"dbpedia_uri": game},
+                )
+            return
+
+        num_requests = 0
+        for batch in batchify(games, batch_size):
+            num_requests += 1
+            yield self._game_batch_request(batch)
+
+        self.crawler.stats.inc_value("dbpedia/games", len(games))
+        self.crawler.stats.inc_value("dbpedia/game_requests", num_requests)
+        self.crawler.stats.inc_value(
+            "dbpedia/game_requests_saved", len(games) - num_requests
+        )
+
+    def _game_batch_request(self, games):
+        query_tmpl = normalize_space(
+            """
+            SELECT ?game ?property ?value ?label WHERE {{
+                VALUES ?game {{ {games} }}
+                ?game ?property ?value .
+                OPTIONAL {{ ?value <http://www.w3.org/2000/01/rdf-schema#label> ?label . }}
+            }}"""
+        )
+        games = tuple(games)
+        query = query_tmpl.format(games=" ".join(f"<{game}>" for game in games))
+        return Request(
+            self._api_url(query, fformat="application/sparql-results+json"),
+            callback=self.parse_game_batch,
+            meta={"dbpedia_uris": games},
+        )
 
     def parse_game(self, response):
         # pylint: disable=line-too-long
@@ -407,108 +500,73 @@ class DBpediaSpider(Spider):
         #  'http://dbpedia.org/property/skills',
         #  'http://dbpedia.org/property/title', # awards
 
-        ldr.add_xpath(
-            "name",
-            _sparql_xpath("http://www.w3.org/2000/01/rdf-schema#label", lang="en"),
-        )
-        ldr.add_xpath(
-            "name", _sparql_xpath("http://xmlns.com/foaf/0.1/name", lang="en")
-        )
-        ldr.add_xpath(
-            "name", _sparql_xpath("http://dbpedia.org/property/name", lang="en")
-        )
-        ldr.add_xpath(
-            "name", _sparql_xpath("http://www.w3.org/2000/01/rdf-schema#label")
-        )
-        ldr.add_xpath("name", _sparql_xpath("http://xmlns.com/foaf/0.1/name"))
-        ldr.add_xpath("name", _sparql_xpath("http://dbpedia.org/property/name"))
-        ldr.add_xpath(
-            "alt_name", _sparql_xpath("http://www.w3.org/2000/01/rdf-schema#label")
-        )
-        ldr.add_xpath("alt_name", _sparql_xpath("http://xmlns.com/foaf/0.1/name"))
-        ldr.add_xpath("alt_name", _sparql_xpath("http://dbpedia.org/property/name"))
-        ldr.add_xpath("year", _sparql_xpath("http://dbpedia.org/property/date"))
-        ldr.add_xpath("year", _sparql_xpath("http://dbpedia.org/property/years"))
-        ldr.add_xpath(
-            "description",
-            _sparql_xpath("http://dbpedia.org/ontology/abstract", lang="en"),
-        )
-        ldr.add_xpath(
-            "description",
-            _sparql_xpath("http://www.w3.org/2000/01/rdf-schema#comment", lang="en"),
-        )
-        ldr.add_xpath(
-            "description", _sparql_xpath("http://dbpedia.org/ontology/abstract")
-        )
-        ldr.add_xpath(
-            "description", _sparql_xpath("http://www.w3.org/2000/01/rdf-schema#comment")
-        )
+        ldr.add_value("url", uri)
+        for field, prop, kwargs in GAME_PROPERTIES:
+            ldr.add_xpath(field, _sparql_xpath(prop, **kwargs))
 
-        ldr.add_xpath(
-            "designer",
-            _sparql_xpath(
-                "http://dbpedia.org/ontology/designer", value_var="label", lang="en"
-            ),
-        )
-        ldr.add_xpath(
-            "designer",
-            _sparql_xpath("http://dbpedia.org/ontology/designer", value_var="label"),
-        )
-        ldr.add_xpath(
-            "publisher",
-            _sparql_xpath(
-                "http://dbpedia.org/ontology/publisher", value_var="label", lang="en"
+        ldr.add_value(
+            None,
+            extract_ids(
+                uri,
+                *arg_to_iter(ldr.get_output_value("external_link")),
+                *arg_to_iter(ldr.get_output_value("official_url")),
             ),
         )
-        ldr.add_xpath(
-            "publisher",
-            _sparql_xpath("http://dbpedia.org/ontology/publisher", value_var="label"),
-        )
 
-        ldr.add_value("url", uri)
-        ldr.add_xpath(
-            "official_url",
-            _sparql_xpath("http://xmlns.com/foaf/0.1/homepage", value_type="uri"),
-        )
-        ldr.add_xpath(
-            "official_url",
-            _sparql_xpath("http://dbpedia.org/property/web", value_type="uri"),
-        )
-        ldr.add_xpath(
-            "image_url",
-            _sparql_xpath("http://xmlns.com/foaf/0.1/depiction", value_type="uri"),
-        )
-        ldr.add_xpath(
-            "image_url",
-            _sparql_xpath("http://dbpedia.org/ontology/thumbnail", value_type="uri"),
-        )
-        ldr.add_xpath(
-            "image_url",
-            _sparql_xpath("http://dbpedia.org/property/imageLink", value_type="uri"),
-        )
-        ldr.add_xpath(
-            "external_link",
-            _sparql_xpath(
-                "http://dbpedia.org/ontology/wikiPageExternalLink", value_type="uri"
-            ),
-        )
-        ldr.add_xpath(
-            "external_link",
-            _sparql_xpath(
-                "http://xmlns.com/foaf/0.1/isPrimaryTopicOf", value_type="uri"
-            ),
-        )
-        ldr.add_xpath(
-            "external_link",
-            _sparql_xpath("http://www.w3.org/2002/07/owl#sameAs", value_type="uri"),
-        )
+        return ldr.load_item()
 
-        ldr.add_xpath(
-            "min_players", _sparql_xpath("http://dbpedia.org/property/players")
-        )
-        ldr.add_xpath("min_age", _sparql_xpath("http://dbpedia.org/property/ages"))
+    def parse_game_batch(self, response):
+        # pylint: disable=line-too-long
+        """
+        @url http://dbpedia.org/sparql?format=application%2Fsparql-results%2Bjson&query=SELECT+%3Fgame+%3Fproperty+%3Fvalue+%3Flabel+WHERE+%7B+VALUES+%3Fgame+%7B+%3Chttp%3A%2F%2Fdbpedia.org%2Fresource%2FCatan%3E+%3Chttp%3A%2F%2Fdbpedia.org%2Fresource%2FCarcassonne_%28board_game%29%3E+%7D+%3Fgame+%3Fproperty+%3Fvalue+.+OPTIONAL+%7B+%3Fvalue+%3Chttp%3A%2F%2Fwww.w3.org%2F2000%2F01%2Frdf-schema%23label%3E+%3Flabel+.+%7D+%7D
+        @returns items 2 2
+        @returns requests 0 0
+        @scrapes name alt_name year description designer publisher \
+            official_url image_url external_link bgg_id wikidata_id dbpedia_id
+        """
+
+        games = response.meta.get("dbpedia_uris") or ()
+        result = parse_json(response.text) or {}
+        rows = (result.get("results") or {}).get("bindings") or ()
+
+        max_rows = self.settings.getint("DBPEDIA_SPARQL_MAX_ROWS")
+        if max_rows and len(rows) >= max_rows and len(games) > 1:
+            # the endpoint most likely truncated the result, so split the batch
+            self.logger.debug(
+                "%d rows for %d games, splitting batch", len(rows), len(games)
+            )
+            self.crawler.stats.inc_value("dbpedia/game_batch_splits")
+            half = len(games) // 2
+            yield self._game_batch_request(games[:half])
+            yield self._game_batch_request(games[half:])
+            return
+
+        # single pass over the rows, grouped by game and property
+        bindings = defaultdict(lambda: defaultdict(list))
+        for row in rows:
+            game = (row.get("game") or {}).get("value")
+            prop = (row.get("property") or {}).get("value")
+            if game and prop:
+                bindings[game][prop].append(row)
+
+        for game in games:
+            if game in bindings:
+                yield self.parse_bindings(game, bindings[game], response=response)
+            else:
+                self.logger.warning("no results found for <%s> in %r", game, response)
+
+    def parse_bindings(self, uri, bindings, response=None):
+        """
+        build a GameItem from SPARQL JSON style bindings of ?value and ?label,
+        grouped by ?property
+        """
+
+        ldr = GameLoader(item=GameItem(), response=response)
+
+        ldr.add_value("url", uri)
+        for field, prop, kwargs in GAME_PROPERTIES:
+            ldr.add_value(field, list(_binding_values(bindings, prop, **kwargs)))
 
-        ldr.add_xpath("bgg_id", _sparql_xpath("http://dbpedia.org/property/bggid"))
         ldr.add_value(
             None,
             extract_ids(
@@ -5,9 +5,10 @@
 import json
 import os
 
-from urllib.parse import urlencode
+from functools import partial
+from urllib.parse import urlencode, urljoin
 
-from pytility import batchify, normalize_space, parse_int
+from pytility import batchify, clear_list, normalize_space, parse_int
 from scrapy import Request, Spider
 from scrapy.loader.processors import MapCompose
 from scrapy.utils.misc import arg_to_iter
@@ -32,6 +33,11 @@ class WikidataSpider(Spider):
     entity_data_url = (
         "https://www.wikidata.org/wiki/Special:EntityData/{wikidata_id}.{fformat}"
     )
+    # https://www.wikidata.org/w/api.php?action=help&modules=wbgetentities
+    wikidata_api_url = "https://www.wikidata.org/w/api.php"
+    entities_labels_url = (
+        wikidata_api_url + "?action=wbgetentities&ids={}&props=labels&format=json"
+    )
 
     custom_settings = {
         "DOWNLOAD_DELAY": 10,
@@ -77,6 +83,7 @@ class WikidataSpider(Spider):
     custom_settings = {
         "ROBOTSTXT_OBEY": False,
         "RESOLVE_LABEL_URL": entity_data_url.format(wikidata_id="{}", fformat="json"),
+        "RESOLVE_LABEL_BATCH_URL": entities_labels_url,
         "RESOLVE_LABEL_FIELDS": ("designer", "artist", "publisher"),
         "RESOLVE_LABEL_LANGUAGE_PRIORITIES": ("en",),
     }
@@ -88,6 +95,15 @@ class WikidataSpider(Spider):
     def _entity_url(self, wikidata_id, fformat="json"):
         return self.entity_data_url.format(wikidata_id=wikidata_id, fformat=fformat)
 
+    def _entities_url(self, wikidata_ids):
+        args = {
+            "action": "wbgetentities",
+            "ids": "|".join(wikidata_ids),
+            "props": "info|labels|aliases|claims|sitelinks/urls",
+            "format": "json",
+        }
+        return "{}?{}".format(self.wikidata_api_url, urlencode(args))
+
     def _type_requests(self, types, batch_size=10):
         query_tmpl = normalize_space(
             """
@@ -157,7 +173,7 @@ class WikidataSpider(Spider):
         """
         @url https://query.wikidata.org/sparql?format=xml&query=SELECT+DISTINCT+%3Fgame+WHERE+%7B+%3Fgame+%3Chttp%3A%2F%2Fwww.wikidata.org%2Fprop%2Fdirect%2FP31%3E+%3Ftype+.+VALUES+%3Ftype+%7B+%3Chttp%3A%2F%2Fwww.wikidata.org%2Fentity%2FQ131436%3E+%3Chttp%3A%2F%2Fwww.wikidata.org%2Fentity%2FQ11410%3E+%3Chttp%3A%2F%2Fwww.wikidata.org%2Fentity%2FQ142714%3E+%3Chttp%3A%2F%2Fwww.wikidata.org%2Fentity%2FQ573573%3E+%3Chttp%3A%2F%2Fwww.wikidata.org%2Fentity%2FQ839864%3E+%3Chttp%3A%2F%2Fwww.wikidata.org%2Fentity%2FQ734698%3E+%3Chttp%3A%2F%2Fwww.wikidata.org%2Fentity%2FQ788553%3E+%3Chttp%3A%2F%2Fwww.wikidata.org%2Fentity%2FQ1191150%3E+%3Chttp%3A%2F%2Fwww.wikidata.org%2Fentity%2FQ1272194%3E+%3Chttp%3A%2F%2Fwww.wikidata.org%2Fentity%2FQ1150710%3E+%7D+%7D
         @returns items 0 0
-        @returns requests 3000
+        @returns requests 60
         """
 
         response.selector.register_namespace(
@@ -170,10 +186,28 @@ class WikidataSpider(Spider):
 
         self.logger.info("received %d games", len(games))
 
-        for game in games:
-            wikidata_id = extract_wikidata_id(game)
-            if wikidata_id:
+        wikidata_ids = clear_list(map(extract_wikidata_id, games))
+        batch_size = self.settings.getint("WIKIDATA_ENTITY_BATCH_SIZE")
+
+        if batch_size <= 1:
+            for wikidata_id in wikidata_ids:
                 yield Request(self._entity_url(wikidata_id), callback=self.parse_game)
+            return
+
+        num_requests = 0
+        for batch in batchify(wikidata_ids, batch_size):
+            num_requests += 1
+            yield Request(
+                self._entities_url(batch),
+                callback=self.parse_game,
+                meta={"entity_batch": True},
+            )
+
+        self.crawler.stats.inc_value("wikidata/entities", len(wikidata_ids))
+        self.crawler.stats.inc_value("wikidata/entity_requests", num_requests)
+        self.crawler.stats.inc_value(
+            "wikidata/entity_requests_saved", len(wikidata_ids) - num_requests
+        )
 
     def parse_game(self, response):
         """
@@ -190,70 +224,75 @@ class WikidataSpider(Spider):
             self.logger.warning(exc)
             return
 
-        for game in result.get("entities", {}).values():
-            ldr = GameJsonLoader(item=GameItem(), json_obj=game, response=response)
-
-            ldr.add_jmes("name", "labels.en.value")
-            ldr.add_jmes("name", "aliases.en[].value")
-            ldr.add_jmes("name", "labels.*.value")
-            ldr.add_jmes("name", "aliases.*[].value")
-            ldr.add_jmes("alt_name", "labels.*.value")
-            ldr.add_jmes("alt_name", "aliases.*[].value")
-            # TODO parse time to year
-            ldr.add_jmes("year", "claims.P577[].mainsnak.datavalue.value.time")
-            # TODO P571 inception
-
-            ldr.add_jmes(
-                "designer", "claims.P178[].mainsnak.datavalue.value.id"
-            )  # developer
-            ldr.add_jmes(
-                "designer", "claims.P50[].mainsnak.datavalue.value.id"
-            )  # author
-            ldr.add_jmes(
-                "designer", "claims.P170[].mainsnak.datavalue.value.id"
-            )  # creator
-            ldr.add_jmes(
-                "designer", "claims.P287[].mainsnak.datavalue.value.id"
-            )  # designed by
-            ldr.add_jmes(
-                "artist", "claims.P110[].mainsnak.datavalue.value.id"
-            )  # illustrator
-            ldr.add_jmes("publisher", "claims.P123[].mainsnak.datavalue.value.id")
-
-            ldr.add_value("url", response.url)
-            ldr.add_jmes(
-                "image_url",
-                "claims.P18[].mainsnak.datavalue.value",
-                MapCompose(identity, response.urljoin),
-            )
-            # official website
-            ldr.add_jmes("official_url", "claims.P856[].mainsnak.datavalue.value")
-            # Wikipedia pages
-            ldr.add_jmes("external_link", "sitelinks.*.url")
+        batched = response.meta.get("entity_batch")
 
-            ldr.add_jmes(
-                "min_players", "claims.P1872[].mainsnak.datavalue.value.amount"
-            )
-            ldr.add_jmes(
-                "max_players", "claims.P1873[].mainsnak.datavalue.value.amount"
-            )
-            ldr.add_jmes("min_age", "claims.P2899[].mainsnak.datavalue.value.amount")
-            ldr.add_jmes("max_age", "claims.P4135[].mainsnak.datavalue.value.amount")
-            # TODO duration = P2047
-
-            ldr.add_jmes("bgg_id", "claims.P2339[].mainsnak.datavalue.value")
-            ldr.add_jmes("freebase_id", "claims.P646[].mainsnak.datavalue.value")
-            ldr.add_jmes("wikidata_id", "id")
-            ldr.add_jmes("wikidata_id", "title")
-            ldr.add_jmes("luding_id", "claims.P3528[].mainsnak.datavalue.value")
-            ldr.add_jmes("bga_id", "claims.P6491[].mainsnak.datavalue.value")
-            ldr.add_value(
-                None,
-                extract_ids(
-                    response.url,
-                    *arg_to_iter(ldr.get_output_value("external_link")),
-                    *arg_to_iter(ldr.get_output_value("official_url")),
-                ),
-            )
+        for game in result.get("entities", {}).values():
+            if "missing" in game:
+                self.logger.debug("entity <%s> not found", game.get("id"))
+                continue
+
+            url = self._entity_url(game.get("id")) if batched else response.url
+            yield self.parse_entity(game, url=url, response=response)
+
+    def parse_entity(self, entity, url=None, response=None):
+        """ build a GameItem from a Wikidata entity object """
+
+        url = url or self._entity_url(entity.get("id"))
+        ldr = GameJsonLoader(item=GameItem(), json_obj=entity, response=response)
+
+        ldr.add_jmes("name", "labels.en.value")
+        ldr.add_jmes("name", "aliases.en[].value")
+        ldr.add_jmes("name", "labels.*.value")
+        ldr.add_jmes("name", "aliases.*[].value")
+        ldr.add_jmes("alt_name", "labels.*.value")
+        ldr.add_jmes("alt_name", "aliases.*[].value")
+        # TODO parse time to year
+        ldr.add_jmes("year", "claims.P577[].mainsnak.datavalue.value.time")
+        # TODO P571 inception
+
+        ldr.add_jmes(
+            "designer", "claims.P178[].mainsnak.datavalue.value.id"
+        )  # developer
+        ldr.add_jmes("designer", "claims.P50[].mainsnak.datavalue.value.id")  # author
+        ldr.add_jmes("designer", "claims.P170[].mainsnak.datavalue.value.id")  # creator
+        ldr.add_jmes(
+            "designer", "claims.P287[].mainsnak.datavalue.value.id"
+        )  # designed by
+        ldr.add_jmes(
+            "artist", "claims.P110[].mainsnak.datavalue.value.id"
+        )  # illustrator
+        ldr.add_jmes("publisher", "claims.P123[].mainsnak.datavalue.value.id")
+
+        ldr.add_value("url", url)
+        ldr.add_jmes(
+            "image_url",
+            "claims.P18[].mainsnak.datavalue.value",
+            MapCompose(identity, partial(urljoin, url)),
+        )
+        # official website
+        ldr.add_jmes("official_url", "claims.P856[].mainsnak.datavalue.value")
+        # Wikipedia pages
+        ldr.add_jmes("external_link", "sitelinks.*.url")
+
+        ldr.add_jmes("min_players", "claims.P1872[].mainsnak.datavalue.value.amount")
+        ldr.add_jmes("max_players", "claims.P1873[].mainsnak.datavalue.value.amount")
+        ldr.add_jmes("min_age", "claims.P2899[].mainsnak.datavalue.value.amount")
+        ldr.add_jmes("max_age", "claims.P4135[].mainsnak.datavalue.value.amount")
+        # TODO duration = P2047
+
+        ldr.add_jmes("bgg_id", "claims.P2339[].mainsnak.datavalue.value")
+        ldr.add_jmes("freebase_id", "claims.P646[].mainsnak.datavalue.value")
+        ldr.add_jmes("wikidata_id", "id")
+        ldr.add_jmes("wikidata_id", "title")
+        ldr.add_jmes("luding_id", "claims.P3528[].mainsnak.datavalue.value")
+        ldr.add_jmes("bga_id", "claims.P6491[].mainsnak.datavalue.value")
+        ldr.add_value(
+            None,
+            extract_ids(
+                url,
+                *arg_to_iter(ldr.get_output_value("external_link")),
+                *arg_to_iter(ldr.get_output_value("official_url")),
+            ),
+        )
 
-            yield ldr.load_item()
+        return ldr.load_item()
@@ -7,11 +7,13 @@ import logging
 import os
 import re
 
+from collections import defaultdict
 from datetime import datetime, timezone
 from functools import lru_cache
 from pathlib import Path
+from statistics import StatisticsError
 from types import GeneratorType
-from typing import Any, Dict, Iterable, List, Optional, Pattern, Union
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Tuple, Union
 from urllib.parse import ParseResult, parse_qs, unquote_plus, urlparse
 
 from pytility import (
@@ -198,6 +200,56 @@ def validate_range(value, lower=None, upper=None):
     return None
 
 
+def _merge_weights(pairs):
+    weights = defaultdict(int)
+    for value, weight in pairs:
+        if weight > 0:
+            weights[value] += weight
+    return sorted(weights.items())
+
+
+def weighted_mean(pairs: Iterable[Tuple[Any, int]]) -> float:
+    """ arithmetic mean of (value, count) pairs without expanding the counts """
+    total = weights = 0
+    for value, weight in pairs:
+        total += value * weight
+        weights += weight
+    if weights <= 0:
+        raise StatisticsError("mean requires at least one data point")
+    return total / weights
+
+
+def weighted_median_grouped(
+    pairs: Iterable[Tuple[Any, int]], interval: Union[int, float] = 1
+) -> float:
+    """
+    same as statistics.median_grouped, but on (value, count) pairs, so the cost
+    depends on the number of distinct values instead of the number of votes
+    """
+
+    weights = _merge_weights(pairs)
+    total = sum(weight for _, weight in weights)
+
+    if not total:
+        raise StatisticsError("no median for empty data")
+    if total == 1:
+        return weights[0][0]
+
+    # find the bucket containing the element at position total // 2
+    cumulative = 0
+    for value, weight in weights:
+        if cumulative + weight > total // 2:
+            break
+        cumulative += weight
+
+    try:
+        lower = value - interval / 2
+    except TypeError:
+        lower = float(value) - float(interval) / 2
+
+    return lower + interval * (total / 2 - cumulative) / weight
+
+
 def json_from_response(response):
     """Parse JSON from respose if possible."""
     result = parse_json(response.text) if hasattr(response, "text") else None
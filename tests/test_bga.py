@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+""" tests for the Board Game Atlas spider """
+
+import json
+
+import pytest
+
+from scrapy.exceptions import DontCloseSpider
+from scrapy.http import TextResponse
+from scrapy.utils.test import get_crawler
+
+from board_game_scraper.items import GameItem
+from board_game_scraper.spiders import bga
+from board_game_scraper.spiders.bga import BgaSpider
+
+GAME_URL = "https://www.boardgameatlas.com/game/OIXt3DmJU0/catan"
+IMAGE_URL = "https://s3.amazonaws.com/images/catan.jpg"
+VIDEO_URL = "https://www.youtube.com/watch?v=catan"
+
+
+class FakeClock:
+    """ controllable replacement for time.time """
+
+    def __init__(self, curr_time=1_000_000.0):
+        self.curr_time = curr_time
+
+    def __call__(self):
+        return self.curr_time
+
+
+class RecordingEngine:
+    """ engine that only records the requests it is asked to crawl """
+
+    def __init__(self):
+        self.requests = []
+
+    def crawl(self, request, spider):
+        """ record request """
+        # pylint: disable=unused-argument
+        self.requests.append(request)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ freeze the clock of the game joins """
+    fake = FakeClock()
+    monkeypatch.setattr(bga, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def spider(clock):
+    """ BGA spider fetching images and videos with a one minute timeout """
+    # pylint: disable=unused-argument
+    crawler = get_crawler(
+        BgaSpider,
+        {
+            "BGA_SCRAPE_IMAGES": True,
+            "BGA_SCRAPE_VIDEOS": True,
+            "BGA_GAME_REQUESTS_TIMEOUT": 60,
+        },
+    )
+    crawler.engine = RecordingEngine()
+    return BgaSpider.from_crawler(crawler)
+
+
+def _game_requests(spider):
+    item = GameItem(bga_id="OIXt3DmJU0", name="Catan", url=GAME_URL)
+    requests = list(spider._game_requests(item["bga_id"]))
+    return list(spider._requests_or_item(item, requests))
+
+
+def _respond(request, result):
+    response = TextResponse(
+        request.url, body=json.dumps(result).encode("utf-8"), request=request
+    )
+    return list(request.callback(response))
+
+
+def _idle(spider):
+    with pytest.raises(DontCloseSpider):
+        spider._spider_idle()
+    (request,) = spider.crawler.engine.requests
+    spider.crawler.engine.requests.clear()
+    return list(request.callback(TextResponse(request.url, body=b"")))
+
+
+def test_join(spider):
+    """ the item is emitted once all sub-responses arrived """
+    images, videos = _game_requests(spider)
+    assert _respond(images, {"images": [{"url": IMAGE_URL}]}) == []
+    (item,) = _respond(videos, {"videos": [{"url": VIDEO_URL}]})
+    assert item["image_url"] == [IMAGE_URL]
+    assert item["video_url"] == [VIDEO_URL]
+    assert spider._spider_idle() is None
+
+
+def test_sub_request_never_answers(spider, clock):
+    """ a game with a sub-request that never answers still produces its item """
+    images, _ = _game_requests(spider)
+    assert _respond(images, {"images": [{"url": IMAGE_URL}]}) == []
+
+    clock.curr_time += 120
+    (item,) = _idle(spider)
+    assert item["name"] == "Catan"
+    assert item["image_url"] == [IMAGE_URL]
+    assert spider.crawler.stats.get_value("bga/game_requests/timed_out") == 1
+    assert spider._spider_idle() is None
+
+
+def test_all_sub_requests_dropped(spider):
+    """ a game whose sub-requests were all dropped is emitted on idle """
+    _game_requests(spider)
+    (item,) = _idle(spider)
+    assert item["name"] == "Catan"
+    assert spider.crawler.stats.get_value("bga/game_requests/abandoned") == 1
+
+
+def test_timeout_from_scheduling(spider, clock):
+    """ the timeout counts from scheduling, not from the first sub-response """
+    _, videos = _game_requests(spider)
+    clock.curr_time += 120
+    (item,) = spider._expired_items()
+    assert item["name"] == "Catan"
+    assert _respond(videos, {"videos": []}) == []
+    assert spider.crawler.stats.get_value("bga/game_requests/late") == 1
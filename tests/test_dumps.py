@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+""" tests for ingesting local database dumps """
+
+import bz2
+import gzip
+import json
+
+from functools import partial
+from pathlib import Path
+
+import pytest
+
+from scrapy import Request
+from scrapy.http import TextResponse, XmlResponse
+from scrapy.utils.test import get_crawler
+
+from board_game_scraper.dumps import (
+    _export_games,
+    _scan_dumps,
+    _wikidata_games,
+    ingest_dbpedia_dump,
+    ingest_hotness_files,
+    ingest_wikidata_dump,
+)
+from board_game_scraper.items import GameItem
+from board_game_scraper.settings import MULTI_FEED_EXPORT_FIELDS
+from board_game_scraper.spiders.bgg_hotness import BggHotnessSpider
+from board_game_scraper.spiders.dbpedia import DBpediaSpider
+from board_game_scraper.spiders.wikidata import WikidataSpider
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+GAME_IDS = {"Q17271": 13, "Q100001": 822, "Q100002": 30549, "Q100003": 6424}
+DBPEDIA_GAMES = (
+    "http://dbpedia.org/resource/Catan",
+    "http://dbpedia.org/resource/Carcassonne_(board_game)",
+)
+
+
+@pytest.fixture(params=("bz2", "gz"))
+def dump_path(request, tmp_path):
+    """ the Wikidata dump fixture, compressed with bzip2 or gzip """
+    src = FIXTURES_DIR / "wikidata_dump.json.bz2"
+    if request.param == "bz2":
+        return str(src)
+    dst = tmp_path / "wikidata_dump.json.gz"
+    dst.write_bytes(gzip.compress(bz2.decompress(src.read_bytes())))
+    return str(dst)
+
+
+def _read_games(path, key="wikidata_id"):
+    with open(path, encoding="utf-8") as file_obj:
+        return {game[key]: game for game in map(json.loads, file_obj)}
+
+
+def _assert_feed_fields(games):
+    fields = MULTI_FEED_EXPORT_FIELDS["GameItem"]
+    for game in games:
+        assert list(game) == [field for field in fields if field in game]
+
+
+def test_scan_dumps(dump_path):
+    """ games are found across chunks of the dump """
+    results = _scan_dumps(
+        [dump_path],
+        partial(_wikidata_games, game_types=frozenset(WikidataSpider.game_types)),
+        workers=1,
+        chunk_size=1024,
+    )
+    games = [game for chunk in results for game in chunk]
+    assert {game["wikidata_id"]: game["bgg_id"] for game in games} == GAME_IDS
+
+
+def test_export_games(tmp_path):
+    """ games are typed and validated before they are written """
+    out_path = tmp_path / "games.jl"
+    _export_games(
+        [
+            GameItem(
+                name="Catan",
+                bgg_id="13",
+                year="1995",
+                wikidata_id="Q17271",
+                image_url_download=[{"url": "https://example.com/catan.jpg"}],
+            ),
+            GameItem(bgg_id="822", wikidata_id="Q100001"),
+        ],
+        str(out_path),
+    )
+    games = _read_games(out_path)
+    # the second game has no name and must be dropped
+    assert list(games) == ["Q17271"]
+    _assert_feed_fields(games.values())
+    # only the feed fields are exported
+    assert "image_url_download" not in games["Q17271"]
+    assert games["Q17271"]["bgg_id"] == 13
+    assert games["Q17271"]["year"] == 1995
+
+
+def test_ingest_wikidata_dump(dump_path, tmp_path):
+    """ games are extracted and their labels resolved from the same dump """
+    out_path = tmp_path / "games.jl"
+    count = ingest_wikidata_dump(
+        [dump_path],
+        out_path=str(out_path),
+        labels_path=tmp_path / "labels.sqlite",
+        workers=1,
+        chunk_size=1024,
+    )
+    games = _read_games(out_path)
+
+    assert count == len(GAME_IDS)
+    _assert_feed_fields(games.values())
+    assert {id_: game["bgg_id"] for id_, game in games.items()} == GAME_IDS
+
+    catan = games["Q17271"]
+    assert catan["name"] == "Catan"
+    assert "Die Siedler von Catan" in catan["alt_name"]
+    assert catan["designer"] == ["Klaus Teuber"]
+    assert catan["publisher"] == ["Kosmos", "Franckh-Kosmos", "Mayfair Games"]
+    assert catan["min_players"] == 3
+    assert catan["max_players"] == 4
+    assert "https://en.wikipedia.org/wiki/Catan" in catan["external_link"]
+    assert catan["wikipedia_id"] == "Catan"
+
+    assert games["Q100001"]["designer"] == ["Klaus-Jürgen Wrede"]
+    assert games["Q100001"]["publisher"] == ["Hans im Glück"]
+
+
+def _dbpedia_spider_games(out_path):
+    crawler = get_crawler(DBpediaSpider)
+    spider = DBpediaSpider.from_crawler(crawler)
+    url = "http://dbpedia.org/sparql"
+    request = Request(url, meta={"dbpedia_uris": DBPEDIA_GAMES})
+    body = (FIXTURES_DIR / "dbpedia_games.json").read_bytes()
+    response = TextResponse(url, body=body, encoding="utf-8", request=request)
+    _export_games(spider.parse_game_batch(response), str(out_path))
+    return _read_games(out_path, key="url")
+
+
+def test_ingest_dbpedia_dump(tmp_path):
+    """ games from the N-Triples dump are the same as from the SPARQL endpoint """
+    out_path = tmp_path / "games.jl"
+    count = ingest_dbpedia_dump(
+        [str(FIXTURES_DIR / "dbpedia_dump.nt")],
+        out_path=str(out_path),
+        workers=1,
+        chunk_size=1024,
+    )
+    games = _read_games(out_path, key="url")
+    expected = _dbpedia_spider_games(tmp_path / "spider.jl")
+
+    assert count == 2
+    assert sorted(games) == sorted(DBPEDIA_GAMES)
+    assert games == expected
+
+    catan = games["http://dbpedia.org/resource/Catan"]
+    assert catan["name"] == "Catan"
+    assert 'The "Settlers" of Catan' in catan["alt_name"]
+    assert catan["year"] == 1995
+    assert catan["description"].startswith("Catan is a multiplayer board game.")
+    assert catan["designer"] == ["Klaus Teuber"]
+    assert catan["publisher"] == ["Kosmos (publisher)", "Franckh-Kosmos"]
+    assert catan["bgg_id"] == 13
+    assert catan["wikidata_id"] == "Q17271"
+
+    carcassonne = games["http://dbpedia.org/resource/Carcassonne_(board_game)"]
+    assert carcassonne["designer"] == ["Klaus-Jürgen Wrede"]
+    assert "Klaus-Jürgen Wrede" in carcassonne["description"]
+    assert not carcassonne.get("publisher")
+    assert carcassonne["bgg_id"] == 822
+
+
+def _hotness_snapshots(path):
+    with open(path, encoding="utf-8") as file_obj:
+        games = [json.loads(line) for line in file_obj]
+    for game in games:
+        # differs between runs
+        del game["scraped_at"]
+    return sorted(games, key=lambda game: (game["published_at"], game["rank"]))
+
+
+def _hotness_spider_games(hotness_dir, out_path):
+    spider = BggHotnessSpider()
+    items = []
+    for request in spider._local_requests(hotness_dir):
+        body = (hotness_dir / Path(request.url).name).read_bytes()
+        response = XmlResponse(request.url, body=body, request=request)
+        items.extend(spider.parse(response))
+    _export_games(items, str(out_path))
+    return _hotness_snapshots(out_path)
+
+
+def test_ingest_hotness_files(tmp_path):
+    """ a directory of snapshots yields the same items as BGG_HOTNESS_DIR """
+    hotness_dir = FIXTURES_DIR / "bgg_hotness"
+    out_path = tmp_path / "hotness.jl"
+    count = ingest_hotness_files(
+        [str(hotness_dir)], out_path=str(out_path), workers=1, batch_size=1
+    )
+    games = _hotness_snapshots(out_path)
+
+    assert count == 5
+    assert games == _hotness_spider_games(hotness_dir, tmp_path / "spider.jl")
+    assert [(game["published_at"][:10], game["bgg_id"]) for game in games] == [
+        ("2020-01-01", 174430),
+        ("2020-01-01", 13),
+        ("2020-01-01", 291457),
+        ("2020-01-02", 13),
+        ("2020-01-02", 266192),
+    ]
+    assert games[-1]["name"] == "Flügelschlag"
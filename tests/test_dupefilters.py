@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+""" tests for the duplicate request filters """
+
+import pytest
+
+from scrapy import Request
+
+from board_game_scraper.dupefilters import BloomDupeFilter, SqliteDupeFilter
+
+URL = "https://boardgamegeek.com/xmlapi2/thing?id={}"
+
+
+def _requests(start, end):
+    return (Request(URL.format(id_)) for id_ in range(start, end))
+
+
+@pytest.mark.parametrize("cls", (BloomDupeFilter, SqliteDupeFilter))
+def test_request_seen(cls):
+    """ requests are seen the second time around """
+    dupefilter = cls()
+    assert not any(dupefilter.request_seen(request) for request in _requests(0, 100))
+    assert all(dupefilter.request_seen(request) for request in _requests(0, 100))
+    dupefilter.close("finished")
+
+
+@pytest.mark.parametrize("cls", (BloomDupeFilter, SqliteDupeFilter))
+def test_persistence(cls, tmp_path):
+    """ fingerprints survive closing and reopening the filter """
+    dupefilter = cls(path=str(tmp_path))
+    assert not any(dupefilter.request_seen(request) for request in _requests(0, 100))
+    dupefilter.close("shutdown")
+
+    dupefilter = cls(path=str(tmp_path))
+    assert all(dupefilter.request_seen(request) for request in _requests(0, 100))
+    assert not any(dupefilter.request_seen(request) for request in _requests(100, 200))
+    dupefilter.close("finished")
+
+
+def test_bloom_persistence_across_slices(tmp_path):
+    """ all slices of a grown Bloom filter are restored """
+    dupefilter = BloomDupeFilter(path=str(tmp_path), capacity=100, error_rate=0.01)
+    for request in _requests(0, 500):
+        dupefilter.request_seen(request)
+    num_slices = len(dupefilter.fingerprints._slices)
+    assert num_slices > 1
+    dupefilter.close("shutdown")
+
+    dupefilter = BloomDupeFilter(path=str(tmp_path), capacity=100, error_rate=0.01)
+    assert len(dupefilter.fingerprints._slices) == num_slices
+    assert all(dupefilter.request_seen(request) for request in _requests(0, 500))
+    dupefilter.close("finished")
+
+
+def test_bloom_false_positive_rate():
+    """ false positives stay below the error rate while the filter grows """
+    error_rate = 0.01
+    dupefilter = BloomDupeFilter(capacity=500, error_rate=error_rate)
+    false_positives = sum(
+        bool(dupefilter.request_seen(request)) for request in _requests(0, 5_000)
+    )
+    assert len(dupefilter.fingerprints._slices) > 1
+    false_positives += sum(
+        dupefilter.request_fingerprint(request) in dupefilter.fingerprints
+        for request in _requests(5_000, 15_000)
+    )
+    assert false_positives / 15_000 < error_rate
+    dupefilter.close("finished")
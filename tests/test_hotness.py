@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+""" tests for the BGG hotness spider """
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+from scrapy import Request
+from scrapy.http import XmlResponse
+
+from board_game_scraper.spiders import bgg_hotness
+from board_game_scraper.spiders.bgg_hotness import BggHotnessSpider
+
+HOTNESS_DIR = Path(__file__).resolve().parent / "fixtures" / "bgg_hotness"
+HOTNESS_FILE = HOTNESS_DIR / "2020-01-01.xml"
+PUBLISHED_AT = datetime(2020, 1, 1, tzinfo=timezone.utc)
+SCRAPED_AT = datetime(2020, 1, 1, 12, tzinfo=timezone.utc)
+
+
+def _items(direct_items):
+    spider = BggHotnessSpider()
+    spider.direct_items = direct_items
+    url = HOTNESS_FILE.as_uri()
+    request = Request(url, meta={"published_at": PUBLISHED_AT})
+    response = XmlResponse(url, body=HOTNESS_FILE.read_bytes(), request=request)
+    return list(spider.parse(response))
+
+
+@pytest.mark.parametrize("direct_items", (False, True))
+def test_parse(monkeypatch, direct_items):
+    """ items are the same, with or without an ItemLoader """
+    monkeypatch.setattr(bgg_hotness, "now", lambda: SCRAPED_AT)
+    items = _items(direct_items)
+    assert items == _items(not direct_items)
+
+    assert [item["bgg_id"] for item in items] == [174430, 13, 291457]
+    assert [item["rank"] for item in items] == [1, 2, 3]
+    catan = items[1]
+    assert catan["name"] == "Die Siedler von Catan"
+    assert catan["year"] == 1995
+    assert catan["image_url"] == ["https://cf.geekdo-images.com/thumb/img/catan.jpg"]
+    assert catan["published_at"] == PUBLISHED_AT
+    assert catan["scraped_at"] == SCRAPED_AT
+    assert items[2]["name"] == "Gloomhaven: Jaws of the Lion & Friends"
+    assert "year" not in items[2]
+    assert "image_url" not in items[2]
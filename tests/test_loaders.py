@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+""" tests for the item loaders """
+
+import bz2
+import json
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+from scrapy import Request
+from scrapy.http import XmlResponse
+from scrapy.utils.test import get_crawler
+from scrapy_extensions import JsonLoader
+
+from board_game_scraper.items import GameItem, RatingItem
+from board_game_scraper.loaders import DirectLoader, GameLoader, RatingLoader
+from board_game_scraper.spiders import wikidata
+from board_game_scraper.spiders.bgg import BggSpider
+from board_game_scraper.spiders.wikidata import WikidataSpider
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+COLLECTION_URL = (
+    "https://www.boardgamegeek.com/xmlapi2/collection?"
+    + "username=Markus+Shepherd&subtype=boardgame&stats=1&version=0"
+)
+SCRAPED_AT = datetime(2020, 2, 1, 12, tzinfo=timezone.utc)
+
+
+def _item_loader(loader_cls, item, values):
+    ldr = loader_cls(item=item)
+    for field_name, value in values:
+        ldr.add_value(field_name, value)
+    return ldr.load_item()
+
+
+@pytest.mark.parametrize(
+    "loader_cls,item_cls,values",
+    (
+        (
+            GameLoader,
+            GameItem,
+            (
+                ("bgg_id", "13"),
+                ("name", "  Catan &amp; <b>friends</b> "),
+                ("alt_name", "Die Siedler von Catan"),
+                ("alt_name", ["Settlers of Catan", None, "Catan"]),
+                ("year", "1995"),
+                ("designer", "Klaus Teuber"),
+                ("image_url", "//cf.geekdo-images.com/original/img/catan.jpg"),
+                ("min_players", "3"),
+                ("max_players", None),
+                ("avg_rating", "7.1"),
+                ("published_at", None),
+                ("published_at", SCRAPED_AT),
+                ("scraped_at", SCRAPED_AT),
+            ),
+        ),
+        (
+            RatingLoader,
+            RatingItem,
+            (
+                ("item_id", "1234"),
+                ("item_id", "markus shepherd:13"),
+                ("bgg_id", 13),
+                ("bgg_user_name", "Markus Shepherd"),
+                ("bgg_user_rating", "8.5"),
+                ("bgg_user_owned", "1"),
+                ("bgg_user_wishlist", None),
+                ("comment", "Great &lt;b&gt;game&lt;/b&gt;"),
+                ("updated_at", "2019-03-01 10:00:00"),
+            ),
+        ),
+    ),
+)
+def test_direct_loader(loader_cls, item_cls, values):
+    """ DirectLoader produces the same item as the ItemLoader """
+    expected = _item_loader(loader_cls, item_cls(), values)
+    result = DirectLoader(loader_cls).load_item(item_cls(), values)
+    assert dict(result) == dict(expected)
+
+
+def _parse_collection(direct_ratings, streaming=True, body=None):
+    crawler = get_crawler(
+        BggSpider,
+        {
+            "BGG_DIRECT_RATINGS": direct_ratings,
+            "BGG_COLLECTION_STREAMING": streaming,
+            "SCRAPE_BGG_RATINGS": True,
+            "SCRAPE_BGG_COLLECTIONS": True,
+        },
+    )
+    spider = BggSpider.from_crawler(crawler)
+    if body is None:
+        body = (FIXTURES_DIR / "bgg_collection.xml").read_bytes()
+    response = XmlResponse(COLLECTION_URL, body=body, request=Request(COLLECTION_URL))
+    items = [
+        dict(result)
+        for result in spider.parse_collection(response)
+        if isinstance(result, RatingItem)
+    ]
+    for item in items:
+        item.pop("scraped_at")
+    return items
+
+
+def test_direct_collection_ratings():
+    """ collection ratings are the same with and without ItemLoader """
+    expected = _parse_collection(direct_ratings=False)
+    assert len(expected) == 40
+    assert _parse_collection(direct_ratings=True) == expected
+
+
+@pytest.mark.parametrize("body", (b"", b"<?xml version='1.0' encoding='utf-8'?>"))
+def test_stream_empty_collection(body):
+    """ an empty response yields no ratings, with and without streaming """
+    assert _parse_collection(direct_ratings=True, body=body) == []
+    assert _parse_collection(direct_ratings=True, streaming=False, body=body) == []
+
+
+def _wikidata_entities():
+    with bz2.open(FIXTURES_DIR / "wikidata_dump.json.bz2", "rt") as dump_file:
+        lines = (line.strip().rstrip(",") for line in dump_file)
+        return [json.loads(line) for line in lines if line not in ("", "[", "]")]
+
+
+class UncachedGameJsonLoader(JsonLoader, GameLoader):
+    """ GameJsonLoader without compiled JMESPath expressions """
+
+
+def test_compiled_json_loader(monkeypatch):
+    """ compiled JMESPath expressions yield the same items as the plain ones """
+
+    spider = WikidataSpider()
+    entities = _wikidata_entities()
+    assert len(entities) > 10
+
+    def _parse():
+        return [
+            {k: v for k, v in spider.parse_entity(entity).items() if k != "scraped_at"}
+            for entity in entities
+        ]
+
+    compiled = _parse()
+    monkeypatch.setattr(wikidata, "GameJsonLoader", UncachedGameJsonLoader)
+    uncached = _parse()
+
+    assert compiled == uncached
+    assert compiled[1]["name"] == "Catan"
+    assert compiled[1]["bgg_id"] == 13
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+""" tests for the item pipelines """
+
+import json
+
+import pytest
+
+from scrapy.http import TextResponse
+from scrapy.utils.test import get_crawler
+from twisted.internet.defer import Deferred
+from twisted.internet.error import ConnectionRefusedError as ConnectionRefused
+
+from board_game_scraper.items import GameItem
+from board_game_scraper.pipelines import ResolveLabelPipeline
+
+URL = "https://www.wikidata.org/wiki/Special:EntityData/{}.json"
+BATCH_URL = "https://www.wikidata.org/w/api.php?action=wbgetentities&ids={}"
+
+
+class FakeEngine:
+    """ engine whose downloads are answered by the test """
+
+    def __init__(self):
+        self.downloads = []
+
+    def download(self, request, spider):
+        """ Deferred to be fired by the test """
+        # pylint: disable=unused-argument
+        deferred = Deferred()
+        self.downloads.append((request, deferred))
+        return deferred
+
+
+class FakeSpider:
+    """ spider with nothing but a crawler and its engine """
+
+    def __init__(self):
+        self.crawler = type("FakeCrawler", (), {})()
+        self.crawler.engine = FakeEngine()
+
+
+def _response(request, entities):
+    body = json.dumps({"entities": entities}).encode("utf-8")
+    return TextResponse(request.url, body=body, request=request)
+
+
+def _results(deferreds):
+    results = []
+    for deferred in deferreds:
+        deferred.addBoth(results.append)
+    return results
+
+
+def test_coalesced_error():
+    """ all lookups waiting for a failed extraction keep the original value """
+    pipeline = ResolveLabelPipeline(url=URL, fields=("designer",))
+    spider = FakeSpider()
+    results = _results(
+        [pipeline._deferred_value("Q1", spider), pipeline._deferred_value("Q1", spider)]
+    )
+
+    ((request, deferred),) = spider.crawler.engine.downloads
+    # labels are expected to be objects
+    deferred.callback(_response(request, {"Q1": {"labels": {"en": "broken"}}}))
+    assert results == [["Q1"], ["Q1"]]
+    assert pipeline.labels.get("Q1") is None
+
+
+def test_batch_missing_ids():
+    """ IDs missing from a batch response are not cached, redirects are """
+    pipeline = ResolveLabelPipeline(
+        url=URL, fields=("designer",), batch_url=BATCH_URL, batch_size=3
+    )
+    spider = FakeSpider()
+    results = _results(
+        [pipeline._deferred_value(value, spider) for value in ("Q1", "Q2", "Q3")]
+    )
+
+    ((request, deferred),) = spider.crawler.engine.downloads
+    deferred.callback(
+        _response(
+            request,
+            {
+                "Q1": {"labels": {"en": {"language": "en", "value": "Catan"}}},
+                "Q4": {
+                    "redirects": {"from": "Q2", "to": "Q4"},
+                    "labels": {"en": {"language": "en", "value": "Carcassonne"}},
+                },
+                "Q3": {"id": "Q3", "missing": ""},
+            },
+        )
+    )
+    assert results == [["Catan"], ["Carcassonne"], []]
+    assert json.loads(pipeline.labels.get("Q1")) == ["Catan"]
+    assert json.loads(pipeline.labels.get("Q2")) == ["Carcassonne"]
+    assert pipeline.labels.get("Q3") is None
+
+
+def test_process_item_error():
+    """ an item keeps the IDs whose labels could not be extracted """
+    pipeline = ResolveLabelPipeline(url=URL, fields=("designer",))
+    spider = FakeSpider()
+    item = GameItem(designer=["Q1", "Q2"])
+    results = _results([pipeline.process_item(item, spider)])
+
+    for request, deferred in spider.crawler.engine.downloads:
+        labels = (
+            {"en": {"language": "en", "value": "Klaus Teuber"}}
+            if "Q1" in request.url
+            else {"en": "broken"}
+        )
+        entity_id = "Q1" if "Q1" in request.url else "Q2"
+        deferred.callback(_response(request, {entity_id: {"labels": labels}}))
+
+    assert results == [item]
+    assert item["designer"] == ["Klaus Teuber", "Q2"]
+
+
+@pytest.mark.parametrize("batch_url", (None, BATCH_URL))
+def test_download_error(batch_url):
+    """ IDs whose lookup failed to download are kept, but not cached """
+    stats = get_crawler().stats
+    pipeline = ResolveLabelPipeline(
+        url=URL, fields=("designer",), stats=stats, batch_url=batch_url, batch_size=2
+    )
+    spider = FakeSpider()
+    results = _results(
+        [
+            pipeline._deferred_value("Q1", spider),
+            pipeline._deferred_value("Q1", spider),
+            pipeline._deferred_value("Q2", spider),
+        ]
+    )
+
+    for _, deferred in spider.crawler.engine.downloads:
+        deferred.errback(ConnectionRefused())
+
+    assert results == [["Q1"], ["Q1"], ["Q2"]]
+    assert pipeline.labels.get("Q1") is None
+    assert pipeline.labels.get("Q2") is None
+    assert stats.get_value("resolve_label/errors") == 2
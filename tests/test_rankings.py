@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+""" tests for the BGG rankings spider """
+
+import os
+
+from datetime import datetime, timezone
+
+import pytest
+
+from scrapy import Request
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from board_game_scraper.items import GameItem
+from board_game_scraper.spiders.bgg_rankings import (
+    CDX_FIELDS,
+    BggRankingsSpider,
+    _parse_cdx,
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CDX_FILES = (
+    os.path.join(HERE, "fixtures", "bgg_rankings_cdx.json"),
+    os.path.join(HERE, "fixtures", "bgg_rankings_cdx.txt"),
+)
+
+SNAPSHOT_URL = (
+    "https://web.archive.org/web/20080101000000/"
+    + "http://www.boardgamegeek.com/browser.php?itemtype=game&sortby=rank"
+)
+RANKINGS = b"""<html><body><table class="gamebrowser_table">
+<tr><th>Rank</th></tr>
+<tr>
+<td>1</td>
+<td><img src="/images/pic1.jpg"/></td>
+<td><a href="/web/20080101000000/http://www.boardgamegeek.com/game/12333">
+Twilight Struggle
+</a></td>
+<td>8.32</td>
+<td>4321</td>
+</tr>
+</table></body></html>"""
+ERROR = b"<html><body><h1>Got an HTTP 302 response at crawl time</h1></body></html>"
+
+
+def _parse(spider, body, digest):
+    request = Request(
+        SNAPSHOT_URL,
+        meta={"snapshot_digest": digest, "snapshot_timestamp": "20080101000000"},
+    )
+    response = HtmlResponse(SNAPSHOT_URL, body=body, request=request)
+    return [item for item in spider.parse(response) if isinstance(item, GameItem)]
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as file:
+        return file.read()
+
+
+def _snapshots(requests):
+    return [
+        (
+            request.url,
+            request.meta["snapshot_digest"],
+            request.meta["snapshot_timestamp"],
+            request.meta["published_at"],
+        )
+        for request in requests
+        if "snapshot_digest" in request.meta
+    ]
+
+
+@pytest.fixture
+def date_range(monkeypatch):
+    """ only consider snapshots between 2000 and 2010 """
+    # spider settings take precedence over the ones passed to the crawler
+    monkeypatch.setitem(
+        BggRankingsSpider.custom_settings,
+        "EARLIEST_DATE",
+        datetime(2000, 1, 1, tzinfo=timezone.utc),
+    )
+    monkeypatch.setitem(
+        BggRankingsSpider.custom_settings,
+        "LATEST_DATE",
+        datetime(2010, 1, 1, tzinfo=timezone.utc),
+    )
+
+
+def _spider(cdx_file=None):
+    crawler = get_crawler(
+        BggRankingsSpider,
+        {
+            "BGG_RANKINGS_CDX_ENABLED": True,
+            "BGG_RANKINGS_COVERAGE_PATH": None,
+            "BGG_RANKINGS_CDX_FILE": cdx_file,
+        },
+    )
+    spider = BggRankingsSpider.from_crawler(crawler)
+    spider._coverage.set("COVEREDDIGEST", "20060101000000")
+    return spider
+
+
+EXPECTED_SNAPSHOTS = [
+    (
+        "https://web.archive.org/web/20050301120000/"
+        + "http://www.boardgamegeek.com:80/top50.htm",
+        "FIRSTDIGEST",
+        "20050301120000",
+        datetime(2005, 3, 1, 12, tzinfo=timezone.utc),
+    ),
+    (
+        "https://web.archive.org/web/20080101000000/"
+        + "http://www.boardgamegeek.com/top50.htm",
+        "SECONDDIGEST",
+        "20080101000000",
+        datetime(2008, 1, 1, tzinfo=timezone.utc),
+    ),
+]
+
+
+def test_parse_cdx():
+    """ JSON and space separated CDX output yield the same snapshots """
+    json_rows, text_rows = (list(_parse_cdx(_read(path))) for path in CDX_FILES)
+    assert len(json_rows) == 7
+    assert [{key: row[key] for key in CDX_FIELDS} for row in text_rows] == json_rows
+    assert json_rows[0] == {
+        "timestamp": "19991231235959",
+        "original": "http://www.boardgamegeek.com:80/top50.htm",
+        "digest": "EARLYDIGEST",
+        "statuscode": "200",
+        "mimetype": "text/html",
+    }
+    assert text_rows[0]["urlkey"] == "com,boardgamegeek)/top50.htm"
+    assert list(_parse_cdx("")) == []
+
+
+@pytest.mark.parametrize("cdx_file", CDX_FILES)
+def test_snapshot_requests(date_range, cdx_file):
+    """ duplicate, covered, failed and out-of-range snapshots are not requested """
+    # pylint: disable=redefined-outer-name,unused-argument
+    spider = _spider()
+    requests = list(spider._snapshot_requests(_parse_cdx(_read(cdx_file))))
+    assert _snapshots(requests) == EXPECTED_SNAPSHOTS
+    assert all(request.callback == spider.parse for request in requests)
+
+    stats = spider.crawler.stats
+    assert stats.get_value("bgg_rankings/snapshots/found") == 4
+    assert stats.get_value("bgg_rankings/snapshots/duplicate") == 1
+    assert stats.get_value("bgg_rankings/snapshots/covered") == 1
+    assert stats.get_value("bgg_rankings/snapshots/planned") == 2
+
+    # digests already planned are not requested again
+    assert not list(spider._snapshot_requests(_parse_cdx(_read(cdx_file))))
+
+
+@pytest.mark.parametrize("cdx_file", CDX_FILES)
+def test_cdx_file(date_range, cdx_file):
+    """ snapshots are read from a local CDX file instead of the CDX API """
+    # pylint: disable=redefined-outer-name,unused-argument
+    spider = _spider(cdx_file)
+    requests = list(spider.start_requests())
+    assert _snapshots(requests) == EXPECTED_SNAPSHOTS
+    # no requests to the CDX API
+    assert not any(request.callback == spider.parse_cdx for request in requests)
+
+
+def test_coverage():
+    """ only snapshots with rankings count as covered """
+    crawler = get_crawler(
+        BggRankingsSpider,
+        {"BGG_RANKINGS_CDX_ENABLED": True, "BGG_RANKINGS_COVERAGE_PATH": None},
+    )
+    spider = BggRankingsSpider.from_crawler(crawler)
+
+    assert _parse(spider, ERROR, "ERRORDIGEST") == []
+    assert "ERRORDIGEST" not in spider._coverage
+
+    (item,) = _parse(spider, RANKINGS, "RANKINGSDIGEST")
+    assert item["bgg_id"] == 12333
+    assert item["rank"] == 1
+    assert "RANKINGSDIGEST" in spider._coverage
+
+    stats = crawler.stats
+    assert stats.get_value("bgg_rankings/snapshots/empty") == 1
+    assert stats.get_value("bgg_rankings/snapshots/ingested") == 1
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+""" tests for the shared token buckets """
+
+import pytest
+
+from board_game_scraper import ratelimit
+from board_game_scraper.ratelimit import RedisTokenBucket, SqliteTokenBucket
+
+
+class FakeClock:
+    """ controllable replacement for time.time """
+
+    def __init__(self, curr_time=1_000_000.0):
+        self.curr_time = curr_time
+
+    def __call__(self):
+        return self.curr_time
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ freeze the clock of the SQLite buckets """
+    fake = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def bucket(tmp_path, clock):
+    """ SQLite token bucket in a temporary file """
+    # pylint: disable=unused-argument
+    result = SqliteTokenBucket(tmp_path / "buckets.sqlite")
+    yield result
+    result.close()
+
+
+def test_acquire(bucket, clock):
+    """ burst is free, then one token per 1 / rate seconds """
+    assert bucket.acquire("bgg", rate=2, capacity=3) == 0
+    assert bucket.acquire("bgg", rate=2, capacity=3) == 0
+    assert bucket.acquire("bgg", rate=2, capacity=3) == 0
+    assert bucket.acquire("bgg", rate=2, capacity=3) == pytest.approx(0.5)
+    assert bucket.acquire("bgg", rate=2, capacity=3) == pytest.approx(1.0)
+
+    clock.curr_time += 1
+    assert bucket.acquire("bgg", rate=2, capacity=3) == pytest.approx(0.5)
+
+    clock.curr_time += 60
+    assert bucket.acquire("bgg", rate=2, capacity=3) == 0
+    assert bucket.acquire("other", rate=2, capacity=3) == 0
+
+
+def test_floor(bucket, clock):
+    """ processes without priority keep a reserve of tokens untouched """
+    assert bucket.acquire("bgg", rate=1, capacity=3, floor=2) == 0
+    # below the floor nothing is taken
+    assert bucket.acquire("bgg", rate=1, capacity=3, floor=2) == pytest.approx(1)
+    assert bucket.acquire("bgg", rate=1, capacity=3, floor=2) == pytest.approx(1)
+    assert bucket.acquire("bgg", rate=1, capacity=3) == 0
+    assert bucket.acquire("bgg", rate=1, capacity=3) == 0
+    assert bucket.acquire("bgg", rate=1, capacity=3) == pytest.approx(1)
+
+    clock.curr_time += 4
+    assert bucket.acquire("bgg", rate=1, capacity=3, floor=2) == pytest.approx(0)
+
+
+def test_reserve_under_contention(bucket):
+    """ queued processes without priority do not delay those with priority """
+    waits = [bucket.acquire("bgg", rate=2, capacity=3, floor=2) for _ in range(16)]
+    assert waits[0] == 0
+    assert all(wait == pytest.approx(0.5) for wait in waits[1:])
+
+    priority_wait = bucket.acquire("bgg", rate=2, capacity=3)
+    assert priority_wait == 0
+    assert priority_wait < bucket.acquire("bgg", rate=2, capacity=3, floor=2)
+
+
+def test_shared(tmp_path, clock):
+    """ buckets in the same file are shared between connections """
+    # pylint: disable=unused-argument
+    first = SqliteTokenBucket(tmp_path / "buckets.sqlite")
+    second = SqliteTokenBucket(tmp_path / "buckets.sqlite")
+    assert first.acquire("bgg", rate=1, capacity=1) == 0
+    assert second.acquire("bgg", rate=1, capacity=1) == pytest.approx(1)
+    first.close()
+    second.close()
+
+
+def test_penalize(bucket, clock):
+    """ a penalty delays further acquisitions without stacking """
+    assert bucket.blocked("bgg") == 0
+    bucket.acquire("bgg", rate=1, capacity=2)
+
+    for _ in range(8):
+        bucket.penalize("bgg", rate=1, capacity=2, seconds=30)
+    assert bucket.blocked("bgg") == pytest.approx(30)
+    assert bucket.acquire("bgg", rate=1, capacity=2) == pytest.approx(31)
+
+    clock.curr_time += 10
+    assert bucket.blocked("bgg") == pytest.approx(20)
+
+    clock.curr_time += 30
+    assert bucket.blocked("bgg") == 0
+    assert bucket.acquire("bgg", rate=1, capacity=2) == 0
+
+
+def test_redis(monkeypatch):
+    """ the Lua script follows the same semantics """
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    redis = pytest.importorskip("redis")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        redis.Redis, "from_url", lambda url: fakeredis.FakeRedis(server=server)
+    )
+
+    bucket = RedisTokenBucket("redis://localhost:6379/0")
+    assert bucket.acquire("bgg", rate=1, capacity=2) == 0
+    assert bucket.acquire("bgg", rate=1, capacity=2, floor=1) == pytest.approx(
+        1, abs=0.1
+    )
+    assert bucket.acquire("bgg", rate=1, capacity=2) == pytest.approx(0, abs=0.1)
+    assert bucket.acquire("bgg", rate=1, capacity=2) == pytest.approx(1, abs=0.1)
+    assert bucket.blocked("bgg") == 0
+
+    for _ in range(8):
+        bucket.penalize("bgg", rate=1, capacity=2, seconds=30)
+    assert bucket.blocked("bgg") == pytest.approx(30, abs=0.1)
+    assert bucket.acquire("bgg", rate=1, capacity=2) == pytest.approx(31, abs=0.1)
+    bucket.close()
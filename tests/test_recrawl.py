@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+""" tests for the recrawl planner """
+
+from datetime import datetime, timezone
+
+from scrapy.utils.test import get_crawler
+
+from board_game_scraper.recrawl import DAY, RecrawlPlanner
+from board_game_scraper.spiders import bgg
+from board_game_scraper.spiders.bgg import BggSpider
+
+CURR_TIME = 1_600_000_000.0
+
+
+def _planner():
+    planner = RecrawlPlanner(min_change=10)
+    # hot game: 1000 new votes per day
+    planner.observe(13, num_votes=1_000, scraped_at=CURR_TIME - 2 * DAY)
+    planner.observe(13, num_votes=2_000, scraped_at=CURR_TIME - DAY)
+    # cold game: no changes at all
+    planner.observe(822, num_votes=0, scraped_at=CURR_TIME - 2 * DAY)
+    planner.observe(822, num_votes=0, scraped_at=CURR_TIME - DAY)
+    return planner
+
+
+def test_status():
+    """ due status and expected changes of single games """
+    planner = _planner()
+    due, changes = planner.status(13, curr_time=CURR_TIME)
+    assert due
+    assert changes == 1_000
+    due, changes = planner.status(822, curr_time=CURR_TIME)
+    assert not due
+    assert changes == 0
+    assert planner.status(36218, curr_time=CURR_TIME) is None
+    assert planner.plan(curr_time=CURR_TIME) == ([(13, 1_000)], [(822, 0)])
+
+
+def test_browsed_games_ranked_by_plan(monkeypatch):
+    """ known games found while browsing get their recrawl priority """
+    monkeypatch.setattr(
+        bgg, "now", lambda: datetime.fromtimestamp(CURR_TIME, timezone.utc)
+    )
+    crawler = get_crawler(
+        BggSpider,
+        {"BGG_RECRAWL_ENABLED": True, "BGG_RECRAWL_INDEX_PATH": None},
+    )
+    spider = BggSpider.from_crawler(crawler)
+    spider._recrawl.close()
+    spider._recrawl = _planner()
+
+    requests = list(spider._game_requests(13, 822, 36218))
+    priorities = {request.meta["bgg_id"]: request.priority for request in requests}
+    assert priorities == {13: 2, 822: -2}
+    assert all(request.meta["recrawl"] for request in requests)
+    # the new game waits for a full batch
+    assert 36218 in spider._ids_seen
+    assert not list(spider._recrawl_requests())
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+""" tests for the BGG ID sweep """
+
+import pytest
+
+from scrapy.http import XmlResponse
+from scrapy.utils.test import get_crawler
+
+from board_game_scraper.spiders.bgg import BggSpider
+
+EMPTY = b'<?xml version="1.0" encoding="utf-8"?><items termsofuse=""></items>'
+ERROR = b"<error><message>Rate limit exceeded.</message></error>"
+
+
+@pytest.fixture
+def spider():
+    """ BGG spider sweeping in batches of ten IDs """
+    crawler = get_crawler(
+        BggSpider,
+        {
+            "BGG_ID_SWEEP_ENABLED": True,
+            "BGG_ID_SWEEP_DEAD_IDS_PATH": None,
+            "BGG_THING_BATCH_SIZE": 10,
+            "BGG_THING_BATCH_ADAPTIVE": False,
+            "SCRAPE_BGG_RATINGS": False,
+        },
+    )
+    return BggSpider.from_crawler(crawler)
+
+
+def _respond(request, body):
+    response = XmlResponse(request.url, body=body, request=request)
+    return list(request.callback(response))
+
+
+def test_empty_batch(spider):
+    """ IDs without items are empty, but only dead below the highest hit """
+    (request,) = spider._sweep_requests()
+    _respond(request, EMPTY)
+    assert spider._sweep["empty"] == set(range(1, 11))
+    assert not spider._sweep["retry"]
+
+
+@pytest.mark.parametrize("body", (b"", ERROR, b"<html><body>Proxy</body></html>"))
+def test_invalid_batch(spider, body):
+    """ responses that are no items document are retried, not recorded """
+    (request,) = spider._sweep_requests()
+
+    (retry,) = _respond(request, body)
+    assert not spider._sweep["empty"]
+    assert len(spider._dead_ids) == 0
+    assert retry.url == request.url
+    assert retry.dont_filter
+    assert retry.meta["sweep_attempts"] == 1
+
+    (retry,) = _respond(retry, body)
+    assert retry.meta["sweep_attempts"] == 2
+
+    # out of retries, so the sweep moves on
+    (following,) = _respond(retry, body)
+    assert following.url != request.url
+    assert spider.crawler.stats.get_value("bgg/sweep/failed_ids") == 10